@@ -2,15 +2,72 @@
 ASGI config for cocina360 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+docker-compose.yml serves it with uvicorn only for recipe_chat_stream, so each
+token goes out as it arrives; the rest of the site runs on gunicorn (WSGI),
+where sync views get their own threads instead of sharing the single thread
+Django 4.2 gives them under ASGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.core import signals
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cocina360.settings')
 
-application = get_asgi_application()
+
+class DisconnectCancellingASGIHandler(ASGIHandler):
+    """
+    Django 4.2 keeps running a response after the client goes away (5.0
+    cancels it). For streamed answers (recipe_chat_stream) that means paying
+    for tokens nobody reads, so once the request body is read this handler
+    listens for http.disconnect and cancels the request task; the response
+    iterator is closed and its cleanup (closing the upstream stream) runs.
+    """
+
+    async def handle(self, scope, receive, send):
+        body_read = asyncio.Event()
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] != 'http.request' or not message.get('more_body', False):
+                body_read.set()
+            return message
+
+        async def listen_for_disconnect():
+            await body_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        request = asyncio.ensure_future(super().handle(scope, receive_body, send))
+        disconnect = asyncio.ensure_future(listen_for_disconnect())
+        await asyncio.wait([request, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        if request.done():
+            disconnect.cancel()
+            request.result()
+            return
+
+        request.cancel()
+        try:
+            await request
+        except asyncio.CancelledError:
+            pass
+        # response.close() was skipped; it is what sends request_finished (closes DB connections)
+        await sync_to_async(signals.request_finished.send, thread_sensitive=True)(sender=self.__class__)
+
+
+# What django.core.asgi.get_asgi_application() does, with the handler above
+django.setup(set_prefix=False)
+application = DisconnectCancellingASGIHandler()
+
+# Static files are served the way runserver does it, only while DEBUG is on
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
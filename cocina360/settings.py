@@ -146,4 +146,50 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = '/recipes/' # Redirect after login
 LOGOUT_REDIRECT_URL = '/accounts/login/' # Redirect after logout
-CSV_ARCHIVES_DIR = os.path.join(BASE_DIR, 'archives_csv')
\ No newline at end of file
+CSV_ARCHIVES_DIR = os.path.join(BASE_DIR, 'archives_csv')
+
+# Cache compartido por todos los procesos (web, import_recipes, report_worker...):
+# las versiones de recipes.caching se cambian en uno y se leen en otro.
+# Con REDIS_URL (docker-compose) se usa Redis; si no, un cache en disco pequeño
+# (FileBasedCache recorre el directorio completo en cada escritura).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'django_cache'),
+        }
+    }
+
+# Cache en disco de los PDF de recetas (ver recipes.pdf_cache)
+RECIPE_PDF_CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
+RECIPE_PDF_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Cola de reportes (ver recipes.jobs y `manage.py report_worker`)
+REPORT_JOBS_DIR = os.path.join(BASE_DIR, 'report_jobs')
+REPORT_JOB_TIMEOUT = 15 * 60        # segundos antes de reintentar un trabajo abandonado
+REPORT_JOB_RETENTION = 24 * 60 * 60  # segundos que se guardan los resultados
+
+# Motor de los PDF de JSON recibidos: 'reportlab' (directo) o 'xhtml2pdf'
+JSON_PDF_ENGINE = 'reportlab'
+
+# Respuestas guardadas de suggest_substitution (ver recipes.substitution_cache)
+SUBSTITUTION_CACHE_TTL = 30 * 24 * 60 * 60   # segundos que una respuesta se considera vigente
+SUBSTITUTION_CACHE_MAX_ENTRIES = 10000       # se borran las menos usadas por encima de esto
+SUBSTITUTION_CACHE_SERVE_STALE = True        # si la IA falla, responder con una vencida
+
+# Cliente de la IA (ver recipes.ai_client)
+AI_BASE_URL = os.environ.get('OPENAI_BASE_URL')  # None: la API de OpenAI
+AI_TIMEOUT = 20            # plazo de una llamada, contando los reintentos (total en el chat en streaming)
+AI_CONNECT_TIMEOUT = 3
+AI_MAX_RETRIES = 2
+AI_RETRY_BACKOFF = 0.5     # segundos antes del primer reintento; se duplica en cada uno
+AI_CIRCUIT_FAILURES = 5    # llamadas fallidas seguidas que abren el circuito
+AI_CIRCUIT_RESET = 30      # segundos con el circuito abierto antes de probar de nuevo
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import StaticFilesHandler
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cocina360.settings')
 
 application = get_wsgi_application()
+
+# Static files are served the way runserver does it, only while DEBUG is on
+if settings.DEBUG:
+    application = StaticFilesHandler(application)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Recipe, Ingredient, Step, UserIngredientCompletion, UserStepCompletion
+from . import search
+from .models import Recipe, Ingredient, CanonicalIngredient, Step, RecipeProgress, ReportJob, ImportCheckpoint, SubstitutionAnswer
 
 class IngredientInline(admin.TabularInline):
     model = Ingredient
@@ -12,27 +13,52 @@ class StepInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'preparation_time', 'difficulty', 'creator')
-    search_fields = ('name', 'ingredients__name')
+    search_fields = ('name_normalized', 'ingredients__name_normalized')
     actions = ['delete_selected']
     inlines = [IngredientInline, StepInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Usa los índices de búsqueda (sin tildes, tolerante a errores)
+        # en vez de un LIKE sobre nombre e ingredientes
+        if not search_term or not search.fts_available():
+            return super().get_search_results(
+                request, queryset, search.normalize_text(search_term)
+            )
+        ids = set(search.search_recipe_ids(search_term))
+        ids.update(search.fuzzy_search_recipe_ids(search_term))
+        return queryset.filter(pk__in=ids), False
+
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'recipe')
-    list_filter = ('recipe',)
+    list_display = ('name', 'quantity', 'unit', 'canonical', 'recipe')
+    list_filter = ('recipe', 'unit')
+
+@admin.register(CanonicalIngredient)
+class CanonicalIngredientAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
 
 @admin.register(Step)
 class StepAdmin(admin.ModelAdmin):
     list_display = ('order', 'description', 'recipe')
     list_filter = ('recipe',)
 
-@admin.register(UserIngredientCompletion)
-class UserIngredientCompletionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'ingredient', 'completed')
-    list_filter = ('user', 'completed')
+@admin.register(RecipeProgress)
+class RecipeProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe', 'updated_at')
+    list_filter = ('user',)
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'user', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('result_path', 'filename', 'content_type', 'started_at', 'finished_at')
 
-@admin.register(UserStepCompletion)
-class UserStepCompletionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'step', 'completed')
-    list_filter = ('user', 'completed')
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('source', 'rows', 'offset', 'updated_at')
 
+@admin.register(SubstitutionAnswer)
+class SubstitutionAnswerAdmin(admin.ModelAdmin):
+    list_display = ('missing', 'substitute', 'answered_at', 'last_used_at')
+    search_fields = ('missing', 'substitute')
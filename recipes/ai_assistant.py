@@ -1,30 +1,46 @@
-import os
 import json
-from openai import OpenAI, OpenAIError
+
+from . import ai_client, substitution_cache
+from .ai_client import AIUnavailable
+
+
+def _unavailable(explicacion):
+    return {
+        "viable": "no disponible",
+        "explicacion": explicacion,
+        "proporcion": "N/A",
+        "ajustes": "N/A",
+        "riesgos": "N/A",
+        "confianza": 0.0
+    }
 
 
 def suggest_substitution(missing, substitute, recipe_title=None, recipe_text=None):
     """
-    Llama al modelo GPT-5-nano para sugerir sustituciones culinarias.
-    Si no hay API Key disponible, devuelve un JSON indicando indisponibilidad.
+    Sugiere sustituciones culinarias con el modelo GPT-5-nano.
+
+    Las respuestas se guardan (ver recipes.substitution_cache): una pregunta
+    repetida no vuelve a llamar a la IA. Si la IA no está disponible se
+    responde con la respuesta vencida, si la hay, o con un JSON indicando
+    indisponibilidad.
     """
+    key = substitution_cache.make_key(missing, substitute, recipe_title, recipe_text)
+    cached = substitution_cache.lookup(key)
+    if cached is not None and cached.fresh:
+        return cached.answer
 
-    # 1. Verificar si la API Key existe
-    api_key = os.getenv("OPENAI_API_KEY")
+    try:
+        answer = _ask_model(missing, substitute, recipe_title, recipe_text)
+    except AIUnavailable as e:
+        stale = substitution_cache.use_stale(cached)
+        return stale if stale is not None else _unavailable(str(e))
 
-    if not api_key:
-        return {
-            "viable": "no disponible",
-            "explicacion": "El servicio de IA no está disponible por el momento (API key no configurada).",
-            "proporcion": "N/A",
-            "ajustes": "N/A",
-            "riesgos": "N/A",
-            "confianza": 0.0
-        }
+    substitution_cache.store(key, missing, substitute, answer)
+    return answer
 
-    # 2. Crear cliente SOLO si hay API Key
-    client = OpenAI(api_key=api_key)
 
+def _ask_model(missing, substitute, recipe_title=None, recipe_text=None):
+    """Respuesta de la IA como dict; AIUnavailable si no se pudo obtener."""
     prompt = f"""
 Eres un chef experto en sustituciones de ingredientes.
 
@@ -46,22 +62,9 @@ Responde SOLO un JSON válido con este formato EXACTO:
 }}
 """
 
+    # La API key, el plazo, los reintentos y el circuito los maneja ai_client
+    text = ai_client.complete(prompt, json_response=True)
     try:
-        response = client.responses.create(
-            model="gpt-5-nano",
-            input=prompt,
-            response_format="json"
-        )
-
-        return json.loads(response.output_text)
-
-    except OpenAIError as e:
-        # 3. Si OpenAI falla (límite, servidor caído, etc.)
-        return {
-            "viable": "no disponible",
-            "explicacion": f"El servicio de IA no está disponible por el momento. Error: {str(e)}",
-            "proporcion": "N/A",
-            "ajustes": "N/A",
-            "riesgos": "N/A",
-            "confianza": 0.0
-        }
+        return json.loads(text)
+    except ValueError as e:
+        raise AIUnavailable(f"El servicio de IA no está disponible por el momento. Error: {str(e)}") from e
@@ -0,0 +1,295 @@
+"""
+Cliente de la IA compartido por ``ai_assistant`` y el chat de recetas.
+
+- Un solo cliente por proceso (y uno asíncrono por event loop), así las
+  llamadas reutilizan las conexiones HTTP abiertas.
+- Cada llamada tiene un plazo (``AI_TIMEOUT``) que incluye los
+  reintentos: una IA lenta no deja a un worker esperando indefinidamente.
+  En ``stream`` es un plazo total, también mientras llegan los tokens. En
+  ``complete`` (síncrona, no se puede cancelar) cada espera de la conexión
+  (conectar, cada lectura) usa lo que queda del plazo y pasado el plazo no
+  se reintenta; solo un servidor que envía la respuesta de a poco puede
+  alargarla.
+- Los fallos pasajeros (conexión, plazo, 429 y 5xx) se reintentan hasta
+  ``AI_MAX_RETRIES`` veces, esperando ``AI_RETRY_BACKOFF`` segundos y el
+  doble en cada reintento.
+- Tras ``AI_CIRCUIT_FAILURES`` fallos seguidos el circuito se abre:
+  durante ``AI_CIRCUIT_RESET`` segundos las llamadas fallan de inmediato
+  con ``AIUnavailable`` (y quien llama responde "no disponible"); luego se
+  deja pasar una llamada de prueba que lo vuelve a cerrar si funciona.
+
+La URL de la API se puede cambiar con ``AI_BASE_URL`` (por ejemplo, para
+probar contra un servidor local).
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import aclosing
+from typing import Optional
+
+import httpx
+from django.conf import settings
+from openai import (
+    APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, OpenAI, OpenAIError,
+)
+
+MODEL = "gpt-5-nano"
+# Conexiones abiertas por proceso
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+
+class AIUnavailable(Exception):
+    """La IA no respondió (sin API key, límite, servidor caído, circuito abierto...)."""
+
+
+def timeout() -> float:
+    return getattr(settings, "AI_TIMEOUT", 20)
+
+
+def connect_timeout() -> float:
+    return getattr(settings, "AI_CONNECT_TIMEOUT", 3)
+
+
+def max_retries() -> int:
+    return getattr(settings, "AI_MAX_RETRIES", 2)
+
+
+def retry_backoff() -> float:
+    return getattr(settings, "AI_RETRY_BACKOFF", 0.5)
+
+
+def _api_key():
+    return os.environ.get("OPENAI_API_KEY")
+
+
+def _base_url():
+    return getattr(settings, "AI_BASE_URL", None)
+
+
+def configured() -> bool:
+    return bool(_api_key())
+
+
+class CircuitBreaker:
+    """
+    Cuenta los fallos seguidos de la IA. Con el circuito abierto, allow()
+    devuelve False hasta que pasa el tiempo de espera; entonces deja pasar
+    una sola llamada de prueba (semiabierto).
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at < getattr(settings, "AI_CIRCUIT_RESET", 30):
+            return "open"
+        return "half-open"
+
+    def allow(self) -> Optional[str]:
+        """
+        None si no se puede llamar a la IA; si no, "closed" o "trial" (la
+        llamada de prueba, que se termina con release_trial()).
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half-open" and not self.trial:
+                self.trial = True
+                return "trial"
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.reset()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial = False
+            if self.opened_at is not None or self.failures >= getattr(settings, "AI_CIRCUIT_FAILURES", 5):
+                self.opened_at = self.clock()
+
+    def release_trial(self):
+        """
+        Libera la llamada de prueba aunque haya terminado sin resultado
+        (cancelada o con un error que no es de la IA); si no, el circuito
+        quedaría semiabierto sin dejar pasar ninguna otra.
+        """
+        with self._lock:
+            self.trial = False
+
+
+breaker = CircuitBreaker()
+
+_client = None
+_client_key = None
+_async_client = None
+_async_client_key = None
+
+
+def client() -> OpenAI:
+    """Cliente síncrono compartido por el proceso."""
+    global _client, _client_key
+    key = (_api_key(), _base_url())
+    if _client is None or _client_key != key:
+        _client = OpenAI(
+            api_key=key[0], base_url=key[1], max_retries=0,
+            http_client=httpx.Client(limits=LIMITS, timeout=timeout()),
+        )
+        _client_key = key
+    return _client
+
+
+def async_client() -> AsyncOpenAI:
+    """Cliente asíncrono compartido por el event loop actual."""
+    global _async_client, _async_client_key
+    key = (_api_key(), _base_url(), asyncio.get_running_loop())
+    if _async_client is None or _async_client_key != key:
+        _async_client = AsyncOpenAI(
+            api_key=key[0], base_url=key[1], max_retries=0,
+            http_client=httpx.AsyncClient(limits=LIMITS, timeout=timeout()),
+        )
+        _async_client_key = key
+    return _async_client
+
+
+def _transient(error) -> bool:
+    """¿Vale la pena reintentar (y cuenta como IA caída)?"""
+    if isinstance(error, (APIConnectionError, APITimeoutError, httpx.TransportError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _unavailable(error) -> AIUnavailable:
+    return AIUnavailable(f"El servicio de IA no está disponible por el momento. Error: {error}")
+
+
+def _check_available() -> bool:
+    """AIUnavailable si no se puede llamar a la IA; True si es la llamada de prueba del circuito."""
+    if not configured():
+        raise AIUnavailable("El servicio de IA no está disponible por el momento (API key no configurada).")
+    mode = breaker.allow()
+    if mode is None:
+        raise AIUnavailable("El servicio de IA no está disponible por el momento (demasiados errores seguidos).")
+    return mode == "trial"
+
+
+def _remaining(deadline) -> float:
+    return deadline - time.monotonic()
+
+
+def _request_timeout(deadline):
+    """httpx.Timeout para lo que queda del plazo."""
+    remaining = max(deadline - time.monotonic(), 0.001)
+    return httpx.Timeout(remaining, connect=min(remaining, connect_timeout()))
+
+
+def _retry_delay(error, attempt, deadline) -> float:
+    """
+    Segundos a esperar antes del reintento 'attempt' (0 = primero) tras
+    'error'; AIUnavailable si no corresponde reintentar o no alcanza el plazo.
+    """
+    if not _transient(error):
+        # La IA respondió (400, 401...): no está caída, pero no hay respuesta
+        breaker.record_success()
+        raise _unavailable(error) from error
+    delay = retry_backoff() * 2 ** attempt * random.uniform(0.5, 1)
+    if attempt >= max_retries() or time.monotonic() + delay >= deadline:
+        breaker.record_failure()
+        raise _unavailable(error) from error
+    return delay
+
+
+def complete(prompt, json_response=False) -> str:
+    """
+    Texto de la respuesta a 'prompt' (un objeto JSON si 'json_response').
+    AIUnavailable si no hay API key, el circuito está abierto o la IA sigue
+    fallando al agotar reintentos o plazo.
+    """
+    trial = _check_available()
+    options = {"response_format": {"type": "json_object"}} if json_response else {}
+    deadline = time.monotonic() + timeout()
+    attempt = 0
+    try:
+        while True:
+            try:
+                response = client().chat.completions.create(
+                    model=MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    timeout=_request_timeout(deadline),
+                    **options,
+                )
+                break
+            except OpenAIError as e:
+                time.sleep(_retry_delay(e, attempt, deadline))
+                attempt += 1
+        breaker.record_success()
+    finally:
+        if trial:
+            breaker.release_trial()
+    return response.choices[0].message.content or ""
+
+
+async def stream(prompt):
+    """
+    Partes del texto de la respuesta a 'prompt', a medida que la IA las
+    escribe. Se reintenta solo hasta que la IA empieza a responder; cerrar
+    el generador (o cancelar la tarea) cierra la conexión. Si la respuesta
+    completa no llega dentro del plazo, AIUnavailable.
+    """
+    trial = _check_available()
+    deadline = time.monotonic() + timeout()
+    attempt = 0
+    try:
+        while True:
+            try:
+                async with asyncio.timeout(_remaining(deadline)):
+                    response = await async_client().chat.completions.create(
+                        model=MODEL,
+                        messages=[{"role": "user", "content": prompt}],
+                        stream=True,
+                        timeout=_request_timeout(deadline),
+                    )
+                break
+            except OpenAIError as e:
+                await asyncio.sleep(_retry_delay(e, attempt, deadline))
+                attempt += 1
+            except TimeoutError as e:
+                breaker.record_failure()
+                raise _unavailable(e) from e
+        breaker.record_success()
+    finally:
+        if trial:
+            breaker.release_trial()
+
+    try:
+        async with aclosing(response.__aiter__()) as chunks:
+            while True:
+                # El plazo se revisa en cada parte: no se puede esperar
+                # alrededor del yield (cancelaría a quien consume)
+                try:
+                    async with asyncio.timeout(_remaining(deadline)):
+                        chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+    except (OpenAIError, httpx.HTTPError, TimeoutError) as e:
+        breaker.record_failure()
+        raise _unavailable(e) from e
+    finally:
+        await response.response.aclose()
@@ -0,0 +1,72 @@
+"""
+Números de versión guardados en el cache de Django.
+
+Las claves de cache derivadas (conteos, fragmentos de plantilla...) llevan
+la versión de lo que dependen; al cambiar los datos basta con cambiar
+la versión y las entradas viejas quedan huérfanas hasta que expiran.
+
+El cache es compartido entre procesos (ver ``CACHES`` en settings), así
+que lo que cambia ``import_recipes`` lo ve el servidor web. Si una
+versión se pierde (el cache la descartó al llenarse), vuelve a partir de
+la hora actual y no de 1: nunca reaparecen entradas de una versión vieja.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+VERSION_TIMEOUT = None  # las versiones no expiran
+
+
+def _version_key(name: str) -> str:
+    return f"recipes:version:{name}"
+
+
+def _initial_version() -> int:
+    """Versión de un nombre sin versión guardada: mayor que cualquiera anterior."""
+    return time.time_ns() // 1000
+
+
+def get_version(name: str) -> int:
+    """Versión actual de 'name'."""
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        cache.add(key, version, VERSION_TIMEOUT)
+        version = cache.get(key, version)
+    return version
+
+
+def recipe_version_name(recipe_id) -> str:
+    """Nombre de la versión del contenido de una receta (detalle, PDF...)."""
+    return f"recipe:{recipe_id}"
+
+
+def bump_version(name: str) -> int:
+    """
+    Cambia la versión de 'name' invalidando lo que dependa de ella.
+
+    No se usa ``cache.incr``: en FileBasedCache es leer y escribir (dos
+    procesos pueden quedar con la misma versión) y la escritura vuelve al
+    timeout por defecto. La nueva versión sale de la hora actual, así que
+    cada cambio deja una distinta aunque otro proceso escriba a la vez.
+    """
+    key = _version_key(name)
+    version = max(_initial_version(), cache.get(key, 0) + 1)
+    cache.set(key, version, VERSION_TIMEOUT)
+    return version
+
+
+def cached_count(queryset, name: str, *parts, timeout=300) -> int:
+    """
+    Conteo de 'queryset' guardado en cache bajo la versión de 'name'.
+    'parts' identifica el filtro (parámetros de búsqueda, usuario...).
+    """
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    key = f"recipes:count:{name}:{get_version(name)}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
@@ -0,0 +1,100 @@
+"""
+Chat sobre una receta con la IA (ver ``views.recipe_chat`` y
+``views.recipe_chat_stream``).
+
+``recipe_chat_stream`` es asíncrona: entrega la respuesta como
+server-sent events a medida que llegan los tokens, sin ocupar un hilo
+mientras la IA escribe, así un proceso ASGI atiende cientos de chats a la
+vez. Si el navegador se desconecta, el servidor cancela la respuesta (ver
+``cocina360.asgi``) y ``ai_client.stream`` cierra la conexión con la IA:
+no se siguen pagando tokens que nadie va a leer.
+"""
+import json
+from contextlib import aclosing
+
+from . import ai_client
+from .models import Recipe
+
+
+def build_prompt(recipe, message):
+    ingredientes_txt = ", ".join(
+        ing.name for ing in recipe.ingredients.all()
+    )
+    pasos_txt = "\n".join(
+        f"{i+1}. {step.description}"
+        for i, step in enumerate(recipe.steps.all())
+    )
+
+    return f"""
+Eres un asistente de cocina amable y experto.
+El usuario está viendo esta receta de Cocina360 y te hará preguntas sobre ella.
+
+Receta:
+Nombre: {recipe.name}
+Ingredientes: {ingredientes_txt}
+Pasos:
+{pasos_txt}
+
+Reglas:
+- Responde SIEMPRE en español.
+- Sé breve y claro (3–6 líneas).
+- Puedes dar consejos adicionales (textura, sabor, tiempos, seguridad).
+- Si el usuario pide sustituir algo, explica riesgos y proporciones.
+- Si la pregunta no tiene que ver con la receta, responde de forma educada pero vuelve al tema de la receta.
+
+Pregunta del usuario: {message}
+Responde de forma directa, como si estuvieras hablando con la persona.
+"""
+
+
+def recipe_prompt(recipe_id, message):
+    """Prompt para 'message' sobre la receta 'recipe_id'; Recipe.DoesNotExist si no existe."""
+    recipe = Recipe.objects.prefetch_related("ingredients", "steps").get(pk=recipe_id)
+    return build_prompt(recipe, message)
+
+
+def offline_reply(message):
+    return (
+        "⚠️ Modo sin IA activado.\n"
+        "No hay API key configurada, por lo que responderé con mensajes básicos.\n\n"
+        f"Pregunta: {message}\n"
+        "Respuesta: Esta es una respuesta simulada. La integración con la IA está desactivada."
+    )
+
+
+def error_reply(error):
+    return (
+        "⚠️ Error consultando la IA.\n"
+        "Por ahora usaré el modo sin IA.\n"
+        f"Detalle: {error}"
+    )
+
+
+def sse_event(event, data):
+    """Un server-sent event con 'data' en JSON (así los saltos de línea no rompen el formato)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_reply(prompt, message):
+    """
+    Eventos de la respuesta: "token" con cada parte ({"delta": ...}) y al
+    final "done" con el texto completo ({"reply": ...}). Si la IA no está
+    disponible o falla a mitad de camino, "error" en vez de "done".
+    """
+    if not ai_client.configured():
+        reply = offline_reply(message)
+        yield sse_event("token", {"delta": reply})
+        yield sse_event("done", {"reply": reply})
+        return
+
+    parts = []
+    try:
+        # aclosing: si cierran este generador, también se cierra la conexión con la IA
+        async with aclosing(ai_client.stream(prompt)) as deltas:
+            async for delta in deltas:
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+    except ai_client.AIUnavailable as e:
+        yield sse_event("error", {"reply": error_reply(e)})
+        return
+    yield sse_event("done", {"reply": "".join(parts)})
@@ -0,0 +1,263 @@
+"""
+Exportación de muchas recetas a la vez ("recetario"): un solo PDF con
+índice o un ZIP con un PDF por receta.
+
+Las recetas se cargan en bloque como ``RecipeData`` (datos planos, sin
+ORM; ver ``recipes.reports.recipe_data``) y cada PDF se dibuja en un pool
+de procesos, así el trabajo de ReportLab se reparte entre los núcleos
+disponibles. Los procesos se crean con "spawn": no heredan conexiones a la
+base ni hilos del servidor, y tampoco los necesitan porque solo reciben
+datos.
+
+Memoria: el ZIP no depende del número de recetas (cada PDF sale apenas se
+dibuja). El PDF único sí: pypdf guarda todas las páginas unidas hasta
+escribir el documento, y el índice necesita el número de páginas de todas
+las recetas antes de empezar, así que crece con las recetas (unos 40 KB
+por receta de una página). Por eso ``write_pdf`` no acepta más de
+``COOKBOOK_EXPORT_MAX_RECIPES`` recetas (2000 por defecto, unos 80 MB).
+"""
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.text import slugify
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+
+from .models import Recipe
+from .report_generators import render_pdf_files
+from .search import filter_recipes
+
+PDF = "pdf"
+ZIP = "zip"
+FORMATS = (PDF, ZIP)
+
+# Recetas por tarea enviada al pool (menos viajes entre procesos)
+BATCH_SIZE = 25
+# Con menos recetas que esto no vale la pena levantar procesos
+PARALLEL_MIN_RECIPES = 50
+# Líneas del índice por página
+TOC_ENTRIES_PER_PAGE = 38
+
+
+def max_workers() -> int:
+    return getattr(settings, "COOKBOOK_EXPORT_WORKERS", None) or os.cpu_count() or 1
+
+
+def max_recipes() -> int:
+    return getattr(settings, "COOKBOOK_EXPORT_MAX_RECIPES", 2000)
+
+
+SOURCES = ("search", "favorites", "all")
+
+
+def export_queryset(source, params, user=None):
+    """
+    Recetas a exportar y título del recetario.
+
+    'search' usa los filtros de la lista (q, ingredient, max_time de
+    'params'), 'favorites' los favoritos de 'user' y 'all' todo el catálogo.
+    """
+    if source == "favorites":
+        if user is None or not user.is_authenticated:
+            raise ValueError("Los favoritos requieren un usuario")
+        return Recipe.objects.filter(favorited_by__user=user).order_by("name", "id"), "Mis favoritos"
+    if source == "all":
+        return Recipe.objects.order_by("name", "id"), "Recetario Cocina 360"
+    if source == "search":
+        query = params.get("q", "")
+        recipes = filter_recipes(Recipe.objects.all(), query, params.get("ingredient", ""), params.get("max_time", ""))
+        if query:
+            return recipes, f"Recetas: {query}"
+        return recipes.order_by("name", "id"), "Recetario Cocina 360"
+    raise ValueError("'source' debe ser search, favorites o all")
+
+
+def _batches(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_rendered(recipes, directory, workers=None):
+    """
+    Dibuja cada receta de 'recipes' (iterable de RecipeData) en un PDF dentro
+    de 'directory' y entrega (receta, ruta, páginas) en el mismo orden.
+
+    Con varios procesos se mantienen a lo más dos lotes por proceso en
+    curso, así la memoria no crece con el número de recetas aunque quien
+    consume vaya más lento que el pool.
+    """
+    workers = max_workers() if workers is None else workers
+    directory = Path(directory)
+    numbered = enumerate(recipes)
+
+    def jobs(batch):
+        return [(recipe, directory / f"{index:06d}.pdf") for index, recipe in batch]
+
+    first = list(islice(numbered, PARALLEL_MIN_RECIPES))
+    if workers <= 1 or len(first) < PARALLEL_MIN_RECIPES:
+        for batch in _batches(chain(first, numbered), BATCH_SIZE):
+            batch_jobs = jobs(batch)
+            for (recipe, path), pages in zip(batch_jobs, render_pdf_files(batch_jobs)):
+                yield recipe, path, pages
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for batch in _batches(chain(first, numbered), BATCH_SIZE):
+            batch_jobs = jobs(batch)
+            pending.append((batch_jobs, pool.submit(render_pdf_files, batch_jobs)))
+            while len(pending) >= workers * 2:
+                yield from _completed(pending.popleft())
+        while pending:
+            yield from _completed(pending.popleft())
+
+
+def _completed(entry):
+    batch_jobs, future = entry
+    for (recipe, path), pages in zip(batch_jobs, future.result()):
+        yield recipe, path, pages
+
+
+def render_recipes(recipes, workers=None):
+    """PDF (bytes) de cada receta de 'recipes', en el mismo orden."""
+    with tempfile.TemporaryDirectory() as directory:
+        return [path.read_bytes() for _recipe, path, _pages in iter_rendered(recipes, directory, workers)]
+
+
+def _fit(text, width, font_name, font_size):
+    """Recorta 'text' con "…" para que quepa en 'width' puntos."""
+    if pdfmetrics.stringWidth(text, font_name, font_size) <= width:
+        return text
+    while text and pdfmetrics.stringWidth(text + "…", font_name, font_size) > width:
+        text = text[:-1]
+    return text.rstrip() + "…"
+
+
+def render_toc(title, entries):
+    """Páginas del índice: 'entries' es una lista de (nombre, página)."""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    left_margin = 50
+    right_margin = 50
+
+    pages = [entries[i:i + TOC_ENTRIES_PER_PAGE] for i in range(0, len(entries), TOC_ENTRIES_PER_PAGE)]
+    for page_entries in pages or [[]]:
+        y = height - 50
+        p.setFont("Helvetica-Bold", 18)
+        p.drawString(left_margin, y, title)
+        y -= 35
+
+        p.setFont("Helvetica", 12)
+        for name, page_number in page_entries:
+            number = str(page_number)
+            number_width = pdfmetrics.stringWidth(number, "Helvetica", 12)
+            name_width = width - left_margin - right_margin - number_width - 20
+            p.drawString(left_margin, y, _fit(name, name_width, "Helvetica", 12))
+            p.drawRightString(width - right_margin, y, number)
+            y -= 18
+        p.showPage()
+
+    p.save()
+    return buffer.getvalue()
+
+
+def toc_page_count(recipe_count) -> int:
+    return max(1, math.ceil(recipe_count / TOC_ENTRIES_PER_PAGE))
+
+
+def write_pdf(recipes, out, title="Recetario", workers=None):
+    """
+    Escribe en 'out' un solo PDF con un índice al inicio y todas las
+    recetas, con marcadores para saltar a cada una.
+
+    Cada receta se dibuja a un archivo temporal y pypdf las une leyendo
+    desde el disco. El índice necesita el número de páginas de todas las
+    recetas, así que el documento no se puede empezar a enviar antes de
+    terminar (ReportLab y pypdf escriben el PDF completo al final).
+
+    La memoria crece con el número de recetas (ver arriba): ValueError si
+    hay más de max_recipes().
+    """
+    limit = max_recipes()
+    with tempfile.TemporaryDirectory() as directory:
+        entries = []
+        paths = []
+        for recipe, path, pages in iter_rendered(recipes, directory, workers):
+            if len(entries) >= limit:
+                raise ValueError(f"Se pueden exportar hasta {limit} recetas en un PDF")
+            entries.append([recipe.name, pages])
+            paths.append(path)
+
+        page_number = toc_page_count(len(entries)) + 1
+        for entry in entries:
+            entry[1], page_number = page_number, page_number + entry[1]
+
+        writer = PdfWriter()
+        writer.append(PdfReader(io.BytesIO(render_toc(title, entries))))
+        for (name, start_page), path in zip(entries, paths):
+            writer.append(PdfReader(path))
+            writer.add_outline_item(name, start_page - 1)
+        writer.write(out)
+
+
+def zip_name(index, recipe) -> str:
+    return f"{index:04d}-{slugify(recipe.name) or recipe.id}.pdf"
+
+
+class _ChunkWriter:
+    """Destino de escritura sin seek para zipfile: guarda lo escrito hasta que se lee."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(recipes, workers=None):
+    """
+    Genera, por partes, un ZIP con un PDF por receta. Cada PDF se envía en
+    cuanto está listo y se borra del disco, así la memoria y el espacio
+    temporal no dependen del número de recetas.
+    """
+    sink = _ChunkWriter()
+    with tempfile.TemporaryDirectory() as directory:
+        # Los PDF ya vienen comprimidos: guardarlos tal cual
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            for index, (recipe, path, _pages) in enumerate(iter_rendered(recipes, directory, workers), start=1):
+                archive.write(path, zip_name(index, recipe))
+                path.unlink()
+                yield sink.drain()
+        yield sink.drain()
+
+
+def write_zip(recipes, out, workers=None):
+    """Escribe en 'out' un ZIP con un PDF por receta."""
+    for chunk in iter_zip(recipes, workers):
+        out.write(chunk)
@@ -0,0 +1,99 @@
+"""
+Exportación masiva del catálogo en CSV o NDJSON (ver ``manage.py
+export_recipes`` y ``views.cookbook_export`` con ?format=csv o ndjson).
+
+El CSV tiene las columnas que lee ``recipes.importer``, con ingredientes y
+pasos escritos como literales de lista de Python: exportar e importar de
+vuelta deja el catálogo igual (los hashes de fila coinciden, así que la
+importación no escribe nada). NDJSON entrega un objeto JSON por receta y
+por línea.
+
+Las recetas se recorren con ``.iterator(chunk_size)`` y sus ingredientes y
+pasos se traen por bloque, una consulta por relación: la memoria no depende
+del tamaño del catálogo y las consultas crecen con los bloques, no con las
+recetas.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Ingredient, Step
+
+CSV = "csv"
+NDJSON = "ndjson"
+MEDIA_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    NDJSON: "application/x-ndjson; charset=utf-8",
+}
+FORMATS = tuple(MEDIA_TYPES)
+
+# Columnas de recipes.importer, en el mismo orden
+COLUMNS = ("recipe name", "preparation time", "min_portion", "max_portion", "ingredients", "steps")
+
+# Recetas por consulta (y por prefetch de ingredientes y pasos)
+CHUNK_SIZE = 500
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Itera las recetas de 'queryset' como dicts planos, por bloques de 'chunk_size'."""
+    queryset = queryset.only(
+        "id", "name", "preparation_time", "min_portion", "max_portion"
+    ).prefetch_related(
+        Prefetch("ingredients", queryset=Ingredient.objects.only(
+            "id", "recipe_id", "name", "position"
+        ).order_by("position", "id")),
+        Prefetch("steps", queryset=Step.objects.only(
+            "id", "recipe_id", "order", "description"
+        ).order_by("order", "id")),
+    )
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            "id": recipe.pk,
+            "name": recipe.name,
+            "preparation_time": recipe.preparation_time,
+            "min_portion": recipe.min_portion,
+            "max_portion": recipe.max_portion,
+            "ingredients": [ingredient.name for ingredient in recipe.ingredients.all()],
+            # La descripción tal como se importó ("1-Batir."), no la limpia
+            "steps": [step.description for step in recipe.steps.all()],
+        }
+
+
+class _Echo:
+    """'Archivo' para csv.writer que devuelve la línea en vez de escribirla."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    return "" if value is None else str(value)
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo(), lineterminator="\n")
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            row["name"],
+            _cell(row["preparation_time"]),
+            _cell(row["min_portion"]),
+            _cell(row["max_portion"]),
+            # repr de una lista de str es un literal que ast.literal_eval lee igual
+            repr(row["ingredients"]),
+            repr(row["steps"]),
+        ])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_lines(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """Líneas (str) de la exportación de 'queryset'; ValueError si el formato no existe."""
+    if export_format not in FORMATS:
+        raise ValueError(f"'format' debe ser uno de: {', '.join(FORMATS)}")
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    return csv_lines(rows) if export_format == CSV else ndjson_lines(rows)
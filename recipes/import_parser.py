@@ -0,0 +1,165 @@
+"""
+Interpreta las filas del CSV de recetas (ver recipes.importer).
+
+Las columnas de ingredientes y pasos vienen como literales de lista de
+Python ("['1 taza de harina', 'Sal, pimienta a gusto']"), con comillas
+simples o dobles según lo que contenga cada elemento. Se leen con
+``ast.literal_eval``, que nunca ejecuta código; si la celda no es un
+literal válido se cae a un lector tolerante que respeta las comillas.
+
+Además de convertir la fila, aquí se normalizan los nombres y se
+interpretan los ingredientes, que es casi todo el trabajo de CPU de la
+importación. El módulo no usa el ORM, así que ``parse_rows`` puede correr
+en otros procesos (se crean con "spawn", sin Django configurado).
+"""
+import ast
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from .ingredient_parser import parse_ingredient
+from .search import normalize_text
+
+# Cambiarla si cambia cómo se interpreta una fila: obliga a reimportar todas
+ROW_HASH_VERSION = 1
+
+
+@dataclass(frozen=True)
+class IngredientRow:
+    name: str
+    name_normalized: str = ""
+    quantity: Optional[float] = None
+    unit: str = ""
+    canonical: str = ""
+
+
+@dataclass(frozen=True)
+class RecipeRow:
+    """Una fila del CSV ya convertida."""
+    name: str
+    name_normalized: str = ""
+    preparation_time: Optional[float] = None
+    min_portion: Optional[int] = None
+    max_portion: Optional[int] = None
+    ingredients: Tuple[IngredientRow, ...] = ()
+    steps: Tuple[str, ...] = ()
+    # Hash de lo que se importa de la fila (ver row_hash)
+    source_hash: str = ""
+
+
+def _split_quoted(text):
+    """
+    Lector tolerante de "['a', 'b', 'c']" mal escrito: separa por comas
+    fuera de comillas y quita las comillas de cada elemento. Una comilla
+    solo cierra el elemento si la sigue una coma o el final ("'Servir
+    d'inmediato'" es un solo elemento).
+    """
+    items = []
+    current = []
+    quote = None
+    escaped = False
+    for index, char in enumerate(text):
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == "\\" and quote:
+            escaped = True
+        elif quote:
+            if char == quote and text[index + 1:].lstrip()[:1] in ("", ","):
+                quote = None
+            else:
+                current.append(char)
+        elif char in "'\"" and not "".join(current).strip():
+            quote = char
+            current = []
+        elif char == ",":
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current))
+    return items
+
+
+def parse_list(raw) -> List[str]:
+    """Elementos no vacíos de una celda escrita como lista ("['uno', 'dos']")."""
+    raw = (raw or "").strip()
+    if not raw:
+        return []
+    try:
+        value = ast.literal_eval(raw)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        text = raw[1:] if raw.startswith("[") else raw
+        text = text[:-1] if text.endswith("]") else text
+        value = _split_quoted(text)
+    if isinstance(value, (str, int, float)):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"se esperaba una lista: {raw[:50]}")
+    items = (str(item).strip() for item in value if item is not None)
+    return [item for item in items if item]
+
+
+def _number(value, convert):
+    value = (value or "").strip()
+    return convert(value) if value else None
+
+
+def parse_ingredient_row(name) -> IngredientRow:
+    parsed = parse_ingredient(name)
+    return IngredientRow(
+        name=name,
+        name_normalized=normalize_text(name),
+        quantity=parsed.quantity,
+        unit=parsed.unit,
+        canonical=parsed.name,
+    )
+
+
+def row_hash(name, preparation_time, min_portion, max_portion, ingredients, steps) -> str:
+    """sha256 de los datos ya convertidos de una fila (no del texto del CSV)."""
+    content = [ROW_HASH_VERSION, name, preparation_time, min_portion, max_portion, list(ingredients), list(steps)]
+    payload = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_row(row) -> Optional[RecipeRow]:
+    """RecipeRow de una fila del CSV (dict por columna); None si no trae nombre."""
+    name = (row.get("recipe name") or "").strip()
+    if not name:
+        return None
+    preparation_time = _number(row.get("preparation time"), float)
+    min_portion = _number(row.get("min_portion"), int)
+    max_portion = _number(row.get("max_portion"), int)
+    ingredients = parse_list(row.get("ingredients"))
+    steps = parse_list(row.get("steps"))
+    return RecipeRow(
+        name=name,
+        name_normalized=normalize_text(name),
+        preparation_time=preparation_time,
+        min_portion=min_portion,
+        max_portion=max_portion,
+        ingredients=tuple(parse_ingredient_row(item) for item in ingredients),
+        steps=tuple(steps),
+        source_hash=row_hash(name, preparation_time, min_portion, max_portion, ingredients, steps),
+    )
+
+
+def parse_rows(rows, first_row=1):
+    """
+    Convierte una lista de filas; devuelve (RecipeRow, filas sin nombre).
+    'first_row' es el número de la primera fila, para los mensajes de error.
+    """
+    parsed = []
+    skipped = 0
+    for number, row in enumerate(rows, start=first_row):
+        try:
+            recipe = parse_row(row)
+        except ValueError as e:
+            raise ValueError(f"Fila {number}: {e}") from e
+        if recipe is None:
+            skipped += 1
+        else:
+            parsed.append(recipe)
+    return parsed, skipped
@@ -0,0 +1,420 @@
+"""
+Importación masiva de recetas desde CSV (ver ``manage.py import_recipes``).
+
+Las filas se convierten por lotes (``recipes.import_parser``) en un pool de
+procesos y el proceso actual, el único que escribe, importa cada lote en
+una transacción que:
+
+- busca de una vez las recetas que ya existen con esos nombres y salta
+  las que no cambiaron desde la última importación (``Recipe.source_hash``),
+- crea las nuevas con ``bulk_create`` y actualiza las que cambiaron con
+  ``bulk_update``,
+- deja los ingredientes y pasos de cada receta tocada iguales a los de su
+  fila: crea los que faltan, borra los que ya no están y conserva (con su
+  posición y el avance de los usuarios) los que siguen.
+
+Así, volver a importar un archivo grande cuesta lo que cambió en él.
+
+El CSV se lee en streaming (la memoria no depende del tamaño del archivo)
+y cada lote guarda en la misma transacción un ``ImportCheckpoint`` con el
+byte y la fila hasta donde llegó: si la importación se interrumpe, la
+siguiente del mismo archivo continúa desde ahí.
+
+``bulk_create`` no dispara las señales de ``recipes.signals``, así que aquí
+se calcula lo mismo que ellas (nombres normalizados, ingredientes
+interpretados, posiciones, descripción limpia de los pasos) y al terminar
+cada lote se reindexa la búsqueda y se invalidan los caches de las recetas
+tocadas.
+"""
+import csv
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import reset_queries, transaction
+
+from . import pantry, pdf_cache, progress, search
+from .caching import bump_version, recipe_version_name
+from .import_parser import parse_rows
+from .models import CanonicalIngredient, ImportCheckpoint, Ingredient, Recipe, Step, clean_step_description
+
+# Recetas por transacción
+BATCH_SIZE = 500
+# Bytes del inicio y del final del archivo que entran en su huella
+FINGERPRINT_BYTES = 1024 * 1024
+# Con menos lotes que esto no vale la pena levantar procesos
+PARALLEL_MIN_CHUNKS = 4
+
+
+def max_workers() -> int:
+    return getattr(settings, "IMPORT_PARSE_WORKERS", None) or os.cpu_count() or 1
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    ingredients: int = 0
+    steps: int = 0
+    skipped: int = 0
+    # Recetas iguales a la última importación (no se tocaron)
+    unchanged: int = 0
+    # Ingredientes y pasos borrados porque ya no están en su fila
+    removed: int = 0
+    # Filas ya importadas antes de reanudar
+    resumed_rows: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def seconds(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def _canonical_ids(names):
+    """{nombre: id} de CanonicalIngredient, creando los que falten."""
+    names = set(filter(None, names))
+    if not names:
+        return {}
+    ids = dict(CanonicalIngredient.objects.filter(name__in=names).values_list("name", "id"))
+    missing = names - ids.keys()
+    if missing:
+        CanonicalIngredient.objects.bulk_create(
+            [CanonicalIngredient(name=name) for name in missing], ignore_conflicts=True,
+        )
+        ids.update(CanonicalIngredient.objects.filter(name__in=missing).values_list("name", "id"))
+    return ids
+
+
+def _assign_positions(model, items):
+    """Da a los ingredientes o pasos nuevos posiciones sin usar en su receta (ver progress.reserve_positions)."""
+    positions = progress.reserve_positions(model, Counter(item.recipe_id for item in items))
+    for item in items:
+        item.position = positions[item.recipe_id]
+        positions[item.recipe_id] += 1
+
+
+def _import_batch(batch, creator, stats):
+    """Importa un lote en una transacción; devuelve los ids de las recetas tocadas."""
+    # Con nombres repetidos en el lote gana la última fila
+    rows = {row.name: row for row in batch}
+
+    recipes = {}
+    existing = Recipe.objects.filter(name__in=rows).only(
+        "id", "name", "preparation_time", "min_portion", "max_portion", "source_hash",
+    )
+    for recipe in existing.order_by("id"):
+        recipes.setdefault(recipe.name, recipe)
+
+    # Las filas iguales a la última importación no se tocan
+    changed = []
+    for name, recipe in recipes.items():
+        row = rows[name]
+        if recipe.source_hash == row.source_hash:
+            stats.unchanged += 1
+            continue
+        recipe.preparation_time = row.preparation_time
+        recipe.min_portion = row.min_portion
+        recipe.max_portion = row.max_portion
+        recipe.source_hash = row.source_hash
+        changed.append(recipe)
+    Recipe.objects.bulk_update(changed, ["preparation_time", "min_portion", "max_portion", "source_hash"])
+    stats.updated += len(changed)
+    changed_ids = [recipe.pk for recipe in changed]
+
+    new = [
+        Recipe(
+            name=name,
+            name_normalized=row.name_normalized,
+            preparation_time=row.preparation_time,
+            min_portion=row.min_portion,
+            max_portion=row.max_portion,
+            source_hash=row.source_hash,
+            creator=creator,
+        )
+        for name, row in rows.items()
+        if name not in recipes
+    ]
+    if new:
+        if creator is None:
+            raise ValueError("Hay recetas nuevas y no se indicó su creador")
+        Recipe.objects.bulk_create(new)
+        if any(recipe.pk is None for recipe in new):
+            # Bases sin RETURNING: recuperar los ids por nombre
+            created = Recipe.objects.filter(name__in=[r.name for r in new]).order_by("id")
+            ids = dict(created.values_list("name", "id"))
+            for recipe in new:
+                recipe.pk = ids[recipe.name]
+        stats.created += len(new)
+
+    targets = changed + new
+    if not targets:
+        return []
+
+    ingredients, stale_ingredients = _diff_ingredients(targets, rows)
+    steps, moved_steps, stale_steps = _diff_steps(targets, rows)
+
+    # El borrado pasa por las señales: limpia el avance de esas posiciones
+    Ingredient.objects.filter(pk__in=stale_ingredients).delete()
+    Step.objects.filter(pk__in=stale_steps).delete()
+    Ingredient.objects.bulk_create(ingredients)
+    Step.objects.bulk_create(steps)
+    Step.objects.bulk_update(moved_steps, ["order"])
+    stats.ingredients += len(ingredients)
+    stats.steps += len(steps)
+    stats.removed += len(stale_ingredients) + len(stale_steps)
+
+    touched = [recipe.pk for recipe in targets]
+    search.index_recipes(touched)
+    transaction.on_commit(lambda: _invalidate_pdfs(changed_ids))
+    return touched
+
+
+def _current_items(model, recipe_ids, fields):
+    """{id de receta: [(id, *fields)]} de los ingredientes o pasos actuales."""
+    items = {}
+    for item in model.objects.filter(recipe_id__in=recipe_ids).order_by("id").values_list("recipe_id", "id", *fields):
+        items.setdefault(item[0], []).append(item[1:])
+    return items
+
+
+def _diff_ingredients(recipes, rows):
+    """
+    (ingredientes a crear, ids a borrar) para que cada receta quede con los
+    de su fila. Los que siguen iguales conservan su id y su posición (y con
+    ella el avance de los usuarios).
+    """
+    recipe_ids = [recipe.pk for recipe in recipes]
+    current = _current_items(Ingredient, recipe_ids, ["name"])
+    canonical_ids = _canonical_ids(
+        ingredient.canonical for recipe in recipes for ingredient in rows[recipe.name].ingredients
+    )
+
+    created = []
+    stale = []
+    for recipe in recipes:
+        remaining = {}
+        for ingredient_id, name in current.get(recipe.pk, []):
+            remaining.setdefault(name, []).append(ingredient_id)
+        for ingredient in rows[recipe.name].ingredients:
+            if remaining.get(ingredient.name):
+                remaining[ingredient.name].pop(0)
+                continue
+            created.append(Ingredient(
+                recipe_id=recipe.pk,
+                name=ingredient.name,
+                name_normalized=ingredient.name_normalized,
+                quantity=ingredient.quantity,
+                unit=ingredient.unit,
+                canonical_id=canonical_ids.get(ingredient.canonical),
+            ))
+        stale.extend(ingredient_id for ids in remaining.values() for ingredient_id in ids)
+    _assign_positions(Ingredient, created)
+    return created, stale
+
+
+def _diff_steps(recipes, rows):
+    """
+    (pasos a crear, pasos a los que solo les cambia el orden, ids a borrar).
+    Un paso se reconoce por su descripción, así que reordenar no pierde el
+    avance.
+    """
+    recipe_ids = [recipe.pk for recipe in recipes]
+    current = _current_items(Step, recipe_ids, ["order", "description"])
+
+    created = []
+    moved = []
+    stale = []
+    for recipe in recipes:
+        remaining = {}
+        for step_id, order, description in current.get(recipe.pk, []):
+            remaining.setdefault(description, []).append((step_id, order))
+        for order, description in enumerate(rows[recipe.name].steps, start=1):
+            if remaining.get(description):
+                step_id, old_order = remaining[description].pop(0)
+                if old_order != order:
+                    moved.append(Step(pk=step_id, order=order))
+                continue
+            created.append(Step(
+                recipe_id=recipe.pk,
+                order=order,
+                description=description,
+                cleaned_description=clean_step_description(description),
+            ))
+        stale.extend(step_id for steps in remaining.values() for step_id, _order in steps)
+    _assign_positions(Step, created)
+    return created, moved, stale
+
+
+def _invalidate_pdfs(recipe_ids):
+    for recipe_id in recipe_ids:
+        pdf_cache.invalidate(recipe_id)
+
+
+def import_chunks(chunks, creator=None, on_batch=None, stats=None, before_commit=None) -> ImportStats:
+    """
+    Importa 'chunks' (iterable de Chunk), un lote por transacción.
+    'creator' es el usuario de las recetas nuevas; 'before_commit(chunk)'
+    se llama dentro de la transacción de cada lote y 'on_batch(stats)'
+    después de confirmarlo.
+    """
+    stats = stats or ImportStats()
+    for chunk in chunks:
+        with transaction.atomic():
+            touched = _import_batch(chunk.rows, creator, stats) if chunk.rows else []
+            if before_commit is not None:
+                before_commit(chunk)
+        stats.rows += len(chunk.rows)
+        stats.skipped += chunk.skipped
+
+        # Lo que harían las señales, una vez por lote
+        bump_version("catalog")
+        for recipe_id in touched:
+            bump_version(recipe_version_name(recipe_id))
+        # Con DEBUG, Django guarda cada consulta (y los INSERT masivos son enormes)
+        reset_queries()
+        if on_batch is not None:
+            on_batch(stats)
+
+    if stats.rows:
+        pantry.reset_index()
+    return stats
+
+
+def file_fingerprint(path) -> str:
+    """
+    Huella del archivo: sha256 de su tamaño y de su primer y último MiB.
+    Distingue un archivo de otro (o de una versión editada) sin leer
+    completos archivos de varios GB.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        digest.update(str(size).encode())
+        file.seek(0)
+        digest.update(file.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            file.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class CsvReader:
+    """
+    Lee las filas de un CSV (abierto en binario) desde el byte 'offset', una
+    línea a la vez. 'offset' queda siempre justo después de la última fila
+    entregada y 'rows' cuenta las filas leídas en esta pasada.
+    """
+
+    def __init__(self, file, offset=0):
+        self.file = file
+        self.fieldnames = next(csv.reader([file.readline().decode("utf-8-sig")]))
+        self.offset = max(offset, file.tell())
+        self.rows = 0
+        file.seek(self.offset)
+
+    def _lines(self):
+        for line in self.file:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+    def __iter__(self):
+        # csv.reader pide las líneas de a una, sin leer por adelantado
+        for values in csv.reader(self._lines()):
+            if not values:
+                continue
+            self.rows += 1
+            yield dict(zip(self.fieldnames, values))
+
+
+@dataclass
+class Chunk:
+    """Lote de filas convertidas y hasta dónde del archivo llega."""
+    rows: list
+    skipped: int
+    offset: int
+    # Filas del archivo leídas (en esta pasada) hasta el final del lote
+    read: int
+
+
+def _raw_chunks(reader, size, first_row):
+    """(filas, número de la primera, offset, filas leídas) de a 'size' filas."""
+    rows = []
+    for row in reader:
+        rows.append(row)
+        if len(rows) >= size:
+            yield rows, first_row + reader.rows - len(rows), reader.offset, reader.rows
+            rows = []
+    if rows:
+        yield rows, first_row + reader.rows - len(rows), reader.offset, reader.rows
+
+
+def _completed(entry):
+    rows, skipped = entry[-1].result()
+    return Chunk(rows, skipped, *entry[:-1])
+
+
+def parsed_chunks(reader, batch_size=BATCH_SIZE, workers=None, first_row=1):
+    """
+    Convierte las filas de 'reader' de a 'batch_size' y entrega cada Chunk
+    en orden. Con varios procesos cada lote se convierte en el pool y se
+    mantienen a lo más dos lotes por proceso en curso; quien escribe en la
+    base es siempre el proceso actual.
+    """
+    workers = max_workers() if workers is None else workers
+    raw = _raw_chunks(reader, batch_size, first_row)
+
+    first = list(islice(raw, PARALLEL_MIN_CHUNKS))
+    if workers <= 1 or len(first) < PARALLEL_MIN_CHUNKS:
+        for rows, number, offset, read in chain(first, raw):
+            yield Chunk(*parse_rows(rows, number), offset, read)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for rows, number, offset, read in chain(first, raw):
+            pending.append((offset, read, pool.submit(parse_rows, rows, number)))
+            while len(pending) >= workers * 2:
+                yield _completed(pending.popleft())
+        while pending:
+            yield _completed(pending.popleft())
+
+
+def import_file(path, creator=None, batch_size=BATCH_SIZE, on_batch=None, restart=False,
+                workers=None) -> ImportStats:
+    """
+    Importa el CSV de 'path' por lotes, guardando con cada lote un
+    ImportCheckpoint. Si una importación anterior del mismo archivo quedó a
+    medias, continúa donde se confirmó el último lote (salvo con 'restart').
+    """
+    fingerprint = file_fingerprint(path)
+    if restart:
+        ImportCheckpoint.objects.filter(fingerprint=fingerprint).delete()
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        fingerprint=fingerprint, defaults={"source": str(path)},
+    )
+    stats = ImportStats(resumed_rows=checkpoint.rows)
+
+    def save_checkpoint(chunk):
+        checkpoint.offset = chunk.offset
+        checkpoint.rows = stats.resumed_rows + chunk.read
+        checkpoint.save(update_fields=["offset", "rows", "updated_at"])
+
+    with open(path, "rb") as file:
+        reader = CsvReader(file, checkpoint.offset)
+        chunks = parsed_chunks(reader, batch_size, workers, first_row=stats.resumed_rows + 1)
+        import_chunks(chunks, creator, on_batch, stats, save_checkpoint)
+
+    checkpoint.delete()
+    return stats
@@ -0,0 +1,142 @@
+"""
+Interpreta los ingredientes escritos a mano ("300 grs de carne asada,
+puede ser más", "1 1/2 taza de harina cernida", "Sal a gusto") y separa
+cantidad, unidad y nombre canónico del ingrediente.
+
+El nombre canónico va normalizado (sin tildes, minúsculas, en singular) y
+sin cantidades ni preparaciones, para poder filtrar por igualdad contra el
+vocabulario de ``CanonicalIngredient``.
+"""
+import re
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Optional
+
+from .search import normalize_text
+
+TO_TASTE = "a gusto"
+
+# Alias de unidades -> unidad canónica ("" = unidades sueltas)
+UNIT_ALIASES = {
+    "g": "g", "gr": "g", "grs": "g", "gramo": "g", "gramos": "g",
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogramo": "kg", "kilogramos": "kg",
+    "ml": "ml", "cc": "ml", "mililitro": "ml", "mililitros": "ml",
+    "l": "l", "lt": "l", "lts": "l", "litro": "l", "litros": "l",
+    "taza": "taza", "tazas": "taza", "tz": "taza",
+    "cucharada": "cucharada", "cucharadas": "cucharada", "cda": "cucharada", "cdas": "cucharada",
+    "cucharadita": "cucharadita", "cucharaditas": "cucharadita",
+    "cdta": "cucharadita", "cdtas": "cucharadita", "cdita": "cucharadita", "cditas": "cucharadita",
+    "pizca": "pizca", "pizcas": "pizca",
+    "diente": "diente", "dientes": "diente",
+    "trozo": "trozo", "trozos": "trozo",
+    "lata": "lata", "latas": "lata",
+    "paquete": "paquete", "paquetes": "paquete",
+    "sobre": "sobre", "sobres": "sobre",
+    "atado": "atado", "atados": "atado",
+    "rama": "rama", "ramas": "rama",
+    "rebanada": "rebanada", "rebanadas": "rebanada",
+    "tarro": "tarro", "tarros": "tarro",
+    "unidad": "", "unidades": "", "u": "",
+}
+
+# Números escritos con palabras
+NUMBER_WORDS = {
+    "un": 1, "una": 1, "uno": 1, "medio": 0.5, "media": 0.5,
+    "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "doce": 12,
+}
+
+UNICODE_FRACTIONS = {
+    "½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4",
+    "⅕": "1/5", "⅛": "1/8",
+}
+
+# Tamaños y preparaciones que no cambian qué ingrediente es
+DESCRIPTORS = {
+    "grande", "grandes", "mediana", "medianas", "mediano", "medianos",
+    "pequena", "pequenas", "pequeno", "pequenos", "chica", "chicas", "chico", "chicos",
+    "picado", "picada", "picados", "picadas", "rallado", "rallada", "rallados", "ralladas",
+    "cernido", "cernida", "cernidos", "cernidas", "molido", "molida", "molidos", "molidas",
+    "fresco", "fresca", "frescos", "frescas", "pelado", "pelada", "pelados", "peladas",
+    "cortado", "cortada", "cortados", "cortadas", "derretido", "derretida",
+    "batido", "batida", "batidos", "batidas", "cocido", "cocida", "cocidos", "cocidas",
+    "aprox", "aproximadamente",
+}
+
+# Lo que sigue a estas marcas es un comentario o una alternativa
+_CUT_RE = re.compile(r"(?<!\d),|,(?!\d)|;|\(|\s+o\s+|\s+y/o\s+|\s+y\s+|\s+por\s+|\s+para\s+|\s+a\s+gusto\b|\s+opcional\b")
+
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_QUANTITY_RE = re.compile(
+    rf"^(?P<fnum>\d+)/(?P<fden>\d+)"
+    rf"|^(?P<whole>{_NUMBER})(?:\s+(?P<num>\d+)/(?P<den>\d+))?"
+)
+_RANGE_RE = re.compile(rf"^\s*(?:-|a)\s*{_NUMBER}(?:/\d+)?")
+
+
+@dataclass(frozen=True)
+class ParsedIngredient:
+    quantity: Optional[float]
+    unit: str
+    name: str
+
+
+def singular(word: str) -> str:
+    # Plurales simples en español: papas -> papa, limones -> limon
+    if len(word) > 4 and word.endswith("es") and word[-3] not in "aeiou":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _parse_quantity(text: str):
+    """Lee una cantidad al inicio: "300", "1,5", "1/2", "1 1/2", "medio"."""
+    match = _QUANTITY_RE.match(text)
+    if match:
+        if match.group("fnum"):
+            quantity = Fraction(int(match.group("fnum")), int(match.group("fden")) or 1)
+        else:
+            quantity = Fraction(match.group("whole").replace(",", "."))
+            if match.group("num"):
+                quantity += Fraction(int(match.group("num")), int(match.group("den")) or 1)
+        rest = text[match.end():]
+        # Rangos "2-3" o "2 a 3": se guarda el mínimo
+        rng = _RANGE_RE.match(rest)
+        if rng:
+            rest = rest[rng.end():]
+        return float(quantity), rest.strip()
+
+    first, _, rest = text.partition(" ")
+    if first in NUMBER_WORDS:
+        return float(NUMBER_WORDS[first]), rest.strip()
+    return None, text
+
+
+def parse_ingredient(text: str) -> ParsedIngredient:
+    """Separa cantidad, unidad y nombre canónico de un ingrediente."""
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f" {fraction}")
+    normalized = normalize_text(text)
+
+    to_taste = bool(re.search(r"\ba\s+gusto\b", normalized))
+    main = _CUT_RE.split(normalized, maxsplit=1)[0].strip()
+
+    quantity, rest = _parse_quantity(main)
+
+    unit = ""
+    words = rest.split()
+    unit_word = words[0].rstrip(".") if words else ""
+    if unit_word in UNIT_ALIASES and (quantity is not None or len(words) > 1):
+        unit = UNIT_ALIASES[unit_word]
+        words = words[1:]
+    words = [word for word in words if word not in DESCRIPTORS]
+    if words and words[0] in ("de", "del"):
+        words = words[1:]
+    if words:
+        words[0] = singular(words[0])
+    name = " ".join(words)
+
+    if to_taste and quantity is None and not unit:
+        unit = TO_TASTE
+    return ParsedIngredient(quantity=quantity, unit=unit, name=name)
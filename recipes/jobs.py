@@ -0,0 +1,226 @@
+"""
+Cola de reportes guardada en la base de datos.
+
+Las vistas crean un ``ReportJob`` pendiente y responden de inmediato; uno o
+varios procesos ``manage.py report_worker`` toman los trabajos en orden de
+llegada, escriben el archivo en ``REPORT_JOBS_DIR`` y lo marcan como listo.
+Un trabajo se toma con un UPDATE condicionado a que siga pendiente, así que
+dos workers nunca procesan el mismo.
+
+Cada tipo de trabajo (``kind``) tiene un validador de parámetros, que se
+usa al encolar, y una función que escribe el archivo y devuelve su nombre
+y tipo de contenido.
+"""
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import cookbook, json_reports, reports
+from .models import JsonHistory, Recipe, ReportJob
+from .report_generators import PdfRecipeReportGenerator
+
+logger = logging.getLogger(__name__)
+
+RECIPE_PDF = "recipe_pdf"
+COOKBOOK = "cookbook"
+JSON_PDF = "json_pdf"
+
+# Intentos antes de dar por fallido un trabajo que quedó "en proceso"
+MAX_ATTEMPTS = 3
+
+
+def jobs_dir() -> Path:
+    return Path(getattr(settings, "REPORT_JOBS_DIR", Path(settings.BASE_DIR) / "report_jobs"))
+
+
+def job_timeout() -> timedelta:
+    """Tiempo tras el cual un trabajo en proceso se considera abandonado."""
+    return timedelta(seconds=getattr(settings, "REPORT_JOB_TIMEOUT", 15 * 60))
+
+
+def job_retention() -> timedelta:
+    """Cuánto se guardan los resultados antes de borrarlos."""
+    return timedelta(seconds=getattr(settings, "REPORT_JOB_RETENTION", 24 * 60 * 60))
+
+
+# ---------------------------------------------------------------------------
+# Tipos de trabajo
+# ---------------------------------------------------------------------------
+
+def _int_param(params, name):
+    try:
+        return int(params[name])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"'{name}' debe ser un número")
+
+
+def _clean_recipe_pdf(params, user):
+    recipe_id = _int_param(params, "recipe_id")
+    if not Recipe.objects.filter(pk=recipe_id).exists():
+        raise ValueError("La receta no existe")
+    return {"recipe_id": recipe_id}
+
+
+def _write_recipe_pdf(job, out):
+    recipe = reports.load_recipe(job.params["recipe_id"])
+    if recipe is None:
+        raise Recipe.DoesNotExist("La receta ya no existe")
+    PdfRecipeReportGenerator().write(recipe, out)
+    return f"receta_{recipe.id}.pdf", "application/pdf"
+
+
+def _clean_cookbook(params, user):
+    cleaned = {
+        "source": params.get("source", "search"),
+        "format": params.get("format", cookbook.PDF),
+        "q": str(params.get("q", "")),
+        "ingredient": str(params.get("ingredient", "")),
+        "max_time": str(params.get("max_time", "")),
+    }
+    if cleaned["format"] not in cookbook.FORMATS:
+        raise ValueError("'format' debe ser pdf o zip")
+    recipes, _title = cookbook.export_queryset(cleaned["source"], cleaned, user)
+    limit = cookbook.max_recipes()
+    if recipes[:limit + 1].count() > limit:
+        raise ValueError(f"Se pueden exportar hasta {limit} recetas; agrega filtros.")
+    return cleaned
+
+
+def _write_cookbook(job, out):
+    params = job.params
+    recipes, title = cookbook.export_queryset(params["source"], params, job.user)
+    recipes = reports.recipe_data(recipes)
+    if params["format"] == cookbook.ZIP:
+        cookbook.write_zip(recipes, out)
+        return "recetario.zip", "application/zip"
+    cookbook.write_pdf(recipes, out, title=title)
+    return "recetario.pdf", "application/pdf"
+
+
+def _clean_json_pdf(params, user):
+    json_id = _int_param(params, "json_id")
+    if not JsonHistory.objects.filter(pk=json_id).exists():
+        raise ValueError("El JSON no existe")
+    engine = params.get("engine") or None
+    if engine is not None and engine not in json_reports.ENGINES:
+        raise ValueError("'engine' debe ser reportlab o xhtml2pdf")
+    return {"json_id": json_id, "engine": engine}
+
+
+def _write_json_pdf(job, out):
+    entry = JsonHistory.objects.get(pk=job.params["json_id"])
+    json_reports.write_pdf(entry, out, job.params.get("engine"))
+    return json_reports.report_filename(entry), "application/pdf"
+
+
+# kind -> (validar parámetros, escribir el archivo)
+KINDS = {
+    RECIPE_PDF: (_clean_recipe_pdf, _write_recipe_pdf),
+    COOKBOOK: (_clean_cookbook, _write_cookbook),
+    JSON_PDF: (_clean_json_pdf, _write_json_pdf),
+}
+
+
+# ---------------------------------------------------------------------------
+# Cola
+# ---------------------------------------------------------------------------
+
+def submit(kind, params, user=None) -> ReportJob:
+    """Valida y encola un trabajo; lanza ValueError si los parámetros no sirven."""
+    if kind not in KINDS:
+        raise ValueError(f"'kind' debe ser uno de: {', '.join(sorted(KINDS))}")
+    clean, _write = KINDS[kind]
+    if user is not None and not user.is_authenticated:
+        user = None
+    return ReportJob.objects.create(kind=kind, params=clean(params, user), user=user)
+
+
+def claim_next():
+    """Toma el trabajo pendiente más antiguo (o None si no hay)."""
+    candidates = ReportJob.objects.filter(status=ReportJob.PENDING).order_by("created_at")
+    for job_id in candidates.values_list("id", flat=True)[:10]:
+        claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.PENDING).update(
+            status=ReportJob.RUNNING, started_at=timezone.now(), attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return ReportJob.objects.select_related("user").get(pk=job_id)
+    return None
+
+
+def run(job):
+    """Genera el archivo de 'job' y lo deja listo o fallido."""
+    _clean, write = KINDS[job.kind]
+    directory = jobs_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            filename, content_type = write(job, out)
+        path = directory / str(job.pk)
+        os.replace(tmp_name, path)
+    except Exception as e:
+        os.unlink(tmp_name)
+        logger.exception("Report job %s failed", job.pk)
+        job.status = ReportJob.FAILED
+        job.error = f"{type(e).__name__}: {e}"
+    else:
+        job.status = ReportJob.DONE
+        job.result_path = str(path)
+        job.filename = filename
+        job.content_type = content_type
+        job.error = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "result_path", "filename", "content_type", "finished_at"])
+    return job
+
+
+def requeue_stale():
+    """Devuelve a la cola los trabajos de un worker que murió a medio camino."""
+    limit = timezone.now() - job_timeout()
+    stale = ReportJob.objects.filter(status=ReportJob.RUNNING, started_at__lt=limit)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=ReportJob.FAILED, error="El trabajo se abandonó demasiadas veces", finished_at=timezone.now(),
+    )
+    requeued = stale.update(status=ReportJob.PENDING)
+    return requeued, failed
+
+
+def purge_expired():
+    """Borra los trabajos terminados (y sus archivos) más viejos que la retención."""
+    expired = ReportJob.objects.filter(finished_at__lt=timezone.now() - job_retention())
+    for path in expired.exclude(result_path="").values_list("result_path", flat=True):
+        Path(path).unlink(missing_ok=True)
+    deleted, _ = expired.delete()
+    return deleted
+
+
+def work(once=False, poll_interval=1.0, housekeeping_interval=60.0):
+    """
+    Procesa trabajos hasta que se interrumpa. Con 'once' termina cuando la
+    cola queda vacía. Devuelve cuántos trabajos procesó.
+    """
+    processed = 0
+    next_housekeeping = 0.0
+    while True:
+        close_old_connections()
+        if time.monotonic() >= next_housekeeping:
+            requeue_stale()
+            purge_expired()
+            next_housekeeping = time.monotonic() + housekeeping_interval
+
+        job = claim_next()
+        if job is not None:
+            run(job)
+            processed += 1
+            continue
+        if once:
+            return processed
+        time.sleep(poll_interval)
@@ -0,0 +1,80 @@
+"""
+PDF de los JSON recibidos (``JsonHistory``), usado por la descarga desde el
+historial y por la cola de reportes (ver recipes.jobs).
+
+Hay dos motores:
+
+- ``reportlab`` (por defecto): ``JsonPdfGenerator`` dibuja el JSON directo.
+- ``xhtml2pdf``: arma la plantilla ``equipo_precedente/pdf_json_template.html``
+  y la convierte desde HTML; es bastante más lento y usa más memoria (ver
+  ``manage.py benchmark_reports --suite json``).
+
+El motor por defecto se cambia con ``JSON_PDF_ENGINE``.
+"""
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from .report_generators import JsonPdfGenerator
+
+TEMPLATE = "equipo_precedente/pdf_json_template.html"
+
+REPORTLAB = "reportlab"
+XHTML2PDF = "xhtml2pdf"
+ENGINES = (REPORTLAB, XHTML2PDF)
+
+
+class JsonReportError(Exception):
+    """xhtml2pdf no pudo convertir el HTML; 'html' es lo que se intentó convertir."""
+
+    def __init__(self, html):
+        super().__init__("Tuvimos algunos errores al generar el PDF")
+        self.html = html
+
+
+def report_context(entry):
+    return {
+        "json_data": json.dumps(entry.content, indent=4),
+        "id": entry.id,
+        "title": f"JSON Recibido #{entry.id}",
+    }
+
+
+def report_filename(entry):
+    return f"json_historial_{entry.id}.pdf"
+
+
+def write_html_pdf(entry, out):
+    """Escribe en 'out' el PDF de 'entry' generado desde HTML con xhtml2pdf."""
+    html = render_to_string(TEMPLATE, report_context(entry))
+    pdf = pisa.pisaDocument(
+        BytesIO(html.encode("UTF-8")),
+        out,
+        link_callback=lambda uri, rel: settings.STATIC_ROOT,
+    )
+    if pdf.err:
+        raise JsonReportError(html)
+
+
+def write_reportlab_pdf(entry, out):
+    """Escribe en 'out' el PDF de 'entry' dibujado directo con ReportLab."""
+    JsonPdfGenerator(now=timezone.localtime).write(entry, out)
+
+
+def default_engine():
+    return getattr(settings, "JSON_PDF_ENGINE", REPORTLAB)
+
+
+def write_pdf(entry, out, engine=None):
+    """Escribe en 'out' el PDF de 'entry' con 'engine' (o el motor por defecto)."""
+    engine = engine or default_engine()
+    if engine == XHTML2PDF:
+        write_html_pdf(entry, out)
+    elif engine == REPORTLAB:
+        write_reportlab_pdf(entry, out)
+    else:
+        raise ValueError(f"Motor de PDF desconocido: {engine}")
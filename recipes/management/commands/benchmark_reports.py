@@ -0,0 +1,154 @@
+import io
+import json
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase import pdfmetrics
+
+from recipes import json_reports
+from recipes.report_generators import PdfRecipeReportGenerator, RecipeData, word_width, wrap_text
+
+VOCABULARY = (
+    "picar la cebolla en cubos pequeños y sofreír en aceite de oliva hasta que esté "
+    "transparente agregar el ajo el pimentón el comino y el merkén revolver con cuchara "
+    "de palo durante dos minutos incorporar la carne y dorar por todos sus lados"
+).split()
+
+USABLE_WIDTH = letter[0] - 100  # márgenes de PdfRecipeReportGenerator
+
+
+def wrap_text_reference(text, max_width, font_name="Helvetica", font_size=12):
+    """Versión anterior de wrap_text: mide la línea completa en cada palabra."""
+    lines = []
+    current_line = ""
+    for word in text.split():
+        test_line = (current_line + " " + word).strip()
+        if pdfmetrics.stringWidth(test_line, font_name, font_size) <= max_width:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = word
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def json_payload(rng, records):
+    """JSON parecido a lo que llega a recibir_json_pdf, con 'records' recetas."""
+    return {
+        "origen": "benchmark",
+        "recetas": [
+            {
+                "id": n,
+                "nombre": f"Receta {n} con {rng.choice(VOCABULARY)}",
+                "tiempo": rng.randint(5, 120),
+                "ingredientes": [" ".join(rng.choices(VOCABULARY, k=4)) for _ in range(6)],
+                "pasos": [" ".join(rng.choices(VOCABULARY, k=30)) for _ in range(3)],
+            }
+            for n in range(records)
+        ],
+    }
+
+
+def peak_memory(func):
+    """Pico de memoria (bytes) reservada por Python mientras corre 'func'."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks report rendering: "wrap" times text wrapping and recipe PDFs on long '
+        'multi-paragraph steps; "json" compares the xhtml2pdf and ReportLab JSON PDF engines.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=['wrap', 'json', 'all'], default='all')
+        parser.add_argument('--sizes', default='10,50,100',
+                            help='JSON suite: comma-separated number of records per payload.')
+        parser.add_argument('--engines', default=','.join(json_reports.ENGINES),
+                            help='JSON suite: comma-separated engines to compare.')
+        parser.add_argument('--paragraphs', type=int, default=5, help='Paragraphs per step.')
+        parser.add_argument('--words', type=int, default=400, help='Words per paragraph.')
+        parser.add_argument('--steps', type=int, default=10, help='Steps per synthetic recipe.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported).')
+        parser.add_argument('--seed', type=int, default=360)
+
+    def handle(self, *args, **options):
+        if options['suite'] in ('wrap', 'all'):
+            self.bench_wrap(options)
+        if options['suite'] in ('json', 'all'):
+            self.bench_json(options)
+
+    def bench_wrap(self, options):
+        rng = random.Random(options['seed'])
+        steps = tuple(
+            "\n".join(
+                " ".join(rng.choice(VOCABULARY) for _ in range(options['words']))
+                for _ in range(options['paragraphs'])
+            )
+            for _ in range(options['steps'])
+        )
+        recipe = RecipeData(id=None, name="Receta de prueba", preparation_time=45,
+                            ingredients=tuple(f"{n} tazas de harina" for n in range(12)), steps=steps)
+        text = steps[0]
+        repeat = options['repeat']
+
+        self.stdout.write(
+            f"Step: {options['paragraphs']} paragraphs x {options['words']} words; "
+            f"recipe: {options['steps']} steps; best of {repeat}"
+        )
+
+        reference = best_of(repeat, lambda: [wrap_text_reference(p, USABLE_WIDTH) for p in text.splitlines()])
+        word_width.cache_clear()
+        cold = best_of(1, lambda: wrap_text(text, USABLE_WIDTH))
+        warm = best_of(repeat, lambda: wrap_text(text, USABLE_WIDTH))
+        self.stdout.write(f"wrap_text (previous, per step)  {reference * 1000:9.2f} ms")
+        self.stdout.write(f"wrap_text (cold cache)          {cold * 1000:9.2f} ms")
+        self.stdout.write(f"wrap_text (warm cache)          {warm * 1000:9.2f} ms  ({reference / warm:.1f}x)")
+
+        generator = PdfRecipeReportGenerator()
+        render = best_of(repeat, lambda: generator.generate(recipe))
+        self.stdout.write(f"PdfRecipeReportGenerator        {render * 1000:9.2f} ms per recipe")
+
+        info = word_width.cache_info()
+        self.stdout.write(self.style.SUCCESS(
+            f"Word width cache: {info.currsize} entries, {info.hits} hits, {info.misses} misses."
+        ))
+
+    def bench_json(self, options):
+        rng = random.Random(options['seed'])
+        engines = [engine for engine in options['engines'].split(',') if engine]
+        repeat = options['repeat']
+
+        self.stdout.write(f"JSON PDF engines, best of {repeat}")
+        self.stdout.write(f"{'records':>8} {'json KB':>8} {'engine':>10} {'ms/doc':>10} {'docs/s':>8} {'peak KB':>9} {'pdf KB':>8}")
+        for records in (int(size) for size in options['sizes'].split(',')):
+            entry = SimpleNamespace(id=records, content=json_payload(rng, records))
+            json_kb = len(json.dumps(entry.content)) / 1024
+            for engine in engines:
+                out = io.BytesIO()
+                seconds = best_of(repeat, lambda: json_reports.write_pdf(entry, io.BytesIO(), engine))
+                peak = peak_memory(lambda: json_reports.write_pdf(entry, out, engine))
+                self.stdout.write(
+                    f"{records:>8} {json_kb:>8.1f} {engine:>10} {seconds * 1000:>10.1f} "
+                    f"{1 / seconds:>8.1f} {peak / 1024:>9.0f} {len(out.getvalue()) / 1024:>8.0f}"
+                )
@@ -0,0 +1,61 @@
+# recipes/management/commands/export_recipes.py
+
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from recipes import exporter
+from recipes.models import Recipe
+
+class Command(BaseCommand):
+    help = 'Exports the recipe catalog as CSV (the format import_recipes reads) or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', type=str,
+                            help='File to write in the archives_csv directory (e.g., catalog.csv), or "-" for standard output.')
+        parser.add_argument('--format', choices=exporter.FORMATS,
+                            help='Output format (default: taken from the file extension, otherwise csv).')
+        parser.add_argument('--chunk-size', type=int, default=exporter.CHUNK_SIZE,
+                            help='Recipes fetched per query.')
+
+    def get_format(self, filename, export_format):
+        if export_format:
+            return export_format
+        extension = os.path.splitext(filename)[1].lstrip('.').lower()
+        return extension if extension in exporter.FORMATS else exporter.CSV
+
+    def handle(self, *args, **kwargs):
+        filename = kwargs['filename']
+        export_format = self.get_format(filename, kwargs['format'])
+        lines = exporter.iter_lines(Recipe.objects.order_by('id'), export_format, chunk_size=kwargs['chunk_size'])
+        started = time.monotonic()
+
+        if filename == '-':
+            count = 0
+            for count, line in enumerate(lines, start=1):
+                self.stdout.write(line, ending='')
+        else:
+            if not hasattr(settings, 'CSV_ARCHIVES_DIR'):
+                raise CommandError("CSV_ARCHIVES_DIR is not defined in your settings.py file.")
+            path = os.path.join(settings.CSV_ARCHIVES_DIR, filename)
+            # Written next to the target and renamed at the end, so an interrupted
+            # export never leaves a truncated file that import_recipes would accept
+            partial = f'{path}.partial'
+            try:
+                with open(partial, 'w', encoding='utf-8', newline='') as out:
+                    count = 0
+                    for count, line in enumerate(lines, start=1):
+                        out.write(line)
+                os.replace(partial, path)
+            except BaseException:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+
+        recipes = count - 1 if export_format == exporter.CSV else count
+        message = f'Exported {recipes} recipes as {export_format} in {time.monotonic() - started:.2f}s.'
+        # On standard output the summary would end up inside the export
+        if filename == '-':
+            self.stderr.write(message)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{message} Written to {path}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of recipes (name, ingredients and steps).'
+
+    def handle(self, *args, **kwargs):
+        if not search.fts_available():
+            self.stdout.write(self.style.WARNING('Full-text search index requires SQLite; nothing to do.'))
+            return
+
+        total = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} recipes.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes import jobs
+
+
+class Command(BaseCommand):
+    help = 'Processes queued report jobs (recipe PDFs, cookbooks, JSON PDFs). Run one or more alongside the web server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        if not options['once']:
+            self.stdout.write(f'Waiting for report jobs in {jobs.jobs_dir()} (Ctrl+C to stop)...')
+        try:
+            processed = jobs.work(once=options['once'], poll_interval=options['poll'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} report jobs.'))
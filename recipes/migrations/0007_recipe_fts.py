@@ -0,0 +1,40 @@
+from django.db import migrations
+
+FTS_TABLE = "recipes_recipe_fts"
+
+
+def create_fts_index(apps, schema_editor):
+    # FTS5 es propio de SQLite; en otras bases se usa la búsqueda por nombre
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, ingredients, steps, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, ingredients, steps) "
+        "SELECT r.id, r.name, "
+        "COALESCE((SELECT group_concat(i.name, char(10)) FROM recipes_ingredient i "
+        "WHERE i.recipe_id = r.id), ''), "
+        "COALESCE((SELECT group_concat(s.description, char(10)) FROM recipes_step s "
+        "WHERE s.recipe_id = r.id), '') "
+        "FROM recipes_recipe r"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_jsonhistory'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
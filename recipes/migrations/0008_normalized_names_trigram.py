@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:01
+
+import unicodedata
+
+from django.db import migrations, models
+
+TRIGRAM_TABLE = "recipes_recipe_trigram"
+
+
+def _normalize(text):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+def fill_normalized_names(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+
+    for model in (Recipe, Ingredient):
+        objects = list(model.objects.only('id', 'name'))
+        for obj in objects:
+            obj.name_normalized = _normalize(obj.name)
+        model.objects.bulk_update(objects, ['name_normalized'], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5("
+        "name, ingredients, tokenize = 'trigram')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {TRIGRAM_TABLE} (rowid, name, ingredients) "
+        "SELECT r.id, r.name_normalized, "
+        "COALESCE((SELECT group_concat(i.name_normalized, ' | ') FROM recipes_ingredient i "
+        "WHERE i.recipe_id = r.id), '') "
+        "FROM recipes_recipe r"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='name_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='name_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
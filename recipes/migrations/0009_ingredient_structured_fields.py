@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def parse_existing_ingredients(apps, schema_editor):
+    from recipes.ingredient_parser import parse_ingredient
+
+    CanonicalIngredient = apps.get_model('recipes', 'CanonicalIngredient')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+    parsed = {ingredient.pk: parse_ingredient(ingredient.name) for ingredient in ingredients}
+
+    names = {p.name for p in parsed.values() if p.name}
+    CanonicalIngredient.objects.bulk_create(
+        [CanonicalIngredient(name=name) for name in names], ignore_conflicts=True
+    )
+    canonical_ids = dict(CanonicalIngredient.objects.values_list('name', 'id'))
+
+    for ingredient in ingredients:
+        p = parsed[ingredient.pk]
+        ingredient.quantity = p.quantity
+        ingredient.unit = p.unit
+        ingredient.canonical_id = canonical_ids.get(p.name)
+    Ingredient.objects.bulk_update(ingredients, ['quantity', 'unit', 'canonical'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_normalized_names_trigram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanonicalIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='quantity',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='unit',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='canonical',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingredients', to='recipes.canonicalingredient'),
+        ),
+        migrations.RunPython(parse_existing_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_positions(apps, schema_editor):
+    # Posición = orden por id dentro de cada receta
+    for model_name in ('Ingredient', 'Step'):
+        model = apps.get_model('recipes', model_name)
+        objects = list(model.objects.order_by('recipe_id', 'id').only('id', 'recipe_id'))
+        next_position = {}
+        for obj in objects:
+            obj.position = next_position.get(obj.recipe_id, 0)
+            next_position[obj.recipe_id] = obj.position + 1
+        model.objects.bulk_update(objects, ['position'], batch_size=500)
+
+
+def _pack(positions):
+    value = 0
+    for position in positions:
+        value |= 1 << position
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def convert_completions(apps, schema_editor):
+    UserIngredientCompletion = apps.get_model('recipes', 'UserIngredientCompletion')
+    UserStepCompletion = apps.get_model('recipes', 'UserStepCompletion')
+    RecipeProgress = apps.get_model('recipes', 'RecipeProgress')
+
+    done = {}
+    for user_id, recipe_id, position in UserIngredientCompletion.objects.filter(
+        completed=True
+    ).values_list('user_id', 'ingredient__recipe_id', 'ingredient__position'):
+        done.setdefault((user_id, recipe_id), ([], []))[0].append(position)
+    for user_id, recipe_id, position in UserStepCompletion.objects.filter(
+        completed=True
+    ).values_list('user_id', 'step__recipe_id', 'step__position'):
+        done.setdefault((user_id, recipe_id), ([], []))[1].append(position)
+
+    RecipeProgress.objects.bulk_create(
+        [
+            RecipeProgress(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                ingredients_done=_pack(ingredients),
+                steps_done=_pack(steps),
+            )
+            for (user_id, recipe_id), (ingredients, steps) in done.items()
+        ],
+        batch_size=500,
+    )
+
+
+def restore_completions(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    Step = apps.get_model('recipes', 'Step')
+    UserIngredientCompletion = apps.get_model('recipes', 'UserIngredientCompletion')
+    UserStepCompletion = apps.get_model('recipes', 'UserStepCompletion')
+    RecipeProgress = apps.get_model('recipes', 'RecipeProgress')
+
+    for progress in RecipeProgress.objects.all():
+        ingredients_done = int.from_bytes(bytes(progress.ingredients_done), 'little')
+        steps_done = int.from_bytes(bytes(progress.steps_done), 'little')
+        UserIngredientCompletion.objects.bulk_create([
+            UserIngredientCompletion(user_id=progress.user_id, ingredient=ingredient, completed=True)
+            for ingredient in Ingredient.objects.filter(recipe_id=progress.recipe_id)
+            if ingredients_done >> ingredient.position & 1
+        ])
+        UserStepCompletion.objects.bulk_create([
+            UserStepCompletion(user_id=progress.user_id, step=step, completed=True)
+            for step in Step.objects.filter(recipe_id=progress.recipe_id)
+            if steps_done >> step.position & 1
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_recipe_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(assign_positions, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecipeProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredients_done', models.BinaryField(default=b'')),
+                ('steps_done', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='recipes.recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'recipe')},
+            },
+        ),
+        migrations.RunPython(convert_completions, restore_completions),
+        migrations.DeleteModel(
+            name='UserIngredientCompletion',
+        ),
+        migrations.DeleteModel(
+            name='UserStepCompletion',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:20
+
+import re
+
+from django.db import migrations, models
+
+STEP_NUMBER_RE = re.compile(r'^\d+-\s*')
+
+
+def fill_cleaned_descriptions(apps, schema_editor):
+    Step = apps.get_model('recipes', 'Step')
+
+    steps = list(Step.objects.only('id', 'description'))
+    for step in steps:
+        step.cleaned_description = STEP_NUMBER_RE.sub('', step.description or '')
+    Step.objects.bulk_update(steps, ['cleaned_description'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='step',
+            name='cleaned_description',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_cleaned_descriptions, migrations.RunPython.noop),
+    ]
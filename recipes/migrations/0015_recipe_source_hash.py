@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='source_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
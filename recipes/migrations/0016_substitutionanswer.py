@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubstitutionAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('missing', models.CharField(max_length=255)),
+                ('substitute', models.CharField(max_length=255)),
+                ('answer', models.JSONField()),
+                ('answered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
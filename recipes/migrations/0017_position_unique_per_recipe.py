@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_substitutionanswer'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'position'), name='ingredient_recipe_position_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='step',
+            constraint=models.UniqueConstraint(fields=('recipe', 'position'), name='step_recipe_position_uniq'),
+        ),
+    ]
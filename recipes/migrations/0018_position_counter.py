@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_counters(apps, schema_editor):
+    # Cada receta sigue después de la mayor posición que ya usa
+    PositionCounter = apps.get_model('recipes', 'PositionCounter')
+    counters = {}
+    for field, model_name in (('ingredients', 'Ingredient'), ('steps', 'Step')):
+        model = apps.get_model('recipes', model_name)
+        last = (
+            model.objects.exclude(position=None)
+            .values('recipe_id')
+            .annotate(last=models.Max('position'))
+            .values_list('recipe_id', 'last')
+        )
+        for recipe_id, position in last.iterator():
+            counters.setdefault(recipe_id, {})[field] = position + 1
+    PositionCounter.objects.bulk_create(
+        [PositionCounter(recipe_id=recipe_id, **fields) for recipe_id, fields in counters.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_position_unique_per_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionCounter',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position_counter', serialize=False, to='recipes.recipe')),
+                ('ingredients', models.PositiveIntegerField(default=0)),
+                ('steps', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
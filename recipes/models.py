@@ -1,5 +1,18 @@
+import re
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+# Numeración "1-", "2- " que traen los pasos importados
+STEP_NUMBER_RE = re.compile(r'^\d+-\s*')
+
+
+def clean_step_description(description):
+    """Descripción del paso sin la numeración inicial."""
+    return STEP_NUMBER_RE.sub('', description or '')
+
 
 class Recipe(models.Model):
     name = models.CharField(max_length=255)
@@ -8,6 +21,17 @@ class Recipe(models.Model):
     max_portion = models.IntegerField(null=True, blank=True)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes')
     difficulty = models.CharField(max_length=50, default="Fácil")
+    # Nombre sin tildes y en minúsculas, para búsquedas (ver recipes.search)
+    name_normalized = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    # Hash de la última fila importada (ver recipes.importer); vacío si no viene de un CSV
+    source_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    class Meta:
+        # Órdenes estables usados por la paginación por cursor
+        indexes = [
+            models.Index(fields=['name', 'id'], name='recipe_name_id_idx'),
+            models.Index(fields=['preparation_time', 'id'], name='recipe_time_id_idx'),
+        ]
 
 
 @property
@@ -20,9 +44,38 @@ def difficulty(self):
 def __str__(self):
     return self.name
 
+class CanonicalIngredient(models.Model):
+    # Vocabulario de ingredientes: nombre normalizado, en singular y sin
+    # cantidades (ver recipes.ingredient_parser)
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 class Ingredient(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='ingredients', on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    name_normalized = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    # Se completan al guardar a partir de 'name'
+    quantity = models.FloatField(null=True, blank=True, editable=False)
+    unit = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
+    canonical = models.ForeignKey(
+        CanonicalIngredient, null=True, blank=True, editable=False,
+        related_name='ingredients', on_delete=models.SET_NULL,
+    )
+    # Posición dentro de la receta (bit en RecipeProgress, ver
+    # progress.next_position): no cambia al editar ni al borrar otros, y la
+    # de un ingrediente borrado no se vuelve a usar (ver PositionCounter)
+    position = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            # Dos altas simultáneas no pueden quedarse con el mismo bit
+            models.UniqueConstraint(fields=['recipe', 'position'], name='ingredient_recipe_position_uniq'),
+        ]
 
     def __str__(self):
         return self.name
@@ -31,28 +84,44 @@ class Step(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='steps', on_delete=models.CASCADE)
     description = models.TextField()
     order = models.IntegerField()
+    # Igual que Ingredient.position
+    position = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Descripción sin "1-", "2-"... (se calcula al guardar, ver recipes.signals)
+    cleaned_description = models.TextField(blank=True, editable=False)
 
     class Meta:
         ordering = ['order']
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'position'], name='step_recipe_position_uniq'),
+        ]
 
     def __str__(self):
         return f"Step {self.order} for {self.recipe.name}"
 
-class UserIngredientCompletion(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
-    completed = models.BooleanField(default=False)
+class RecipeProgress(models.Model):
+    """
+    Avance de un usuario en una receta: un bit por ingrediente y por paso,
+    indexado por su 'position' (ver recipes.progress).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipe_progress')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='progress')
+    ingredients_done = models.BinaryField(default=b'')
+    steps_done = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('user', 'ingredient')
-
-class UserStepCompletion(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    step = models.ForeignKey(Step, on_delete=models.CASCADE)
-    completed = models.BooleanField(default=False)
+        unique_together = ('user', 'recipe')
 
-    class Meta:
-        unique_together = ('user', 'step')
+class PositionCounter(models.Model):
+    """
+    Siguiente posición de los ingredientes y pasos de una receta. Solo
+    crece: un bit que quedó encendido en un avance (o en la cookie de un
+    anónimo) nunca le toca a un ingrediente o paso nuevo. Va en su propia
+    tabla para que guardar la receta no pise el contador.
+    """
+    recipe = models.OneToOneField(Recipe, primary_key=True, on_delete=models.CASCADE, related_name='position_counter')
+    ingredients = models.PositiveIntegerField(default=0)
+    steps = models.PositiveIntegerField(default=0)
 
 class FavoriteRecipe(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorite_recipes')
@@ -69,3 +138,76 @@ class JsonHistory(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+
+
+class ReportJob(models.Model):
+    """
+    Reporte pedido para generarse fuera de la petición; lo procesa
+    `manage.py report_worker` (ver recipes.jobs). El id es un UUID, así que
+    conocerlo es lo que permite consultar y descargar el resultado.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pendiente'),
+        (RUNNING, 'En proceso'),
+        (DONE, 'Listo'),
+        (FAILED, 'Falló'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='report_jobs')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    result_path = models.CharField(max_length=500, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='reportjob_status_created_idx')]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Avance de una importación de CSV (ver recipes.importer): hasta qué byte
+    y fila del archivo ya está confirmado. Se guarda en la misma transacción
+    que cada lote, así que al reanudar no se repite ni se pierde nada.
+    """
+    fingerprint = models.CharField(max_length=64, unique=True)
+    source = models.CharField(max_length=500)
+    offset = models.BigIntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.offset}"
+
+
+class SubstitutionAnswer(models.Model):
+    """
+    Respuesta de ai_assistant.suggest_substitution guardada para preguntas
+    repetidas (ver recipes.substitution_cache). 'key' resume el ingrediente
+    faltante, el sustituto y el contenido de la receta.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    missing = models.CharField(max_length=255)
+    substitute = models.CharField(max_length=255)
+    answer = models.JSONField()
+    answered_at = models.DateTimeField(default=timezone.now)
+    # Para borrar las menos usadas cuando hay demasiadas
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.missing} -> {self.substitute}"
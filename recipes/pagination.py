@@ -0,0 +1,146 @@
+"""
+Paginación por cursor (keyset) para listados de recetas.
+
+En vez de OFFSET, cada página pide "lo que viene después de la última fila
+vista" según un orden estable que termina en el id. Así el costo de una
+página es O(tamaño de página) sin importar cuán profundo se navegue.
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+
+
+def page_size() -> int:
+    return getattr(settings, "RECIPES_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Devuelve la lista de valores del cursor, o None si no es válido."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: Optional[str] = None
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+def _after(fields, values) -> Q:
+    """
+    Condición "fila > cursor" para el orden de 'fields' ("-campo" es
+    descendente). El primer campo puede ser NULL (en SQLite los NULL van
+    primero en orden ascendente).
+    """
+    (first, *rest), (value, *rest_values) = fields, values
+    name, lookup = (first[1:], "lt") if first.startswith("-") else (first, "gt")
+    if not rest:
+        return Q(**{f"{name}__{lookup}": value})
+
+    tail = _after(rest, rest_values)
+    if value is None:
+        return Q(**{f"{name}__isnull": False}) | (Q(**{f"{name}__isnull": True}) & tail)
+    return Q(**{f"{name}__{lookup}": value}) | (Q(**{name: value}) & tail)
+
+
+def _model_field(model, path):
+    *relations, name = path.lstrip("-").split("__")
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def _cursor_values(model, fields, values):
+    """
+    Valores del cursor convertidos al tipo de cada campo, o None si el
+    cursor no corresponde a 'fields' (uno editado a mano, de otro orden...).
+    """
+    if values is None or len(values) != len(fields):
+        return None
+    converted = []
+    for position, (path, value) in enumerate(zip(fields, values)):
+        try:
+            field = _model_field(model, path)
+        except FieldDoesNotExist:
+            return None
+        if value is None:
+            # Solo el primer campo puede ser NULL (ver _after)
+            if position or not field.null:
+                return None
+            converted.append(None)
+            continue
+        if isinstance(value, (list, dict)):
+            return None
+        try:
+            converted.append(field.to_python(value))
+        except ValidationError:
+            return None
+    return converted
+
+
+def keyset_paginate(queryset, fields, cursor: str = None, size: int = None) -> Page:
+    """
+    Pagina 'queryset' ordenándolo por 'fields' (el último debe ser único,
+    normalmente el id; "-campo" ordena al revés). 'cursor' es el valor
+    devuelto como next_cursor; uno inválido muestra la primera página.
+    """
+    size = size or page_size()
+    queryset = queryset.order_by(*fields)
+
+    values = _cursor_values(queryset.model, fields, decode_cursor(cursor))
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values))
+
+    items = list(queryset[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = encode_cursor(_field_value(last, name) for name in fields)
+    return Page(items=items, next_cursor=next_cursor)
+
+
+def offset_paginate(queryset, cursor: str = None, size: int = None) -> Page:
+    """
+    Paginación por posición, para las búsquedas ordenadas por relevancia
+    (el puntaje BM25 no es una clave estable para un cursor).
+    """
+    size = size or page_size()
+    values = decode_cursor(cursor)
+    offset = values[0] if values and isinstance(values[0], int) and values[0] > 0 else 0
+
+    items = list(queryset[offset:offset + size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor([offset + size])
+    return Page(items=items, next_cursor=next_cursor)
+
+
+def _field_value(obj, name):
+    for part in name.lstrip("-").split("__"):
+        obj = getattr(obj, part)
+    return obj
@@ -0,0 +1,234 @@
+"""
+"Cocinar con lo que tengo": busca recetas según la despensa del usuario.
+
+Se mantiene en memoria un índice invertido sobre los ingredientes: cada
+ingrediente ocupa un "slot" y cada palabra significativa apunta a un
+bitset (un int de Python) con los slots donde aparece. Un elemento de la
+despensa cubre un ingrediente si todas sus palabras están en él, así que
+una consulta se resuelve con AND/OR de bitsets y un conteo por receta.
+
+El índice se construye la primera vez que se usa y se actualiza con las
+señales post_save/post_delete de Ingredient (ver ``recipes.signals``).
+Como cada proceso tiene su propia copia, se reconstruye también cuando
+supera ``PANTRY_INDEX_MAX_AGE`` segundos, para recoger cambios hechos
+desde otros procesos.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+
+from .ingredient_parser import DESCRIPTORS, UNIT_ALIASES, singular
+from .search import normalize_text
+
+# Palabras que no identifican un ingrediente
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+    "o", "para", "por", "sin", "u", "un", "una", "unas", "unos", "y",
+    "gusto", "mas", "menos", "puede", "ser", "opcional",
+} | DESCRIPTORS | set(UNIT_ALIASES)
+
+_WORD_RE = re.compile(r"[a-zñ]+")
+_NONZERO_BYTE_RE = re.compile(rb"[^\x00]")
+
+# Posiciones de los bits encendidos para cada valor de byte
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+@lru_cache(maxsize=65536)
+def ingredient_tokens(text: str) -> frozenset:
+    """Palabras significativas (normalizadas y en singular) de un ingrediente."""
+    words = _WORD_RE.findall(normalize_text(text))
+    return frozenset(
+        singular(word) for word in words if word not in STOPWORDS
+    )
+
+
+class PantryIndex:
+    """Índice invertido de ingredientes con bitsets por palabra."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.built_at = None
+
+    def _clear(self):
+        self._postings = {}          # palabra -> bitset de slots
+        self._slot_recipe = []       # slot -> id de receta (None si se liberó)
+        self._slot_tokens = []       # slot -> palabras del ingrediente
+        self._ingredient_slot = {}   # id de ingrediente -> slot
+        self._recipe_totals = Counter()
+        self._free_slots = 0
+
+    def build(self, rows):
+        """Construye el índice a partir de filas (ingrediente, receta, nombre)."""
+        with self._lock:
+            self._clear()
+            # Acumular los slots de cada palabra y armar cada bitset una sola
+            # vez; hacer "|=" sobre ints que crecen sería cuadrático.
+            slots_by_token = {}
+            for ingredient_id, recipe_id, name in rows:
+                tokens = ingredient_tokens(name)
+                if not tokens:
+                    continue
+                slot = len(self._slot_recipe)
+                for token in tokens:
+                    slots_by_token.setdefault(token, []).append(slot)
+                self._slot_recipe.append(recipe_id)
+                self._slot_tokens.append(tokens)
+                self._ingredient_slot[ingredient_id] = slot
+                self._recipe_totals[recipe_id] += 1
+
+            size = (len(self._slot_recipe) + 7) // 8
+            for token, slots in slots_by_token.items():
+                bits = bytearray(size)
+                for slot in slots:
+                    bits[slot >> 3] |= 1 << (slot & 7)
+                self._postings[token] = int.from_bytes(bits, "little")
+            self.built_at = time.monotonic()
+
+    def add(self, ingredient_id, recipe_id, name):
+        with self._lock:
+            self._remove(ingredient_id)
+            self._add(ingredient_id, recipe_id, name)
+
+    def remove(self, ingredient_id):
+        with self._lock:
+            self._remove(ingredient_id)
+
+    def _add(self, ingredient_id, recipe_id, name):
+        tokens = ingredient_tokens(name)
+        if not tokens:
+            return
+        slot = len(self._slot_recipe)
+        bit = 1 << slot
+        for token in tokens:
+            self._postings[token] = self._postings.get(token, 0) | bit
+        self._slot_recipe.append(recipe_id)
+        self._slot_tokens.append(tokens)
+        self._ingredient_slot[ingredient_id] = slot
+        self._recipe_totals[recipe_id] += 1
+
+    def _remove(self, ingredient_id):
+        slot = self._ingredient_slot.pop(ingredient_id, None)
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        for token in self._slot_tokens[slot]:
+            remaining = self._postings[token] & mask
+            if remaining:
+                self._postings[token] = remaining
+            else:
+                del self._postings[token]
+
+        recipe_id = self._slot_recipe[slot]
+        self._recipe_totals[recipe_id] -= 1
+        if self._recipe_totals[recipe_id] <= 0:
+            del self._recipe_totals[recipe_id]
+        self._slot_recipe[slot] = None
+        self._slot_tokens[slot] = frozenset()
+        self._free_slots += 1
+
+    @property
+    def fragmented(self) -> bool:
+        """Hay más slots libres que ocupados: conviene reconstruir."""
+        return self._free_slots > max(len(self._ingredient_slot), 1000)
+
+    def _covered_mask(self, items) -> int:
+        covered = 0
+        for tokens in items:
+            mask = -1
+            for token in tokens:
+                mask &= self._postings.get(token, 0)
+                if not mask:
+                    break
+            if mask > 0:
+                covered |= mask
+        return covered
+
+    def match(self, items):
+        """
+        Cuenta, por receta, cuántos de sus ingredientes cubre la despensa.
+        'items' es una lista de conjuntos de palabras (ver ingredient_tokens).
+        """
+        with self._lock:
+            covered = self._covered_mask(items)
+            if not covered:
+                return Counter(), {}
+
+            counts = Counter()
+            data = covered.to_bytes((covered.bit_length() + 7) // 8, "little")
+            slot_recipe = self._slot_recipe
+            # Saltar en C los bytes en cero y mirar solo los bits encendidos
+            for found in _NONZERO_BYTE_RE.finditer(data):
+                position = found.start()
+                base = position * 8
+                for bit in _BYTE_BITS[data[position]]:
+                    counts[slot_recipe[base + bit]] += 1
+            totals = {recipe_id: self._recipe_totals[recipe_id] for recipe_id in counts}
+            return counts, totals
+
+    def search(self, pantry, max_missing=None, limit=20):
+        """
+        Recetas ordenadas por cobertura: primero las que tienen todo, luego
+        las que les falta uno, dos... Devuelve tuplas
+        (id_receta, ingredientes_cubiertos, total_ingredientes).
+        """
+        items = [tokens for tokens in (ingredient_tokens(item) for item in pantry) if tokens]
+        counts, totals = self.match(items)
+
+        ranked = []
+        for recipe_id, matched in counts.items():
+            missing = totals[recipe_id] - matched
+            if max_missing is not None and missing > max_missing:
+                continue
+            ranked.append((missing, -matched, recipe_id))
+        ranked.sort()
+        return [
+            (recipe_id, -neg_matched, -neg_matched + missing)
+            for missing, neg_matched, recipe_id in ranked[:limit]
+        ]
+
+
+_index = PantryIndex()
+_build_lock = threading.Lock()
+
+
+def _max_age():
+    return getattr(settings, "PANTRY_INDEX_MAX_AGE", 300)
+
+
+def get_index() -> PantryIndex:
+    """Devuelve el índice del proceso, construyéndolo si hace falta."""
+    from .models import Ingredient
+
+    built_at = _index.built_at
+    if built_at is not None and time.monotonic() - built_at < _max_age() and not _index.fragmented:
+        return _index
+
+    with _build_lock:
+        built_at = _index.built_at
+        if built_at is None or time.monotonic() - built_at >= _max_age() or _index.fragmented:
+            rows = Ingredient.objects.values_list("id", "recipe_id", "name").iterator(chunk_size=5000)
+            _index.build(rows)
+    return _index
+
+
+def reset_index():
+    """Olvida el índice; se reconstruirá en el próximo uso."""
+    with _build_lock:
+        _index.build([])
+        _index.built_at = None
+
+
+def ingredient_saved(ingredient_id, recipe_id, name):
+    if _index.built_at is not None:
+        _index.add(ingredient_id, recipe_id, name)
+
+
+def ingredient_deleted(ingredient_id):
+    if _index.built_at is not None:
+        _index.remove(ingredient_id)
@@ -0,0 +1,129 @@
+"""
+Cache en disco de los PDF de recetas.
+
+Cada archivo se llama ``<id_receta>-<hash>.pdf``, donde el hash (sha256)
+cubre todo lo que se dibuja en el PDF más la versión del generador; si la
+receta cambia, cambia el nombre y el archivo viejo simplemente deja de
+usarse. El hash sirve también de ETag.
+
+El tamaño total del directorio se limita con ``RECIPE_PDF_CACHE_MAX_BYTES``
+borrando primero los archivos usados hace más tiempo (cada acierto
+actualiza el mtime del archivo). Los bytes escritos se suman en el cache
+de Django: el directorio solo se recorre cuando esa cuenta pasa el límite
+(o se perdió).
+"""
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .report_generators import RecipeData
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+# Bytes del directorio según la última revisión más lo escrito después
+SIZE_KEY = "recipes:pdf_cache:bytes"
+
+
+@dataclass(frozen=True)
+class CachedPdf:
+    path: Path
+    etag: str
+
+
+def cache_dir() -> Path:
+    return Path(getattr(settings, "RECIPE_PDF_CACHE_DIR", Path(settings.BASE_DIR) / "pdf_cache"))
+
+
+def max_bytes() -> int:
+    return getattr(settings, "RECIPE_PDF_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+
+def content_hash(recipe, generator) -> str:
+    """Hash del contenido de la receta que aparece en el PDF."""
+    content = {
+        "generator": [type(generator).__name__, getattr(generator, "version", "")],
+        "recipe": asdict(RecipeData.from_recipe(recipe)),
+    }
+    payload = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_or_build(recipe, service, digest=None) -> CachedPdf:
+    """
+    Devuelve el PDF de la receta desde el disco, generándolo con 'service'
+    (un RecipeReportService) solo si no existe para el contenido actual.
+    'digest' es el content_hash ya calculado, si se tiene.
+    """
+    data = RecipeData.from_recipe(recipe)
+    if digest is None:
+        digest = content_hash(data, service.generator)
+    directory = cache_dir()
+    path = directory / f"{data.id}-{digest}.pdf"
+
+    try:
+        os.utime(path)  # marca el uso para el LRU
+        return CachedPdf(path, digest)
+    except FileNotFoundError:
+        pass
+
+    pdf = service.build_report(data)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Escribir aparte y renombrar: nadie lee un PDF a medio escribir
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(pdf)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+    invalidate(data.id, keep=path)
+    total = _add_size(len(pdf))
+    if total is None or total > max_bytes():
+        evict()
+    return CachedPdf(path, digest)
+
+
+def _add_size(size):
+    """Suma 'size' a la cuenta de bytes; None si no hay cuenta (hay que recorrer el directorio)."""
+    try:
+        total = cache.incr(SIZE_KEY, size)
+    except ValueError:
+        return None
+    cache.touch(SIZE_KEY, None)  # incr en FileBasedCache vuelve al timeout por defecto
+    return total
+
+
+def invalidate(recipe_id, keep=None):
+    """Borra los PDF guardados de una receta (salvo 'keep')."""
+    for path in cache_dir().glob(f"{recipe_id}-*.pdf"):
+        if path != keep:
+            path.unlink(missing_ok=True)
+
+
+def evict(limit=None):
+    """Borra los PDF menos usados hasta quedar bajo 'limit' bytes."""
+    limit = max_bytes() if limit is None else limit
+    entries = []
+    total = 0
+    for path in cache_dir().glob("*.pdf"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+    cache.set(SIZE_KEY, total, None)
@@ -0,0 +1,273 @@
+"""
+Avance de los usuarios en las recetas (ingredientes y pasos marcados).
+
+Se guarda una sola fila ``RecipeProgress`` por usuario y receta con dos
+máscaras de bits empaquetadas en bytes (little-endian): el bit N indica si
+el ingrediente/paso con ``position == N`` está completado. Las posiciones
+se asignan al crear el ingrediente o paso, no cambian después y no se
+reutilizan al borrarlo (``PositionCounter``): un bit que quedó encendido,
+en la base de datos o en una cookie, no marca a uno nuevo. Así
+leer el avance de una receta es una consulta y marcar algo es una
+lectura más una escritura, sin importar el tamaño de la receta.
+
+Los visitantes anónimos no tocan la base de datos: sus máscaras viajan en
+una cookie firmada (``CookieProgressStore``) y se suman a las del usuario
+cuando inicia sesión (``merge_anonymous_progress``).
+"""
+import json
+from collections import OrderedDict
+
+from django.core import signing
+from django.db import transaction
+from django.db.models import Case, F, Max, Value, When
+
+INGREDIENTS = "ingredients"
+STEPS = "steps"
+
+_FIELDS = {
+    INGREDIENTS: "ingredients_done",
+    STEPS: "steps_done",
+}
+
+PROGRESS_COOKIE = "recipe_progress"
+PROGRESS_COOKIE_SALT = "recipes.progress"
+PROGRESS_COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+# Recetas recordadas en la cookie; las menos recientes se descartan
+PROGRESS_COOKIE_MAX_RECIPES = 20
+
+
+def unpack(data) -> int:
+    return int.from_bytes(bytes(data or b""), "little")
+
+
+def pack(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+
+def is_done(mask: int, position) -> bool:
+    return position is not None and bool(mask >> position & 1)
+
+
+def set_done(mask: int, position: int, done: bool) -> int:
+    return mask | (1 << position) if done else mask & ~(1 << position)
+
+
+# Campo de PositionCounter de cada modelo con posición
+_COUNTERS = {
+    "ingredient": INGREDIENTS,
+    "step": STEPS,
+}
+
+
+def next_position(model, recipe_id) -> int:
+    """Siguiente posición sin usar para un ingrediente o paso de la receta."""
+    return reserve_positions(model, {recipe_id: 1})[recipe_id]
+
+
+def reserve_positions(model, counts) -> dict:
+    """
+    Reserva counts[id_receta] posiciones nuevas de 'model' (Ingredient o
+    Step) en cada receta con un solo UPDATE; devuelve {id_receta: primera
+    posición reservada}.
+    """
+    from .models import PositionCounter
+
+    field = _COUNTERS[model._meta.model_name]
+    counts = {recipe_id: count for recipe_id, count in counts.items() if count}
+    if not counts:
+        return {}
+    by_count = {}
+    for recipe_id, count in counts.items():
+        by_count.setdefault(count, []).append(recipe_id)
+    increment = Case(*(When(recipe_id__in=ids, then=Value(count)) for count, ids in by_count.items()))
+
+    with transaction.atomic():
+        _create_counters(counts)
+        counters = PositionCounter.objects.filter(recipe_id__in=counts)
+        counters.update(**{field: F(field) + increment})
+        return {recipe_id: last - counts[recipe_id] for recipe_id, last in counters.values_list("recipe_id", field)}
+
+
+def _create_counters(recipe_ids):
+    """Crea los contadores que falten, a continuación de las posiciones ya usadas."""
+    from .models import Ingredient, PositionCounter, Step
+
+    missing = set(recipe_ids) - set(
+        PositionCounter.objects.filter(recipe_id__in=recipe_ids).values_list("recipe_id", flat=True)
+    )
+    if not missing:
+        return
+    counters = {recipe_id: PositionCounter(recipe_id=recipe_id) for recipe_id in missing}
+    for model in (Ingredient, Step):
+        last = (
+            model.objects.filter(recipe_id__in=missing)
+            .values("recipe_id")
+            .annotate(last=Max("position"))
+            .values_list("recipe_id", "last")
+        )
+        for recipe_id, position in last:
+            if position is not None:
+                setattr(counters[recipe_id], _COUNTERS[model._meta.model_name], position + 1)
+    PositionCounter.objects.bulk_create(counters.values(), ignore_conflicts=True)
+
+
+def load(user, recipe):
+    """Máscaras (ingredientes, pasos) completadas por 'user' en 'recipe'."""
+    from .models import RecipeProgress
+
+    row = (
+        RecipeProgress.objects.filter(user=user, recipe=recipe)
+        .values_list("ingredients_done", "steps_done")
+        .first()
+    )
+    if row is None:
+        return 0, 0
+    return unpack(row[0]), unpack(row[1])
+
+
+def update(user, recipe_id, changes):
+    """
+    Aplica varios cambios en una sola transacción sobre la fila de avance.
+
+    'changes' es una lista de (tipo, posición, estado) donde tipo es
+    INGREDIENTS o STEPS y estado es True/False, o None para invertirlo.
+    Devuelve el estado final de cada cambio en el mismo orden.
+    """
+    from .models import RecipeProgress
+
+    if not changes:
+        return []
+    with transaction.atomic():
+        progress, _created = RecipeProgress.objects.select_for_update().get_or_create(
+            user=user, recipe_id=recipe_id
+        )
+        masks = {kind: unpack(getattr(progress, field)) for kind, field in _FIELDS.items()}
+        results = _apply_changes(masks, changes)
+
+        touched = sorted({kind for kind, _position, _done in changes})
+        for kind in touched:
+            setattr(progress, _FIELDS[kind], pack(masks[kind]))
+        progress.save(update_fields=[*(_FIELDS[kind] for kind in touched), "updated_at"])
+    return results
+
+
+def toggle(user, recipe_id, kind, position) -> bool:
+    """Invierte el estado de un ingrediente o paso; devuelve el nuevo estado."""
+    return update(user, recipe_id, [(kind, position, None)])[0]
+
+
+def _apply_changes(masks, changes):
+    """Aplica 'changes' sobre {tipo: máscara}; devuelve los estados finales."""
+    results = []
+    for kind, position, done in changes:
+        if done is None:
+            done = not is_done(masks[kind], position)
+        masks[kind] = set_done(masks[kind], position, done)
+        results.append(done)
+    return results
+
+
+class DatabaseProgressStore:
+    """Avance de un usuario autenticado, guardado en RecipeProgress."""
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+
+    def load(self, recipe):
+        return load(self.user, recipe)
+
+    def update(self, recipe_id, changes):
+        return update(self.user, recipe_id, changes)
+
+    def apply(self, response):
+        # Tras iniciar sesión la cookie anónima ya se fusionó: se borra
+        if PROGRESS_COOKIE in self.request.COOKIES:
+            response.delete_cookie(PROGRESS_COOKIE)
+        return response
+
+
+class CookieProgressStore:
+    """
+    Avance de un visitante anónimo en una cookie firmada: cero escrituras
+    en la base de datos. Guarda las PROGRESS_COOKIE_MAX_RECIPES recetas
+    usadas más recientemente. Los bits de ingredientes o pasos borrados
+    quedan encendidos en la cookie, pero esas posiciones no se reutilizan.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.recipes = read_cookie(request)
+        self.modified = False
+
+    def load(self, recipe):
+        recipe_id = getattr(recipe, "pk", recipe)
+        masks = self.recipes.get(str(recipe_id), {})
+        return masks.get(INGREDIENTS, 0), masks.get(STEPS, 0)
+
+    def update(self, recipe_id, changes):
+        if not changes:
+            return []
+        key = str(recipe_id)
+        masks = self.recipes.pop(key, {INGREDIENTS: 0, STEPS: 0})
+        results = _apply_changes(masks, changes)
+        self.recipes[key] = masks
+        while len(self.recipes) > PROGRESS_COOKIE_MAX_RECIPES:
+            self.recipes.popitem(last=False)
+        self.modified = True
+        return results
+
+    def apply(self, response):
+        if self.modified:
+            value = json.dumps(
+                {key: f"{masks[INGREDIENTS]:x}:{masks[STEPS]:x}" for key, masks in self.recipes.items()},
+                separators=(",", ":"),
+            )
+            response.set_signed_cookie(
+                PROGRESS_COOKIE, value, salt=PROGRESS_COOKIE_SALT,
+                max_age=PROGRESS_COOKIE_MAX_AGE, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+def read_cookie(request):
+    """Máscaras guardadas en la cookie: {id_receta: {tipo: máscara}}."""
+    recipes = OrderedDict()
+    try:
+        raw = request.get_signed_cookie(PROGRESS_COOKIE, default=None, salt=PROGRESS_COOKIE_SALT,
+                                        max_age=PROGRESS_COOKIE_MAX_AGE)
+        data = json.loads(raw) if raw else {}
+        for key, value in data.items():
+            ingredients, steps = value.split(":")
+            recipes[str(int(key))] = {INGREDIENTS: int(ingredients, 16), STEPS: int(steps, 16)}
+    except (signing.BadSignature, ValueError, AttributeError, TypeError):
+        return OrderedDict()
+    return recipes
+
+
+def get_store(request):
+    """Almacén de avance adecuado para quien hace la petición."""
+    if request.user.is_authenticated:
+        return DatabaseProgressStore(request)
+    return CookieProgressStore(request)
+
+
+def merge_anonymous_progress(request, user):
+    """Suma (OR) el avance anónimo de la cookie al avance guardado del usuario."""
+    from .models import Recipe, RecipeProgress
+
+    recipes = read_cookie(request)
+    if not recipes:
+        return
+    existing = set(Recipe.objects.filter(pk__in=recipes.keys()).values_list("pk", flat=True))
+
+    with transaction.atomic():
+        for key, masks in recipes.items():
+            if int(key) not in existing:
+                continue
+            progress, _created = RecipeProgress.objects.select_for_update().get_or_create(
+                user=user, recipe_id=int(key)
+            )
+            for kind, field in _FIELDS.items():
+                setattr(progress, field, pack(unpack(getattr(progress, field)) | masks[kind]))
+            progress.save()
@@ -1,48 +1,277 @@
 from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
+from html import escape
+from typing import Optional, Tuple
 import io
+import json
 
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 
 
+# Campos de un paso que se prueban, en orden, para obtener su texto
+STEP_TEXT_FIELDS = ("cleaned_description", "description", "text", "instruction", "content")
+
+
+def _step_text(step) -> str:
+    for field_name in STEP_TEXT_FIELDS:
+        if hasattr(step, field_name):
+            return getattr(step, field_name)
+    return str(step)
+
+
+def _related(recipe, *names):
+    """Primer manager relacionado que exista (recipe.steps, recipe.step_set...)."""
+    for name in names:
+        manager = getattr(recipe, name, None)
+        if manager is not None:
+            try:
+                return list(manager.all())
+            except TypeError:
+                continue
+    return []
+
+
+@dataclass(frozen=True)
+class RecipeData:
+    """
+    Copia plana de lo que se dibuja de una receta. No depende del ORM, así
+    que se puede enviar a otros procesos (ver recipes.cookbook).
+    """
+    id: Optional[int]
+    name: str
+    preparation_time: Optional[float] = None
+    min_portion: Optional[int] = None
+    max_portion: Optional[int] = None
+    ingredients: Tuple[str, ...] = ()
+    steps: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_recipe(cls, recipe) -> "RecipeData":
+        if isinstance(recipe, cls):
+            return recipe
+        return cls(
+            id=getattr(recipe, "pk", None),
+            name=recipe.name,
+            preparation_time=getattr(recipe, "preparation_time", None),
+            min_portion=getattr(recipe, "min_portion", None),
+            max_portion=getattr(recipe, "max_portion", None),
+            ingredients=tuple(ing.name for ing in _related(recipe, "ingredients")),
+            steps=tuple(_step_text(step) for step in _related(recipe, "steps", "step_set")),
+        )
+
+
+def portions(recipe) -> str:
+    """Texto de porciones ("2 - 4", "2", " - 4") o "" si no hay."""
+    text = ""
+    if recipe.min_portion:
+        text += str(recipe.min_portion)
+    if recipe.max_portion:
+        text += f" - {recipe.max_portion}"
+    return text
+
+
 class RecipeReportGenerator(ABC):
+    # Cambiarla cuando cambie el formato de salida (invalida los PDF en cache)
+    version = "1"
+    # Nombre en ?format=, tipo de contenido y extensión del archivo
+    format = ""
+    media_type = "application/octet-stream"
+    extension = ""
+
     @abstractmethod
     def generate(self, recipe) -> bytes:
         pass
 
 
-def wrap_text(text: str, max_width: float, c: canvas.Canvas,
+class TextualRecipeReportGenerator(RecipeReportGenerator):
+    """Formatos de texto: no pasan por ReportLab y salen en UTF-8."""
+
+    def generate(self, recipe) -> bytes:
+        return self.render(RecipeData.from_recipe(recipe)).encode("utf-8")
+
+    @abstractmethod
+    def render(self, recipe: "RecipeData") -> str:
+        pass
+
+
+class TextRecipeReportGenerator(TextualRecipeReportGenerator):
+    format = "txt"
+    media_type = "text/plain"
+    extension = "txt"
+
+    def render(self, recipe):
+        lines = [recipe.name, "=" * len(recipe.name), ""]
+        if recipe.preparation_time:
+            lines.append(f"Tiempo de preparación: {recipe.preparation_time} minutos")
+        if portions(recipe):
+            lines.append(f"Porciones: {portions(recipe)}")
+        lines += ["", "Ingredientes:"]
+        lines += [f"- {ingredient}" for ingredient in recipe.ingredients]
+        lines += ["", "Pasos:"]
+        lines += [f"{idx}. {text}" for idx, text in enumerate(recipe.steps, start=1)] or ["Sin pasos registrados."]
+        return "\n".join(lines) + "\n"
+
+
+class MarkdownRecipeReportGenerator(TextualRecipeReportGenerator):
+    format = "md"
+    media_type = "text/markdown"
+    extension = "md"
+
+    def render(self, recipe):
+        lines = [f"# {recipe.name}", ""]
+        if recipe.preparation_time:
+            lines.append(f"- **Tiempo de preparación:** {recipe.preparation_time} minutos")
+        if portions(recipe):
+            lines.append(f"- **Porciones:** {portions(recipe)}")
+        lines += ["", "## Ingredientes", ""]
+        lines += [f"- {ingredient}" for ingredient in recipe.ingredients]
+        lines += ["", "## Pasos", ""]
+        # Los saltos de línea dentro de un paso quedan sangrados bajo su número
+        lines += [
+            f"{idx}. " + text.replace("\n", "\n   ") for idx, text in enumerate(recipe.steps, start=1)
+        ] or ["Sin pasos registrados."]
+        return "\n".join(lines) + "\n"
+
+
+class HtmlRecipeReportGenerator(TextualRecipeReportGenerator):
+    format = "html"
+    media_type = "text/html"
+    extension = "html"
+
+    def render(self, recipe):
+        parts = [
+            '<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="utf-8">',
+            f"<title>{escape(recipe.name)}</title>\n</head>\n<body>",
+            f"<h1>{escape(recipe.name)}</h1>",
+        ]
+        if recipe.preparation_time:
+            parts.append(f"<p>Tiempo de preparación: {recipe.preparation_time} minutos</p>")
+        if portions(recipe):
+            parts.append(f"<p>Porciones: {escape(portions(recipe))}</p>")
+        parts.append("<h2>Ingredientes</h2>\n<ul>")
+        parts += [f"<li>{escape(ingredient)}</li>" for ingredient in recipe.ingredients]
+        parts.append("</ul>\n<h2>Pasos</h2>")
+        if recipe.steps:
+            parts.append("<ol>")
+            parts += [f"<li>{escape(text)}</li>".replace("\n", "<br>") for text in recipe.steps]
+            parts.append("</ol>")
+        else:
+            parts.append("<p>Sin pasos registrados.</p>")
+        parts.append("</body>\n</html>")
+        return "\n".join(parts) + "\n"
+
+
+class JsonRecipeReportGenerator(TextualRecipeReportGenerator):
+    format = "json"
+    media_type = "application/json"
+    extension = "json"
+
+    def render(self, recipe):
+        return json.dumps(asdict(recipe), ensure_ascii=False, indent=2)
+
+
+@lru_cache(maxsize=16384)
+def word_width(word: str, font_name: str, font_size: float) -> float:
+    """Ancho de 'word' en puntos; cada palabra se mide una sola vez por fuente."""
+    return pdfmetrics.stringWidth(word, font_name, font_size)
+
+
+def _split_long_word(word: str, max_width: float, font_name: str, font_size: float):
+    """
+    Parte una palabra más ancha que la línea: primero por sus guiones
+    (juntando los trozos que quepan) y, si un trozo sigue sin caber, letra
+    por letra.
+    """
+    parts = [part + "-" for part in word.split("-")[:-1]] + [word.rsplit("-", 1)[-1]]
+    current = ""
+    current_width = 0.0
+    for part in filter(None, parts):
+        part_width = word_width(part, font_name, font_size)
+        if current_width + part_width <= max_width:
+            current += part
+            current_width += part_width
+            continue
+        if part_width <= max_width:
+            yield current
+            current, current_width = part, part_width
+            continue
+        for char in part:
+            char_width = word_width(char, font_name, font_size)
+            if current and current_width + char_width > max_width:
+                yield current
+                current, current_width = "", 0.0
+            current += char
+            current_width += char_width
+    if current:
+        yield current
+
+
+def wrap_text(text: str, max_width: float, c: canvas.Canvas = None,
               font_name: str = "Helvetica", font_size: int = 12):
     """
     Divide 'text' en varias líneas para que cada una
     no supere 'max_width' en puntos (según la fuente actual).
+
+    Los anchos se suman palabra a palabra (las fuentes base de ReportLab no
+    tienen kerning, así que el ancho de una línea es la suma de sus partes),
+    por lo que el costo es lineal en el largo del texto. Los saltos de línea
+    del texto se respetan y las palabras que no caben solas se parten.
     """
-    words = text.split()
+    space = word_width(" ", font_name, font_size)
     lines = []
-    current_line = ""
 
-    for word in words:
-        test_line = (current_line + " " + word).strip()
-        test_width = pdfmetrics.stringWidth(test_line, font_name, font_size)
-
-        if test_width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-            current_line = word
-
-    if current_line:
-        lines.append(current_line)
+    for paragraph in text.splitlines():
+        current = []
+        current_width = 0.0
+        for word in paragraph.split():
+            width = word_width(word, font_name, font_size)
+            if width > max_width:
+                pieces = list(_split_long_word(word, max_width, font_name, font_size))
+                word = pieces.pop()
+                width = word_width(word, font_name, font_size)
+                if pieces:
+                    if current:
+                        lines.append(" ".join(current))
+                    lines.extend(pieces)
+                    current, current_width = [], 0.0
+
+            if not current:
+                current, current_width = [word], width
+            elif current_width + space + width <= max_width:
+                current.append(word)
+                current_width += space + width
+            else:
+                lines.append(" ".join(current))
+                current, current_width = [word], width
+
+        if current:
+            lines.append(" ".join(current))
 
     return lines
 
 
 class PdfRecipeReportGenerator(RecipeReportGenerator):
+    # 2: wrap_text respeta los saltos de línea y parte palabras largas
+    version = "2"
+    format = "pdf"
+    media_type = "application/pdf"
+    extension = "pdf"
+
     def generate(self, recipe) -> bytes:
         buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
+        self.write(recipe, buffer)
+        pdf = buffer.getvalue()
+        buffer.close()
+        return pdf
+
+    def write(self, recipe, out) -> int:
+        """Dibuja la receta en 'out' (ruta o archivo); devuelve el número de páginas."""
+        recipe = RecipeData.from_recipe(recipe)
+        p = canvas.Canvas(out, pagesize=letter)
 
         # Configuración básica de la página
         width, height = letter
@@ -59,7 +288,7 @@ class PdfRecipeReportGenerator(RecipeReportGenerator):
 
         # ----- INFO BÁSICA -----
         p.setFont("Helvetica", 12)
-        if getattr(recipe, "preparation_time", None):
+        if recipe.preparation_time:
             p.drawString(
                 left_margin,
                 y,
@@ -67,13 +296,8 @@ class PdfRecipeReportGenerator(RecipeReportGenerator):
             )
             y -= 20
 
-        if getattr(recipe, "min_portion", None) or getattr(recipe, "max_portion", None):
-            porciones = ""
-            if getattr(recipe, "min_portion", None):
-                porciones += str(recipe.min_portion)
-            if getattr(recipe, "max_portion", None):
-                porciones += f" - {recipe.max_portion}"
-            p.drawString(left_margin, y, f"Porciones: {porciones}")
+        if recipe.min_portion or recipe.max_portion:
+            p.drawString(left_margin, y, f"Porciones: {portions(recipe)}")
             y -= 30
 
         # ----- INGREDIENTES -----
@@ -82,8 +306,8 @@ class PdfRecipeReportGenerator(RecipeReportGenerator):
         y -= 20
 
         p.setFont("Helvetica", 12)
-        for ing in recipe.ingredients.all():
-            text = f"- {ing.name}"
+        for ingredient in recipe.ingredients:
+            text = f"- {ingredient}"
             lines = wrap_text(text, usable_width, p, "Helvetica", 12)
 
             for line in lines:
@@ -104,34 +328,8 @@ class PdfRecipeReportGenerator(RecipeReportGenerator):
 
         p.setFont("Helvetica", 12)
 
-        # Obtener queryset de pasos
-        steps_qs = []
-        if hasattr(recipe, "steps"):
-            try:
-                steps_qs = recipe.steps.all()
-            except TypeError:
-                steps_qs = []
-
-        if not steps_qs and hasattr(recipe, "step_set"):
-            steps_qs = recipe.step_set.all()
-
-        if steps_qs:
-            for idx, step in enumerate(steps_qs, start=1):
-                text = None
-                for field_name in (
-                    "cleaned_description",
-                    "description",
-                    "text",
-                    "instruction",
-                    "content",
-                ):
-                    if hasattr(step, field_name):
-                        text = getattr(step, field_name)
-                        break
-
-                if text is None:
-                    text = str(step)
-
+        if recipe.steps:
+            for idx, text in enumerate(recipe.steps, start=1):
                 full_text = f"{idx}. {text}"
                 lines = wrap_text(full_text, usable_width, p, "Helvetica", 12)
 
@@ -150,16 +348,152 @@ class PdfRecipeReportGenerator(RecipeReportGenerator):
 
         # Cerrar página y PDF
         p.showPage()
+        pages = p.getPageNumber() - 1
         p.save()
+        return pages
 
-        pdf = buffer.getvalue()
-        buffer.close()
-        return pdf
+
+def _winansi(text: str) -> str:
+    """Escapa como \\uXXXX lo que las fuentes base de ReportLab no pueden dibujar."""
+    if text.isascii():
+        return text
+    chars = []
+    for char in text:
+        try:
+            char.encode("cp1252")
+            chars.append(char)
+        except UnicodeEncodeError:
+            chars.append(f"\\u{ord(char):04x}")
+    return "".join(chars)
+
+
+def wrap_monospace(line: str, max_chars: int):
+    """
+    Parte una línea de texto monoespaciado en trozos de 'max_chars'
+    caracteres; las continuaciones mantienen la sangría de la línea.
+    """
+    if len(line) <= max_chars:
+        return [line]
+    indent = line[:len(line) - len(line.lstrip(" "))]
+    if len(indent) > max_chars // 2:
+        indent = ""
+    pieces = [line[:max_chars]]
+    rest = line[max_chars:]
+    room = max_chars - len(indent)
+    while rest:
+        pieces.append(indent + rest[:room])
+        rest = rest[room:]
+    return pieces
+
+
+class JsonPdfGenerator:
+    """
+    PDF de un JSON recibido (``JsonHistory``) dibujado directo con
+    ReportLab: el JSON con sangría, en letra monoespaciada, partido al ancho
+    de la página y paginado. Misma forma que RecipeReportGenerator.
+    """
+    version = "1"
+    font_name = "Courier"
+    font_size = 9
+    line_height = 11
+
+    def __init__(self, now=None):
+        # 'now' devuelve la fecha de generación (se inyecta para la zona horaria)
+        self.now = now or datetime.now
+
+    def generate(self, entry) -> bytes:
+        buffer = io.BytesIO()
+        self.write(entry, buffer)
+        return buffer.getvalue()
+
+    def write(self, entry, out) -> int:
+        """Dibuja 'entry' (con .id y .content) en 'out'; devuelve el número de páginas."""
+        p = canvas.Canvas(out, pagesize=letter)
+        width, height = letter
+        left_margin = 50
+        right_margin = 50
+        usable_width = width - left_margin - right_margin
+        max_chars = max(1, int(usable_width // pdfmetrics.stringWidth("M", self.font_name, self.font_size)))
+
+        y = height - 50
+
+        # ----- ENCABEZADO -----
+        p.setFont("Helvetica-Bold", 18)
+        p.drawCentredString(width / 2, y, f"Historial JSON #{entry.id}")
+        y -= 22
+        p.setFont("Helvetica", 10)
+        p.drawCentredString(width / 2, y, f"Documento generado el: {self.now():%d %b %Y %H:%M}")
+        y -= 30
+
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(left_margin, y, "Contenido del JSON:")
+        y -= 20
+
+        # ----- CONTENIDO -----
+        text = p.beginText(left_margin, y)
+        text.setFont(self.font_name, self.font_size)
+        text.setLeading(self.line_height)
+        pretty = json.dumps(entry.content, indent=4, ensure_ascii=False)
+        for line in pretty.splitlines():
+            for piece in wrap_monospace(_winansi(line), max_chars):
+                if text.getY() < 50:
+                    p.drawText(text)
+                    p.showPage()
+                    text = p.beginText(left_margin, height - 50)
+                    text.setFont(self.font_name, self.font_size)
+                    text.setLeading(self.line_height)
+                text.textLine(piece)
+        p.drawText(text)
+
+        p.showPage()
+        pages = p.getPageNumber() - 1
+        p.save()
+        return pages
+
+
+# Formatos disponibles: ?format=<nombre> -> generador
+REPORT_GENERATORS = {
+    generator.format: generator
+    for generator in (
+        PdfRecipeReportGenerator,
+        HtmlRecipeReportGenerator,
+        MarkdownRecipeReportGenerator,
+        TextRecipeReportGenerator,
+        JsonRecipeReportGenerator,
+    )
+}
 
 
 class RecipeReportService:
     def __init__(self, generator: RecipeReportGenerator):
         self.generator = generator
 
+    @classmethod
+    def for_format(cls, name: str) -> "RecipeReportService":
+        """Servicio con el generador registrado para 'name'; ValueError si no existe."""
+        try:
+            return cls(REPORT_GENERATORS[name]())
+        except KeyError:
+            raise ValueError(f"'format' debe ser uno de: {', '.join(REPORT_GENERATORS)}")
+
+    @property
+    def content_type(self) -> str:
+        if isinstance(self.generator, TextualRecipeReportGenerator):
+            return f"{self.generator.media_type}; charset=utf-8"
+        return self.generator.media_type
+
+    def filename(self, recipe) -> str:
+        return f"receta_{recipe.id}.{self.generator.extension}"
+
     def build_report(self, recipe) -> bytes:
         return self.generator.generate(recipe)
+
+
+def render_pdf_files(jobs):
+    """
+    Escribe el PDF de cada (RecipeData, ruta) de 'jobs' en su ruta y
+    devuelve el número de páginas de cada uno. Se ejecuta en otros procesos:
+    los PDF van directo al disco en vez de viajar de vuelta por el pool.
+    """
+    generator = PdfRecipeReportGenerator()
+    return [generator.write(recipe, str(path)) for recipe, path in jobs]
@@ -0,0 +1,88 @@
+"""
+Reportes de recetas en varios formatos (PDF, HTML, Markdown, texto y JSON).
+
+Todas las exportaciones cargan las recetas con ``recipe_data``: ingredientes
+y pasos en bloque (una consulta por relación), convertidos a ``RecipeData``.
+Así cada exportación hace siempre el mismo número de consultas y los
+generadores no tocan el ORM.
+
+El formato se elige con ``?format=`` o, si no viene, con el encabezado
+``Accept`` (ver ``requested_format``); los generadores están en
+``report_generators.REPORT_GENERATORS``.
+"""
+from django.db.models import Prefetch
+
+from .models import Ingredient, Recipe, Step
+from .report_generators import REPORT_GENERATORS, RecipeData
+
+PDF = "pdf"
+
+# Otros nombres aceptados en ?format=
+FORMAT_ALIASES = {"markdown": "md", "text": "txt", "htm": "html"}
+
+
+def recipe_data(queryset, chunk_size=500):
+    """Itera las recetas de 'queryset' como RecipeData, con ingredientes y pasos en bloque."""
+    queryset = queryset.only(
+        "id", "name", "preparation_time", "min_portion", "max_portion"
+    ).prefetch_related(
+        Prefetch("ingredients", queryset=Ingredient.objects.only("id", "recipe_id", "name")),
+        Prefetch("steps", queryset=Step.objects.only(
+            "id", "recipe_id", "order", "description", "cleaned_description"
+        )),
+    )
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        yield RecipeData.from_recipe(recipe)
+
+
+def load_recipe(pk):
+    """RecipeData de la receta 'pk' (tres consultas) o None si no existe."""
+    return next(recipe_data(Recipe.objects.filter(pk=pk)), None)
+
+
+def _accepted(header):
+    """Tipos de 'header' (Accept) ordenados por preferencia, sin los de q=0."""
+    accepted = []
+    for position, item in enumerate(header.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > 0:
+            accepted.append((-quality, position, media_type.lower()))
+    return [media_type for _quality, _position, media_type in sorted(accepted)]
+
+
+def requested_format(request, default=PDF):
+    """
+    Formato pedido: ?format= si viene (ValueError si no existe) o el primero
+    del encabezado Accept que tengamos. Devuelve None si Accept no admite
+    ninguno de nuestros formatos.
+    """
+    name = request.GET.get("format")
+    if name:
+        name = FORMAT_ALIASES.get(name.lower(), name.lower())
+        if name not in REPORT_GENERATORS:
+            raise ValueError(f"'format' debe ser uno de: {', '.join(REPORT_GENERATORS)}")
+        return name
+
+    header = request.headers.get("Accept", "")
+    if not header.strip():
+        return default
+    # El formato por defecto va primero para resolver comodines ("text/*")
+    candidates = sorted(REPORT_GENERATORS.values(), key=lambda generator: generator.format != default)
+    for media_type in _accepted(header):
+        if media_type == "*/*":
+            return default
+        major, _, minor = media_type.partition("/")
+        for generator in candidates:
+            if generator.media_type == media_type or (
+                minor == "*" and generator.media_type.startswith(f"{major}/")
+            ):
+                return generator.format
+    return None
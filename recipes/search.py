@@ -0,0 +1,412 @@
+"""
+Búsqueda de texto completo de recetas sobre un índice FTS5 de SQLite.
+
+El índice guarda una fila por receta (rowid = id de la receta) con tres
+columnas: nombre, ingredientes y pasos. Se mantiene sincronizado desde
+``recipes.signals`` y se ordena con BM25 dando más peso al nombre.
+
+Para tolerar acentos y errores de tipeo hay además un índice de trigramas
+sobre los nombres normalizados (sin tildes, en minúsculas) de la receta y
+de sus ingredientes: el índice entrega candidatos y la similitud de
+trigramas decide cuáles pasan el umbral.
+
+En la lista de recetas la coincidencia con el índice se aplica dentro de la
+misma consulta (un JOIN con el índice FTS5 o un ``IN`` sobre el de
+trigramas), así los demás filtros, el conteo y la paginación ven todas las
+coincidencias y no solo las primeras.
+"""
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, When
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "recipes_recipe_fts"
+TRIGRAM_TABLE = "recipes_recipe_trigram"
+
+# Pesos BM25 por columna: nombre, ingredientes, pasos
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Máximo de ids que devuelve search_recipe_ids (búsqueda del admin)
+SEARCH_RESULT_LIMIT = 500
+
+# Similitud mínima (0..1) para aceptar una coincidencia aproximada
+SIMILARITY_THRESHOLD = 0.3
+
+# Máximo de candidatos del índice de trigramas que se puntúan en Python
+FUZZY_CANDIDATE_LIMIT = 2000
+
+# Separador de los nombres de ingredientes dentro del índice de trigramas
+INGREDIENT_SEPARATOR = " | "
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Recetas de este hilo que esperan reindexarse al confirmar la transacción
+_pending = threading.local()
+
+
+def fts_available(conn=None) -> bool:
+    """El índice FTS5 solo existe cuando la base de datos es SQLite."""
+    return (conn or connection).vendor == "sqlite"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza texto en español para comparar: sin tildes ni diéresis,
+    en minúsculas y con los espacios colapsados ("Ají  Color" -> "aji color").
+    """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+@lru_cache(maxsize=4096)
+def _word_trigrams(word: str) -> frozenset:
+    # Igual que pg_trgm: dos espacios al inicio y uno al final
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    """Similitud de Jaccard entre los trigramas de dos palabras."""
+    grams_a, grams_b = _word_trigrams(a), _word_trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def word_similarity(query: str, target: str) -> float:
+    """
+    Promedio, sobre las palabras de 'query', de la mejor similitud con
+    alguna palabra de 'target'. Ambos textos deben venir normalizados.
+    """
+    query_words = _TOKEN_RE.findall(query)
+    target_words = _TOKEN_RE.findall(target)
+    if not query_words or not target_words:
+        return 0.0
+    return sum(
+        max(trigram_similarity(word, other) for other in target_words)
+        for word in query_words
+    ) / len(query_words)
+
+
+def build_match_query(text: str) -> str:
+    """
+    Convierte lo que escribe el usuario en una consulta MATCH segura.
+
+    Cada palabra se cita (para que FTS5 no interprete operadores) y se
+    busca como prefijo, de modo que "arro" encuentre "arroz" mientras se
+    escribe en el buscador.
+    """
+    tokens = _TOKEN_RE.findall(text or "")
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _recipe_documents(recipe_ids):
+    """Devuelve (id, nombre, ingredientes, pasos) de las recetas indicadas."""
+    from .models import Recipe, Ingredient, Step
+
+    names = dict(Recipe.objects.filter(pk__in=recipe_ids).values_list("id", "name"))
+
+    ingredients = {}
+    for recipe_id, name in (
+        Ingredient.objects.filter(recipe_id__in=names)
+        .order_by("id")
+        .values_list("recipe_id", "name")
+    ):
+        ingredients.setdefault(recipe_id, []).append(name)
+
+    steps = {}
+    for recipe_id, description in (
+        Step.objects.filter(recipe_id__in=names)
+        .order_by("order", "id")
+        .values_list("recipe_id", "description")
+    ):
+        steps.setdefault(recipe_id, []).append(description)
+
+    return [
+        (
+            recipe_id,
+            name,
+            "\n".join(ingredients.get(recipe_id, [])),
+            "\n".join(steps.get(recipe_id, [])),
+        )
+        for recipe_id, name in names.items()
+    ]
+
+
+def _trigram_documents(documents):
+    """Nombre e ingredientes normalizados para el índice de trigramas."""
+    return [
+        (
+            recipe_id,
+            normalize_text(name),
+            INGREDIENT_SEPARATOR.join(normalize_text(line) for line in ingredients.split("\n") if line),
+        )
+        for recipe_id, name, ingredients, _steps in documents
+    ]
+
+
+def _pending_ids() -> set:
+    if not hasattr(_pending, "ids"):
+        _pending.ids = set()
+    return _pending.ids
+
+
+def index_recipes(recipe_ids):
+    """(Re)indexa las recetas indicadas; las que ya no existen se quitan."""
+    recipe_ids = list(recipe_ids)
+    _pending_ids().difference_update(recipe_ids)
+    if not recipe_ids or not fts_available():
+        return
+
+    documents = _recipe_documents(recipe_ids)
+    with connection.cursor() as cursor:
+        unindex_recipes(recipe_ids, cursor=cursor)
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, ingredients, steps) VALUES (%s, %s, %s, %s)",
+            documents,
+        )
+        cursor.executemany(
+            f"INSERT INTO {TRIGRAM_TABLE} (rowid, name, ingredients) VALUES (%s, %s, %s)",
+            _trigram_documents(documents),
+        )
+
+
+def index_recipes_on_commit(recipe_ids):
+    """
+    Reindexa las recetas al confirmar la transacción, una sola vez por
+    receta aunque se pida una vez por cada ingrediente o paso borrado. Si
+    antes se llama a index_recipes con ellas, ya no se repite.
+    """
+    recipe_ids = set(recipe_ids)
+    pending = _pending_ids()
+    pending.update(recipe_ids)
+
+    def flush():
+        ids = recipe_ids & pending
+        if ids:
+            index_recipes(ids)
+
+    # Una función por llamada (baratas; solo la primera reindexa): si la
+    # transacción se revierte, Django las descarta todas
+    transaction.on_commit(flush)
+
+
+def unindex_recipes(recipe_ids, cursor=None):
+    """Elimina las recetas indicadas del índice."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not fts_available():
+        return
+
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    statements = [
+        f"DELETE FROM {table} WHERE rowid IN ({placeholders})"
+        for table in (FTS_TABLE, TRIGRAM_TABLE)
+    ]
+    if cursor is not None:
+        for sql in statements:
+            cursor.execute(sql, recipe_ids)
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql, recipe_ids)
+
+
+def rebuild_index(batch_size=1000):
+    """Vacía el índice y lo vuelve a construir desde las tablas de recetas."""
+    from .models import Recipe
+
+    if not fts_available():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"DELETE FROM {TRIGRAM_TABLE}")
+
+    total = 0
+    ids = list(Recipe.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        index_recipes(batch)
+        total += len(batch)
+    return total
+
+
+def search_recipe_ids(text: str, limit: int = SEARCH_RESULT_LIMIT, offset: int = 0):
+    """
+    Devuelve los ids de las recetas que coinciden con 'text', ordenados
+    por relevancia (BM25). Lista vacía si no hay nada que buscar.
+    """
+    match = build_match_query(text)
+    if not match or not fts_available():
+        return []
+
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s",
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _query_trigrams(words):
+    """Trigramas (sin relleno) de las palabras de la consulta, como en el índice."""
+    grams = set()
+    for word in words:
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def fuzzy_search_recipe_ids(text: str, threshold: float = SIMILARITY_THRESHOLD,
+                            column: str = None, limit: int = None):
+    """
+    Búsqueda aproximada tolerante a tildes y errores de tipeo.
+
+    'column' puede ser "name" o "ingredients" para limitar dónde se busca;
+    por defecto se consideran ambos. Devuelve ids ordenados por similitud
+    (todos los que pasan el umbral, o los primeros 'limit'). Se puntúan a
+    lo más FUZZY_CANDIDATE_LIMIT candidatos: es el respaldo para errores de
+    tipeo, no una búsqueda exhaustiva.
+    """
+    words = _TOKEN_RE.findall(normalize_text(text))
+    grams = _query_trigrams(words)
+    if not grams or not fts_available():
+        return []
+
+    match = " OR ".join(f'"{gram}"' for gram in sorted(grams))
+    if column:
+        match = f"{column} : ({match})"
+
+    query = " ".join(words)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, name, ingredients FROM {TRIGRAM_TABLE} "
+            f"WHERE {TRIGRAM_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [match, FUZZY_CANDIDATE_LIMIT],
+        )
+        candidates = cursor.fetchall()
+
+    scored = []
+    for recipe_id, name, ingredients in candidates:
+        targets = []
+        if column in (None, "name"):
+            targets.append(name)
+        if column in (None, "ingredients"):
+            targets.extend(ingredients.split(INGREDIENT_SEPARATOR))
+        score = max(word_similarity(query, target) for target in targets)
+        if score >= threshold:
+            scored.append((score, recipe_id))
+
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [recipe_id for _score, recipe_id in scored[:limit]]
+
+
+def _has_match(table, match) -> bool:
+    """¿Alguna fila de 'table' coincide con 'match'?"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {table} WHERE {table} MATCH %s LIMIT 1", [match])
+        return cursor.fetchone() is not None
+
+
+def canonical_ingredient_ids(text: str):
+    """
+    Ids del vocabulario de ingredientes canónicos que contienen 'text'
+    (interpretado igual que un ingrediente: sin cantidad, en singular).
+    """
+    from .ingredient_parser import parse_ingredient
+    from .models import CanonicalIngredient
+
+    term = parse_ingredient(text).name
+    if not term:
+        return []
+    return list(CanonicalIngredient.objects.filter(name__contains=term).values_list("id", flat=True))
+
+
+def filter_by_ingredient(queryset, text: str):
+    """
+    Filtra 'queryset' a las recetas que usan el ingrediente 'text'.
+
+    Primero se busca en el vocabulario canónico (tabla pequeña) y se filtra
+    por la clave foránea indexada; si el vocabulario no lo conoce se recurre
+    al índice de trigramas sobre los nombres tal como fueron escritos.
+    """
+    canonical_ids = canonical_ingredient_ids(text)
+    if canonical_ids:
+        return queryset.filter(ingredients__canonical_id__in=canonical_ids).distinct()
+
+    normalized = normalize_text(text)
+    if not fts_available() or len(normalized) < 3:
+        return queryset.filter(
+            ingredients__name_normalized__contains=normalized
+        ).distinct()
+
+    # Con el tokenizador de trigramas una frase equivale a una subcadena
+    phrase = normalized.replace('"', '""')
+    match = f'ingredients : "{phrase}"'
+    if _has_match(TRIGRAM_TABLE, match):
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH %s", [match])
+        )
+    # Sin coincidencias exactas: búsqueda aproximada sobre los ingredientes
+    return queryset.filter(pk__in=fuzzy_search_recipe_ids(text, column="ingredients"))
+
+
+def order_by_ids(queryset, ids):
+    """Filtra 'queryset' a los ids dados conservando el orden de la lista."""
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(ranking)
+
+
+def search_recipes(queryset, text: str):
+    """
+    Aplica la búsqueda de texto a 'queryset' y lo ordena por relevancia.
+    Si el índice no encuentra nada se intenta la búsqueda aproximada, para
+    que "merquen" o "ajiako" sigan dando resultados. Sin FTS5 (otra base
+    de datos) se compara el nombre normalizado.
+    """
+    if not fts_available():
+        return queryset.filter(name_normalized__contains=normalize_text(text))
+    match = build_match_query(text)
+    if match and _has_match(FTS_TABLE, match):
+        return rank_by_match(queryset, match)
+    return order_by_ids(queryset, fuzzy_search_recipe_ids(text))
+
+
+def rank_by_match(queryset, match):
+    """
+    'queryset' unido al índice FTS5: solo las recetas que coinciden con
+    'match', ordenadas por BM25 (y por id entre empates).
+    """
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    return queryset.extra(
+        select={"search_rank": f"bm25({FTS_TABLE}, {weights})"},
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {queryset.model._meta.db_table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+    ).order_by("search_rank", "id")
+
+
+def filter_recipes(queryset, query: str = "", ingredient: str = "", max_time=""):
+    """
+    Filtros de la lista de recetas: ingrediente (sin tildes, tolera errores
+    de tipeo), tiempo máximo y texto libre. Con 'query' el resultado queda
+    ordenado por relevancia.
+    """
+    if ingredient:
+        queryset = filter_by_ingredient(queryset, ingredient)
+    if max_time:
+        queryset = queryset.filter(preparation_time__lte=max_time)
+    if query:
+        queryset = search_recipes(queryset, query)
+    return queryset
@@ -0,0 +1,142 @@
+"""
+Receptores de señales que mantienen al día las estructuras derivadas de
+las recetas (nombres normalizados, ingredientes interpretados, índices de
+búsqueda, versiones de cache y posiciones para el avance de los usuarios)
+cuando cambian Recipe, Ingredient o Step. También fusiona el avance
+anónimo (cookie) con el del usuario cuando inicia sesión.
+
+El índice de la despensa vive en memoria, así que sus cambios se aplican
+solo cuando la transacción se confirma.
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import pantry, pdf_cache, progress, search
+from .caching import bump_version, recipe_version_name
+from .ingredient_parser import parse_ingredient
+from .models import CanonicalIngredient, FavoriteRecipe, Ingredient, Recipe, Step, clean_step_description
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Ingredient)
+def normalize_name(sender, instance, **kwargs):
+    instance.name_normalized = search.normalize_text(instance.name)
+
+
+@receiver(pre_save, sender=Step)
+def clean_description(sender, instance, **kwargs):
+    instance.cleaned_description = clean_step_description(instance.description)
+
+
+@receiver(pre_save, sender=Ingredient)
+def parse_ingredient_name(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    parsed = parse_ingredient(instance.name)
+    instance.quantity = parsed.quantity
+    instance.unit = parsed.unit
+    instance.canonical = (
+        CanonicalIngredient.objects.get_or_create(name=parsed.name)[0]
+        if parsed.name else None
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def reindex_saved_recipe(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_deleted_recipe(sender, instance, **kwargs):
+    search.unindex_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Step)
+def reindex_parent_recipe(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_recipes([instance.recipe_id])
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Step)
+def reindex_parent_recipe_on_delete(sender, instance, origin=None, **kwargs):
+    # Al borrar la receta, unindex_deleted_recipe ya la quita del índice
+    if isinstance(origin, Recipe) or getattr(origin, "model", None) is Recipe:
+        return
+    # Borrar muchos ingredientes o pasos (importer) reindexa cada receta una vez
+    search.index_recipes_on_commit([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_pantry_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    values = (instance.pk, instance.recipe_id, instance.name)
+    transaction.on_commit(lambda: pantry.ingredient_saved(*values))
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_from_pantry_index(sender, instance, **kwargs):
+    ingredient_id = instance.pk
+    transaction.on_commit(lambda: pantry.ingredient_deleted(ingredient_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog_counts(sender, **kwargs):
+    bump_version("catalog")
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_detail(sender, instance, **kwargs):
+    bump_version(recipe_version_name(instance.pk))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Step)
+@receiver(post_delete, sender=Step)
+def invalidate_recipe_detail_items(sender, instance, **kwargs):
+    bump_version(recipe_version_name(instance.recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Step)
+@receiver(post_delete, sender=Step)
+def invalidate_recipe_pdf(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(lambda: pdf_cache.invalidate(recipe_id))
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def invalidate_favorite_counts(sender, instance, **kwargs):
+    bump_version(f"favorites:{instance.user_id}")
+
+
+@receiver(pre_save, sender=Ingredient)
+@receiver(pre_save, sender=Step)
+def assign_progress_position(sender, instance, raw=False, **kwargs):
+    if raw or instance.position is not None:
+        return
+    instance.position = progress.next_position(sender, instance.recipe_id)
+
+
+@receiver(user_logged_in)
+def merge_anonymous_progress(sender, request, user, **kwargs):
+    if request is not None:
+        progress.merge_anonymous_progress(request, user)
@@ -0,0 +1,148 @@
+"""
+Respuestas guardadas de ``ai_assistant.suggest_substitution``.
+
+Preguntas como "¿mantequilla por aceite?" se repiten entre usuarios, así
+que cada respuesta de la IA se guarda en ``SubstitutionAnswer`` con una
+clave que resume el ingrediente faltante y el sustituto (normalizados: sin
+tildes ni mayúsculas) y el contenido de la receta.
+
+- Las respuestas vigentes (``SUBSTITUTION_CACHE_TTL``) también quedan
+  unos minutos en el cache de Django: las preguntas frecuentes no tocan la
+  base de datos.
+- Una respuesta vencida se vuelve a preguntar; si la IA falla y
+  ``SUBSTITUTION_CACHE_SERVE_STALE`` está activo, se responde con la
+  vencida.
+- Sobre ``SUBSTITUTION_CACHE_MAX_ENTRIES`` se borran las menos usadas.
+- ``stats()`` devuelve los aciertos, fallos y respuestas vencidas usadas.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import SubstitutionAnswer
+from .search import normalize_text
+
+# Cambiarla si cambia la pregunta que se le hace a la IA: deja huérfanas las respuestas viejas
+KEY_VERSION = 1
+# Segundos que una respuesta queda en el cache de Django; al volver a la
+# base de datos se marca como usada (así no se escribe en cada acierto)
+MEMORY_TIMEOUT = 300
+COUNTERS = ("hits", "misses", "stale")
+
+
+def ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "SUBSTITUTION_CACHE_TTL", 30 * 24 * 60 * 60))
+
+
+def max_entries() -> int:
+    return getattr(settings, "SUBSTITUTION_CACHE_MAX_ENTRIES", 10000)
+
+
+def serve_stale() -> bool:
+    return getattr(settings, "SUBSTITUTION_CACHE_SERVE_STALE", True)
+
+
+def make_key(missing, substitute, recipe_title=None, recipe_text=None) -> str:
+    """Clave de una pregunta: ingredientes normalizados y hash del contenido de la receta."""
+    recipe = json.dumps([recipe_title or "", recipe_text or ""], ensure_ascii=False)
+    content_hash = hashlib.sha256(recipe.encode("utf-8")).hexdigest()
+    parts = [KEY_VERSION, normalize_text(missing or ""), normalize_text(substitute or ""), content_hash]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def _memory_key(key) -> str:
+    return f"recipes:substitution:{key}"
+
+
+def _counter_key(name) -> str:
+    return f"recipes:substitution:count:{name}"
+
+
+def _count(name):
+    # En FileBasedCache, incr vuelve a escribir la clave con el timeout por
+    # defecto: se deja otra vez sin vencimiento para que no se pierda al
+    # pasar unos minutos sin consultas
+    key = _counter_key(name)
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+    else:
+        cache.touch(key, None)
+
+
+def stats() -> dict:
+    """
+    Contadores de este cache y respuestas guardadas. Los contadores no
+    vencen; se reinician si se vacía el cache de Django (con el cache en
+    disco, dos procesos a la vez pueden perder algún incremento).
+    """
+    counters = cache.get_many([_counter_key(name) for name in COUNTERS])
+    result = {name: counters.get(_counter_key(name), 0) for name in COUNTERS}
+    result["entries"] = SubstitutionAnswer.objects.count()
+    return result
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    answer: dict
+    fresh: bool
+
+
+def lookup(key) -> Optional[CachedAnswer]:
+    """
+    Respuesta guardada bajo 'key' o None. Cuenta un acierto si está vigente
+    y un fallo si no hay o está vencida (en ese caso hay que preguntar).
+    """
+    answer = cache.get(_memory_key(key))
+    if answer is not None:
+        _count("hits")
+        return CachedAnswer(answer, fresh=True)
+
+    entry = SubstitutionAnswer.objects.filter(key=key).only("id", "answer", "answered_at").first()
+    if entry is None:
+        _count("misses")
+        return None
+    now = timezone.now()
+    SubstitutionAnswer.objects.filter(pk=entry.pk).update(last_used_at=now)
+    remaining = (entry.answered_at + ttl() - now).total_seconds()
+    if remaining <= 0:
+        _count("misses")
+        return CachedAnswer(entry.answer, fresh=False)
+    cache.set(_memory_key(key), entry.answer, int(min(MEMORY_TIMEOUT, remaining)))
+    _count("hits")
+    return CachedAnswer(entry.answer, fresh=True)
+
+
+def use_stale(cached):
+    """Respuesta vencida para cuando la IA falla, o None si no se permiten."""
+    if cached is None or not serve_stale():
+        return None
+    _count("stale")
+    return cached.answer
+
+
+def store(key, missing, substitute, answer):
+    """Guarda (o renueva) la respuesta de 'key' y borra las menos usadas si sobran."""
+    now = timezone.now()
+    SubstitutionAnswer.objects.update_or_create(key=key, defaults={
+        "missing": (missing or "")[:255],
+        "substitute": (substitute or "")[:255],
+        "answer": answer,
+        "answered_at": now,
+        "last_used_at": now,
+    })
+    cache.set(_memory_key(key), answer, int(min(MEMORY_TIMEOUT, ttl().total_seconds())))
+
+    # Solo se llega aquí tras preguntarle a la IA: contar no es lo caro
+    if SubstitutionAnswer.objects.count() > max_entries():
+        keep = SubstitutionAnswer.objects.order_by("-last_used_at", "-id")[:max_entries()].values_list("id", flat=True)
+        SubstitutionAnswer.objects.exclude(id__in=list(keep)).delete()
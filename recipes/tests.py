@@ -1,10 +1,75 @@
-from django.test import TestCase, Client
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core import signals
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.management import CommandError, call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Recipe
+from pypdf import PdfReader
+from . import ai_assistant, ai_client, caching, cookbook, exporter, importer, jobs, pantry, pdf_cache, progress, search, substitution_cache
+from .import_parser import parse_list
+from .ingredient_parser import parse_ingredient
+from .models import Recipe, Ingredient, Step, FavoriteRecipe, ImportCheckpoint, JsonHistory, RecipeProgress, ReportJob, SubstitutionAnswer
+from .pagination import encode_cursor
+from reportlab.pdfbase import pdfmetrics
+from .report_generators import PdfRecipeReportGenerator, RecipeData, wrap_text
+
+
+class CocinaTestCase(TestCase):
+    """
+    Base de las pruebas: el cache de Django, los PDF en cache y los
+    trabajos de reportes se escriben en un directorio temporal, nunca en
+    los del proyecto.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        settings_override = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": str(Path(tmp.name) / "django_cache"),
+                }
+            },
+            RECIPE_PDF_CACHE_DIR=Path(tmp.name) / "pdf_cache",
+            REPORT_JOBS_DIR=str(Path(tmp.name) / "report_jobs"),
+        )
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        super().setUpClass()
+
+    def finish_report_job(self, response):
+        """Sigue a la página del trabajo, lo procesa como report_worker y devuelve la descarga."""
+        self.assertEqual(response.status_code, 302)
+        page = self.client.get(response["Location"])
+        self.assertEqual(page.context["state"]["status"], ReportJob.PENDING)
+        jobs.work(once=True)
+        state = self.client.get(page.context["state"]["status_url"]).json()
+        self.assertEqual(state["status"], ReportJob.DONE, state.get("error"))
+        return self.client.get(state["download_url"])
 
 
-class RecipeTests(TestCase):
+class RecipeTests(CocinaTestCase):
     def setUp(self):
         self.client = Client()
 
@@ -30,3 +95,1218 @@ class RecipeTests(TestCase):
         url = reverse("recipe_list")
         response = self.client.get(url)
         self.assertContains(response, "Arroz con pollo")
+
+
+class RecipeSearchTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+
+        self.ajiaco = Recipe.objects.create(name="Ajiaco chileno", preparation_time=40, creator=self.user)
+        Ingredient.objects.create(recipe=self.ajiaco, name="4 papas medianas")
+        Step.objects.create(recipe=self.ajiaco, order=1, description="Agregar el merkén al final.")
+
+        self.pure = Recipe.objects.create(name="Puré de papas", preparation_time=20, creator=self.user)
+        Ingredient.objects.create(recipe=self.pure, name="1 kilo de papas")
+
+    def test_search_matches_ingredients_and_steps(self):
+        """La búsqueda encuentra recetas por ingredientes y por pasos."""
+        self.assertEqual(set(search.search_recipe_ids("papas")), {self.ajiaco.pk, self.pure.pk})
+        self.assertEqual(search.search_recipe_ids("merken"), [self.ajiaco.pk])
+
+    def test_search_ranks_name_matches_first(self):
+        """Una coincidencia en el nombre pesa más que en los ingredientes."""
+        self.assertEqual(search.search_recipe_ids("papas")[0], self.pure.pk)
+
+    def test_index_follows_changes(self):
+        """El índice se actualiza al editar y borrar recetas e ingredientes."""
+        Ingredient.objects.create(recipe=self.pure, name="Mantequilla")
+        self.assertEqual(search.search_recipe_ids("mantequilla"), [self.pure.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pure.ingredients.filter(name="Mantequilla").delete()
+        self.assertEqual(search.search_recipe_ids("mantequilla"), [])
+
+        self.ajiaco.delete()
+        self.assertEqual(search.search_recipe_ids("merken"), [])
+
+    def test_deleting_many_items_reindexes_each_recipe_once(self):
+        """Borrar varios ingredientes reindexa la receta una vez; borrar la receta, ninguna."""
+        for n in range(3):
+            Ingredient.objects.create(recipe=self.pure, name=f"{n + 1} papas")
+        with mock.patch.object(search, "index_recipes", wraps=search.index_recipes) as index_recipes:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.pure.ingredients.filter(name__endswith="papas").delete()
+            self.assertEqual(index_recipes.call_count, 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.ajiaco.delete()
+            self.assertEqual(index_recipes.call_count, 1)
+
+    def test_recipe_list_uses_search(self):
+        """El buscador superior filtra la lista con el índice."""
+        response = self.client.get(reverse("recipe_list"), {"q": "ajiac"})
+        self.assertContains(response, "Ajiaco chileno")
+        self.assertNotContains(response, "Puré de papas")
+
+    def test_filters_and_count_see_every_match(self):
+        """Con más de 500 coincidencias, los demás filtros y el total las consideran todas."""
+        many = Recipe.objects.bulk_create(
+            Recipe(name=f"Pollo asado {n}", preparation_time=60, creator=self.user) for n in range(501)
+        )
+        Ingredient.objects.bulk_create(Ingredient(recipe=recipe, name="1 pollo entero") for recipe in many)
+        quick = Recipe.objects.create(name="Cazuela rápida", preparation_time=10, creator=self.user)
+        Step.objects.create(recipe=quick, order=1, description="1-Dorar el pollo")
+        search.rebuild_index()  # bulk_create no pasa por las señales
+
+        response = self.client.get(reverse("recipe_list"), {"q": "pollo", "max_time": 10})
+        self.assertEqual([r.name for r in response.context["recipes"]], ["Cazuela rápida"])
+        self.assertEqual(response.context["total"], 1)
+        # Sin vocabulario canónico (bulk_create): se usa el índice de trigramas
+        response = self.client.get(reverse("recipe_list"), {"ingredient": "pollo"})
+        self.assertEqual(response.context["total"], 501)
+
+class FuzzySearchTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.pebre = Recipe.objects.create(name="Pebre Chileno", preparation_time=10, creator=self.user)
+        Ingredient.objects.create(recipe=self.pebre, name="Ají color")
+        Ingredient.objects.create(recipe=self.pebre, name="Merkén")
+
+    def test_normalized_shadow_columns(self):
+        """Los nombres se guardan también sin tildes y en minúsculas."""
+        self.assertEqual(self.pebre.name_normalized, "pebre chileno")
+        self.assertTrue(Ingredient.objects.filter(name_normalized="merken").exists())
+
+    def test_fuzzy_search_tolerates_typos(self):
+        """Un error de tipeo sigue encontrando la receta."""
+        self.assertEqual(search.fuzzy_search_recipe_ids("pebre chilneo"), [self.pebre.pk])
+        self.assertEqual(search.fuzzy_search_recipe_ids("merquen", column="ingredients"), [self.pebre.pk])
+        self.assertEqual(search.fuzzy_search_recipe_ids("lasaña"), [])
+
+    def test_ingredient_filter_ignores_accents(self):
+        """El filtro de ingrediente no depende de tildes ni mayúsculas."""
+        response = self.client.get(reverse("recipe_list"), {"ingredient": "AJI COLOR"})
+        self.assertContains(response, "Pebre Chileno")
+        response = self.client.get(reverse("recipe_list"), {"ingredient": "merquen"})
+        self.assertContains(response, "Pebre Chileno")
+
+    def test_admin_search_uses_fuzzy_index(self):
+        """El buscador del admin también tolera errores de tipeo."""
+        admin_user = User.objects.create_superuser(username="admin", password="adminpass123")
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse("admin:recipes_recipe_changelist"), {"q": "pebree"})
+        self.assertContains(response, "Pebre Chileno")
+
+
+class PantrySearchTests(CocinaTestCase):
+    def setUp(self):
+        pantry.reset_index()
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+
+        self.pure = Recipe.objects.create(name="Puré de papas", preparation_time=20, creator=self.user)
+        for name in ("1 kilo de papas", "1 taza de leche", "Sal a gusto"):
+            Ingredient.objects.create(recipe=self.pure, name=name)
+
+        self.tortilla = Recipe.objects.create(name="Tortilla", preparation_time=25, creator=self.user)
+        for name in ("4 papas medianas", "6 huevos", "1 cebolla", "Aceite de oliva"):
+            Ingredient.objects.create(recipe=self.tortilla, name=name)
+
+    def tearDown(self):
+        pantry.reset_index()
+
+    def test_ranks_by_coverage(self):
+        """Primero las recetas completas, luego las que les falta menos."""
+        ranked = pantry.get_index().search(["papa", "leche", "sal", "huevo"])
+        self.assertEqual(ranked, [(self.pure.pk, 3, 3), (self.tortilla.pk, 2, 4)])
+
+        ranked = pantry.get_index().search(["papa", "leche", "sal", "huevo"], max_missing=0)
+        self.assertEqual(ranked, [(self.pure.pk, 3, 3)])
+
+    def test_index_updates_incrementally(self):
+        """El índice sigue los cambios de ingredientes sin reconstruirse."""
+        index = pantry.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tortilla.ingredients.get(name="Aceite de oliva").delete()
+            Ingredient.objects.create(recipe=self.pure, name="2 cucharadas de mantequilla")
+
+        self.assertIs(pantry.get_index(), index)
+        self.assertEqual(
+            index.search(["papa", "huevo", "cebolla"]),
+            [(self.tortilla.pk, 3, 3), (self.pure.pk, 1, 4)],
+        )
+
+    def test_pantry_endpoint(self):
+        """El endpoint responde JSON con la cobertura de cada receta."""
+        response = self.client.get(reverse("pantry_search"), {"items": "papas, huevos,cebolla,aceite"})
+        self.assertEqual(response.status_code, 200)
+        first = response.json()["results"][0]
+        self.assertEqual(first["name"], "Tortilla")
+        self.assertEqual(first["missing"], 0)
+
+        response = self.client.get(reverse("pantry_search"))
+        self.assertEqual(response.status_code, 400)
+
+
+class IngredientParserTests(CocinaTestCase):
+    def test_parses_quantity_unit_and_name(self):
+        """Cantidad, unidad y nombre canónico salen del texto libre."""
+        cases = {
+            "300 grs de carne asada, puede ser más": (300, "g", "carne asada"),
+            "1 1/2 taza de harina cernida": (1.5, "taza", "harina"),
+            "½ kilo de papas": (0.5, "kg", "papa"),
+            "1,5 litros de caldo de carne": (1.5, "l", "caldo de carne"),
+            "Sal, pimienta a gusto": (None, "a gusto", "sal"),
+            "1 cebolla grande o 2 cebollas medianas": (1, "", "cebolla"),
+            "Merkén": (None, "", "merken"),
+        }
+        for text, expected in cases.items():
+            parsed = parse_ingredient(text)
+            self.assertEqual((parsed.quantity, parsed.unit, parsed.name), expected, text)
+
+    def test_fields_filled_on_save(self):
+        """Al guardar un ingrediente se completan sus campos estructurados."""
+        user = User.objects.create_user(username="cocinero", password="testpass123")
+        recipe = Recipe.objects.create(name="Ajiaco", preparation_time=40, creator=user)
+        first = Ingredient.objects.create(recipe=recipe, name="4 papas medianas")
+        second = Ingredient.objects.create(recipe=recipe, name="1 kilo de papas")
+
+        self.assertEqual((first.quantity, first.unit), (4, ""))
+        self.assertEqual((second.quantity, second.unit), (1, "kg"))
+        self.assertEqual(first.canonical, second.canonical)
+        self.assertEqual(first.canonical.name, "papa")
+
+        response = self.client.get(reverse("recipe_list"), {"ingredient": "Papas"})
+        self.assertContains(response, "Ajiaco")
+
+
+@override_settings(RECIPES_PAGE_SIZE=2)
+class PaginationTests(CocinaTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.recipes = [
+            Recipe.objects.create(name=name, preparation_time=time, creator=self.user)
+            for name, time in (("Empanadas", 60), ("Cazuela", None), ("Pastel de choclo", 90),
+                               ("Charquicán", 45), ("Sopaipillas", 30))
+        ]
+
+    def walk(self, url, params=None):
+        """Recorre todas las páginas siguiendo el cursor."""
+        params = dict(params or {})
+        names = []
+        while True:
+            response = self.client.get(url, params)
+            names.extend(r.name for r in response.context["recipes"])
+            if not response.context["page"].has_next:
+                return names, response
+            params["cursor"] = response.context["page"].next_cursor
+
+    def test_keyset_pages_cover_catalog_once(self):
+        """Las páginas no se solapan ni saltan recetas, con ambos órdenes."""
+        names, response = self.walk(reverse("recipe_list"))
+        self.assertEqual(names, sorted(r.name for r in self.recipes))
+        self.assertEqual(response.context["total"], 5)
+
+        names, _ = self.walk(reverse("recipe_list"), {"sort": "time"})
+        self.assertEqual(names, ["Cazuela", "Sopaipillas", "Charquicán", "Empanadas", "Pastel de choclo"])
+
+    def test_page_query_count_is_constant(self):
+        """Una página profunda cuesta lo mismo que la primera."""
+        self.client.get(reverse("recipe_list"))  # calienta el conteo en cache
+        cursor = encode_cursor(["Pastel de choclo", self.recipes[2].pk])
+        with self.assertNumQueries(1):
+            self.client.get(reverse("recipe_list"), {"cursor": cursor})
+
+    def test_cached_count_invalidated_on_change(self):
+        """El total en cache se actualiza al crear una receta."""
+        self.assertEqual(self.client.get(reverse("recipe_list")).context["total"], 5)
+        Recipe.objects.create(name="Humitas", preparation_time=50, creator=self.user)
+        self.assertEqual(self.client.get(reverse("recipe_list")).context["total"], 6)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Un cursor editado a mano (tipos o largo que no calzan) no rompe la lista."""
+        first = [r.name for r in self.client.get(reverse("recipe_list")).context["recipes"]]
+        for values in (["a", "b"], ["Cazuela"], [None, 1], [["x"], 1], {"a": 1}):
+            response = self.client.get(reverse("recipe_list"), {"cursor": encode_cursor(values)})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([r.name for r in response.context["recipes"]], first)
+        response = self.client.get(reverse("recipe_list"), {"cursor": "WyJhIiwiYiJd"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_favorites_are_paginated(self):
+        """La lista de favoritos se pagina por cursor, los más recientes primero."""
+        for recipe in self.recipes:
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("favorite_list"))
+        self.assertEqual(len(response.context["favorites"]), 2)
+        self.assertEqual(response.context["total"], 5)
+        response = self.client.get(reverse("favorite_list"), {"cursor": response.context["page"].next_cursor})
+        self.assertEqual([f.recipe.name for f in response.context["favorites"]], ["Pastel de choclo", "Cazuela"])
+
+
+class RecipeDetailQueryTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.client.force_login(self.user)
+
+    def make_recipe(self, name, size):
+        recipe = Recipe.objects.create(name=name, preparation_time=30, creator=self.user)
+        for i in range(size):
+            Ingredient.objects.create(recipe=recipe, name=f"{i + 1} huevos")
+            Step.objects.create(recipe=recipe, order=i + 1, description=f"{i + 1}-Batir")
+        return recipe
+
+    def count_queries(self, recipe):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("recipe_detail", args=[recipe.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_independent_of_recipe_size(self):
+        """El detalle hace las mismas consultas con 2 o con 30 elementos."""
+        small = self.make_recipe("Pequeña", 2)
+        large = self.make_recipe("Grande", 30)
+        self.assertEqual(self.count_queries(small), self.count_queries(large))
+
+    def test_viewing_does_not_write_completion_rows(self):
+        """Ver una receta no crea filas; marcar un elemento sí."""
+        recipe = self.make_recipe("Tortilla", 3)
+        self.client.get(reverse("recipe_detail", args=[recipe.pk]))
+        self.assertFalse(RecipeProgress.objects.exists())
+
+        ingredient = recipe.ingredients.first()
+        self.client.post(reverse("toggle_ingredient_completion", args=[recipe.pk, ingredient.pk]))
+        response = self.client.get(reverse("recipe_detail", args=[recipe.pk]))
+        self.assertEqual(response.context["progress_state"], {"ingredients": f"{1 << ingredient.position:x}", "steps": "0"})
+
+    def test_static_fragment_is_cached_per_recipe_version(self):
+        """Los pasos se guardan ya limpios y el HTML se reutiliza hasta que la receta cambia."""
+        recipe = self.make_recipe("Tortilla", 3)
+        step = recipe.steps.first()
+        self.assertEqual(step.cleaned_description, "Batir")
+
+        first = self.count_queries(recipe)
+        self.assertLess(self.count_queries(recipe), first)
+
+        step.description = "1- Batir los huevos"
+        step.save()
+        response = self.client.get(reverse("recipe_detail", args=[recipe.pk]))
+        self.assertContains(response, "Batir los huevos")
+        self.assertNotContains(response, "1- Batir")
+
+    def test_lost_version_does_not_bring_back_old_fragments(self):
+        """Si el cache descarta la versión de la receta, no reaparece el HTML de una versión vieja."""
+        recipe = self.make_recipe("Tortilla", 1)
+        version_key = caching._version_key(caching.recipe_version_name(recipe.pk))
+        cache.delete(version_key)
+        self.client.get(reverse("recipe_detail", args=[recipe.pk]))
+        step = recipe.steps.first()
+        step.description = "1- Batir los huevos"
+        step.save()
+
+        cache.delete(version_key)
+        response = self.client.get(reverse("recipe_detail", args=[recipe.pk]))
+        self.assertContains(response, "Batir los huevos")
+
+    def test_bumped_version_does_not_expire_and_always_changes(self):
+        """Cada cambio deja una versión distinta, aun con el reloj detenido, y la versión no expira."""
+        with mock.patch.object(caching, "_initial_version", return_value=1000):
+            versions = [caching.bump_version("prueba") for _ in range(3)]
+        self.assertEqual(len(set(versions)), 3)
+        an_hour_later = time.time() + 3600
+        with mock.patch("django.core.cache.backends.filebased.time.time", return_value=an_hour_later):
+            self.assertEqual(caching.get_version("prueba"), versions[-1])
+
+
+class RecipeProgressTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.client.force_login(self.user)
+        self.recipe = Recipe.objects.create(name="Tortilla", preparation_time=25, creator=self.user)
+        self.ingredients = [
+            Ingredient.objects.create(recipe=self.recipe, name=name)
+            for name in ("4 papas", "6 huevos", "1 cebolla")
+        ]
+        self.step = Step.objects.create(recipe=self.recipe, order=1, description="1-Freír las papas")
+
+    def completed(self):
+        response = self.client.get(reverse("recipe_detail", args=[self.recipe.pk]))
+        state = response.context["progress_state"]
+        ingredients_done, steps_done = int(state["ingredients"], 16), int(state["steps"], 16)
+        ingredients = [i.name for i in self.recipe.ingredients.all() if progress.is_done(ingredients_done, i.position)]
+        steps = [s.pk for s in self.recipe.steps.all() if progress.is_done(steps_done, s.position)]
+        return ingredients, steps
+
+    def test_positions_are_assigned_in_creation_order(self):
+        """Cada ingrediente y paso recibe una posición fija."""
+        self.assertEqual([i.position for i in self.ingredients], [0, 1, 2])
+        self.assertEqual(self.step.position, 0)
+
+        # Dos altas que leyeron la misma posición libre no comparten el bit
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.bulk_create([Ingredient(recipe=self.recipe, name="Sal", position=2)])
+
+    def test_toggles_share_one_row(self):
+        """Marcar ingredientes y pasos actualiza una sola fila por receta."""
+        for ingredient in self.ingredients[:2]:
+            self.client.post(reverse("toggle_ingredient_completion", args=[self.recipe.pk, ingredient.pk]))
+        self.client.post(reverse("toggle_step_completion", args=[self.recipe.pk, self.step.pk]))
+        self.client.post(reverse("toggle_ingredient_completion", args=[self.recipe.pk, self.ingredients[0].pk]))
+
+        self.assertEqual(RecipeProgress.objects.count(), 1)
+        self.assertEqual(self.completed(), (["6 huevos"], [self.step.pk]))
+
+    def test_deleted_position_is_not_reused(self):
+        """Un ingrediente nuevo no hereda el bit de uno borrado, ni en la base de datos ni en la cookie."""
+        last = self.ingredients[-1]
+        toggle_url = reverse("toggle_ingredient_completion", args=[self.recipe.pk, last.pk])
+        self.client.post(toggle_url)
+        anonymous = Client()
+        anonymous.post(toggle_url)
+        last.delete()
+
+        replacement = Ingredient.objects.create(recipe=self.recipe, name="Sal")
+        self.assertEqual(replacement.position, 3)
+        self.assertEqual(self.completed(), ([], []))
+        state = anonymous.get(reverse("recipe_detail", args=[self.recipe.pk])).context["progress_state"]
+        self.assertFalse(progress.is_done(int(state["ingredients"], 16), replacement.position))
+
+
+class RecipeProgressApiTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.client.force_login(self.user)
+        self.recipe = Recipe.objects.create(name="Tortilla", preparation_time=25, creator=self.user)
+        self.ingredients = [
+            Ingredient.objects.create(recipe=self.recipe, name=f"{i} huevos") for i in range(1, 11)
+        ]
+        self.step = Step.objects.create(recipe=self.recipe, order=1, description="Batir")
+        self.url = reverse("recipe_progress_api", args=[self.recipe.pk])
+
+    def post(self, payload):
+        return self.client.post(self.url, payload, content_type="application/json")
+
+    def test_batch_sets_and_toggles_in_one_request(self):
+        """Diez ingredientes y un paso se marcan con una sola petición."""
+        self.post({"steps": {str(self.step.pk): False}})  # crea la fila de avance
+
+        with CaptureQueriesContext(connection) as single:
+            self.post({"ingredients": {str(self.ingredients[0].pk): False}, "steps": [self.step.pk]})
+        payload = {
+            "ingredients": {str(i.pk): True for i in self.ingredients},
+            "steps": {str(self.step.pk): True},
+        }
+        with CaptureQueriesContext(connection) as batch:
+            response = self.post(payload)
+        self.assertEqual(len(batch), len(single))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(all(data["ingredients"].values()))
+        self.assertEqual(data["steps"], {str(self.step.pk): True})
+
+        response = self.post({"ingredients": [self.ingredients[0].pk], "steps": {str(self.step.pk): True}})
+        self.assertEqual(response.json()["ingredients"], {str(self.ingredients[0].pk): False})
+        self.assertEqual(response.json()["steps"], {str(self.step.pk): True})
+
+        ingredients_done, steps_done = progress.load(self.user, self.recipe)
+        self.assertEqual(bin(ingredients_done).count("1"), 9)
+        self.assertEqual(steps_done, 1)
+
+    def test_rejects_items_from_other_recipes(self):
+        """Ids de otra receta o JSON mal formado devuelven 400."""
+        other = Recipe.objects.create(name="Otra", preparation_time=5, creator=self.user)
+        foreign = Ingredient.objects.create(recipe=other, name="Sal")
+        self.assertEqual(self.post({"ingredients": [foreign.pk]}).status_code, 400)
+        self.assertEqual(self.post({"ingredients": {"1": "si"}}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, "no json", content_type="application/json").status_code, 400)
+        self.assertFalse(RecipeProgress.objects.exists())
+
+
+class AnonymousProgressTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.recipe = Recipe.objects.create(name="Tortilla", preparation_time=25, creator=self.user)
+        self.egg = Ingredient.objects.create(recipe=self.recipe, name="3 huevos")
+        self.potato = Ingredient.objects.create(recipe=self.recipe, name="2 papas")
+        self.step = Step.objects.create(recipe=self.recipe, order=1, description="Batir")
+        self.url = reverse("recipe_progress_api", args=[self.recipe.pk])
+
+    def test_anonymous_progress_lives_in_cookie(self):
+        """Un anónimo marca ingredientes sin escribir en la base de datos."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url, {"ingredients": [self.egg.pk], "steps": [self.step.pk]},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(progress.PROGRESS_COOKIE, response.cookies)
+        writes = [q["sql"] for q in queries if not q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(writes, [])
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(RecipeProgress.objects.exists())
+
+        response = self.client.get(reverse("recipe_detail", args=[self.recipe.pk]))
+        state = response.context["progress_state"]
+        self.assertEqual(state["ingredients"], f"{1 << self.egg.position:x}")
+
+        # Una cookie alterada se ignora
+        self.client.cookies[progress.PROGRESS_COOKIE] = "manipulada"
+        response = self.client.get(reverse("recipe_detail", args=[self.recipe.pk]))
+        self.assertEqual(response.context["progress_state"], {"ingredients": "0", "steps": "0"})
+
+    def test_progress_is_merged_on_login(self):
+        """Al iniciar sesión el avance anónimo se suma al del usuario."""
+        progress.update(self.user, self.recipe.pk, [(progress.INGREDIENTS, self.potato.position, True)])
+        self.client.post(reverse("toggle_ingredient_completion", args=[self.recipe.pk, self.egg.pk]))
+
+        self.client.post(reverse("login"), {"username": "cocinero", "password": "testpass123"})
+        ingredients_done, _steps_done = progress.load(self.user, self.recipe)
+        self.assertTrue(progress.is_done(ingredients_done, self.egg.position))
+        self.assertTrue(progress.is_done(ingredients_done, self.potato.position))
+
+        response = self.client.get(reverse("recipe_detail", args=[self.recipe.pk]))
+        self.assertEqual(response.cookies[progress.PROGRESS_COOKIE].value, "")
+
+    def test_cookie_keeps_most_recent_recipes(self):
+        """La cookie de avance anónimo guarda solo las recetas más recientes."""
+        store = progress.CookieProgressStore(self.client.request().wsgi_request)
+        for recipe_id in range(1, progress.PROGRESS_COOKIE_MAX_RECIPES + 6):
+            store.update(recipe_id, [(progress.STEPS, 0, True)])
+        self.assertEqual(len(store.recipes), progress.PROGRESS_COOKIE_MAX_RECIPES)
+        self.assertNotIn("1", store.recipes)
+
+
+class RecipePdfCacheTests(CocinaTestCase):
+    def setUp(self):
+        # Cada prueba parte con el cache vacío (los id de receta se repiten)
+        self.cache_dir = Path(settings.RECIPE_PDF_CACHE_DIR)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.recipe = Recipe.objects.create(name="Tortilla", preparation_time=25, creator=self.user)
+        self.egg = Ingredient.objects.create(recipe=self.recipe, name="3 huevos")
+        Step.objects.create(recipe=self.recipe, order=1, description="1-Batir")
+        self.url = reverse("recipe_pdf", args=[self.recipe.pk])
+
+    def test_repeat_downloads_are_served_from_disk(self):
+        """El PDF se genera una vez; luego se lee del disco o responde 304."""
+        with mock.patch.object(PdfRecipeReportGenerator, "generate", autospec=True,
+                               side_effect=PdfRecipeReportGenerator.generate) as generate:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(b"".join(first.streaming_content), b"".join(second.streaming_content))
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_edits_change_the_etag_and_drop_old_files(self):
+        """Editar la receta cambia el ETag y borra el PDF anterior del cache."""
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.egg.name = "4 huevos"
+            self.egg.save()
+        self.assertEqual(list(self.cache_dir.glob("*.pdf")), [])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_least_recently_used_files_are_evicted(self):
+        """Sobre el límite de bytes se borran los PDF menos usados."""
+        other = Recipe.objects.create(name="Charquicán", preparation_time=40, creator=self.user)
+        self.client.get(self.url)
+        old_path = next(self.cache_dir.glob(f"{self.recipe.pk}-*.pdf"))
+        size = old_path.stat().st_size
+        os.utime(old_path, (1, 1))
+        with override_settings(RECIPE_PDF_CACHE_MAX_BYTES=size + 10):
+            self.client.get(reverse("recipe_pdf", args=[other.pk]))
+        self.assertFalse(old_path.exists())
+        self.assertEqual(len(list(self.cache_dir.glob(f"{other.pk}-*.pdf"))), 1)
+
+    def test_revalidation_and_misses_under_the_limit_skip_the_disk(self):
+        """Un 304 no toca el cache de disco y bajo el límite no se recorre el directorio."""
+        other = Recipe.objects.create(name="Charquicán", preparation_time=40, creator=self.user)
+        etag = self.client.get(self.url)["ETag"]
+        with mock.patch.object(pdf_cache, "get_or_build", side_effect=AssertionError):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch.object(pdf_cache, "evict", side_effect=AssertionError):
+            self.assertEqual(self.client.get(reverse("recipe_pdf", args=[other.pk])).status_code, 200)
+
+
+class RecipeReportFormatTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.recipe = Recipe.objects.create(name="Sopa <de> ajo", preparation_time=20, creator=self.user)
+        for n in range(3):
+            Ingredient.objects.create(recipe=self.recipe, name=f"{n + 1} dientes de ajo")
+        Step.objects.create(recipe=self.recipe, order=1, description="1-Dorar el ajo")
+        self.url = reverse("recipe_report", args=[self.recipe.pk])
+
+    def test_text_formats_skip_reportlab(self):
+        """Los formatos de texto no pasan por ReportLab."""
+        with mock.patch.object(PdfRecipeReportGenerator, "write", side_effect=AssertionError):
+            markdown = self.client.get(self.url, {"format": "markdown"})
+            html = self.client.get(self.url, {"format": "html"})
+            data = self.client.get(self.url, {"format": "json"}).json()
+        self.assertEqual(markdown["Content-Type"], "text/markdown; charset=utf-8")
+        self.assertIn("# Sopa <de> ajo", markdown.content.decode())
+        self.assertIn("1. Dorar el ajo", markdown.content.decode())
+        self.assertIn("<h1>Sopa &lt;de&gt; ajo</h1>", html.content.decode())
+        self.assertEqual(data["ingredients"], ["1 dientes de ajo", "2 dientes de ajo", "3 dientes de ajo"])
+        self.assertEqual(self.client.get(self.url, {"format": "docx"}).status_code, 400)
+
+    def test_accept_header_picks_the_format(self):
+        """Sin ?format=, el encabezado Accept elige el formato (406 si no hay ninguno)."""
+        response = self.client.get(self.url, HTTP_ACCEPT="text/html;q=0.5, text/plain")
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertIn("Accept", response["Vary"])
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT="*/*")["Content-Type"], "application/pdf")
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT="image/png").status_code, 406)
+
+    def test_query_count_does_not_depend_on_recipe_size(self):
+        """El reporte hace las mismas consultas con 2 o con 50 ingredientes."""
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {"format": "txt"})
+        for n in range(20):
+            Ingredient.objects.create(recipe=self.recipe, name=f"{n} papas")
+            Step.objects.create(recipe=self.recipe, order=n + 2, description="Revolver")
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {"format": "txt"})
+
+
+class CookbookExportTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        for name in ("Tortilla", "Charquicán", "Pastel de choclo"):
+            recipe = Recipe.objects.create(name=name, preparation_time=30, creator=self.user)
+            Ingredient.objects.create(recipe=recipe, name="2 papas")
+            Step.objects.create(recipe=recipe, order=1, description="1-Cocinar")
+        self.url = reverse("cookbook_export")
+
+    def download(self, params):
+        response = self.finish_report_job(self.client.get(self.url, params))
+        return io.BytesIO(b"".join(response.streaming_content))
+
+    def test_pdf_has_index_and_bookmarks(self):
+        """El recetario en PDF trae índice y un marcador por receta."""
+        reader = PdfReader(self.download({"source": "all", "format": "pdf"}))
+        self.assertEqual(len(reader.pages), 4)  # índice + una página por receta
+        self.assertEqual([item.title for item in reader.outline], ["Charquicán", "Pastel de choclo", "Tortilla"])
+        self.assertIn("Pastel de choclo", reader.pages[0].extract_text())
+
+    @override_settings(COOKBOOK_EXPORT_MAX_RECIPES=2)
+    def test_single_pdf_refuses_more_than_the_limit(self):
+        """El PDF único guarda todo en memoria: sobre el límite se niega."""
+        recipes = [RecipeData(id=n, name=f"Receta {n}") for n in range(3)]
+        with self.assertRaises(ValueError):
+            cookbook.write_pdf(recipes, io.BytesIO(), workers=1)
+        cookbook.write_pdf(recipes[:2], io.BytesIO(), workers=1)
+
+    def test_zip_from_search_and_favorites(self):
+        """El ZIP sale de una búsqueda o de los favoritos (con sesión)."""
+        archive = zipfile.ZipFile(self.download({"source": "search", "format": "zip", "q": "tortilla"}))
+        self.assertEqual(archive.namelist(), ["0001-tortilla.pdf"])
+        self.assertTrue(archive.read("0001-tortilla.pdf").startswith(b"%PDF"))
+
+        self.assertIn(reverse("login"), self.client.get(self.url, {"source": "favorites"})["Location"])
+        self.client.force_login(self.user)
+        FavoriteRecipe.objects.create(user=self.user, recipe=Recipe.objects.get(name="Charquicán"))
+        archive = zipfile.ZipFile(self.download({"source": "favorites", "format": "zip"}))
+        self.assertEqual(archive.namelist(), ["0001-charquican.pdf"])
+
+    async def test_downloads_stream_under_asgi(self):
+        """Bajo ASGI las exportaciones y las descargas salen por partes, sin juntarse en memoria."""
+        produced = []
+
+        def lines(recipes, export_format):
+            for n in range(3):
+                produced.append(n)
+                yield f"{n}\n"
+
+        with mock.patch.object(exporter, "iter_lines", lines):
+            response = await self.async_client.get(self.url, {"source": "all", "format": "ndjson"})
+            parts = aiter(response.streaming_content)
+            self.assertEqual(await anext(parts), b"0\n")
+            self.assertEqual(produced, [0])
+            self.assertEqual([part async for part in parts], [b"1\n", b"2\n"])
+
+        job = await sync_to_async(jobs.submit)(jobs.COOKBOOK, {"source": "all", "format": "zip"})
+        await sync_to_async(jobs.work)(once=True)
+        response = await self.async_client.get(reverse("report_job_download", args=[job.pk]))
+        self.assertTrue(response.is_async)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join([part async for part in response.streaming_content])))
+        self.assertEqual(len(archive.namelist()), 3)
+
+        recipe = await Recipe.objects.aget(name="Tortilla")
+        response = await self.async_client.get(reverse("recipe_pdf", args=[recipe.pk]))
+        self.assertTrue(response.is_async)
+        self.assertTrue(b"".join([part async for part in response.streaming_content]).startswith(b"%PDF"))
+
+    def test_data_formats_stream_in_chunks(self):
+        """CSV y NDJSON salen en streaming, con consultas por bloque y no por receta."""
+        response = self.client.get(self.url, {"source": "search", "format": "ndjson", "q": "tortilla"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{"id": Recipe.objects.get(name="Tortilla").pk, "name": "Tortilla", "preparation_time": 30.0,
+              "min_portion": None, "max_portion": None, "ingredients": ["2 papas"], "steps": ["1-Cocinar"]}],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            lines = list(exporter.iter_lines(Recipe.objects.order_by("id"), exporter.CSV, chunk_size=2))
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(len(queries), 1 + 2 * 2)  # recetas + (ingredientes, pasos) por bloque
+
+    def test_process_pool_keeps_order(self):
+        """Los PDF hechos en paralelo vuelven en el orden de las recetas."""
+        recipes = [RecipeData(id=i, name=f"Receta {i}", ingredients=("sal",), steps=("Mezclar",))
+                   for i in range(cookbook.PARALLEL_MIN_RECIPES)]
+        pdfs = cookbook.render_recipes(recipes, workers=2)
+        titles = [PdfReader(io.BytesIO(pdf)).pages[0].extract_text().splitlines()[0] for pdf in pdfs]
+        self.assertEqual(titles, [recipe.name for recipe in recipes])
+
+    def test_zip_is_produced_one_recipe_at_a_time(self):
+        """El ZIP se entrega por partes a medida que se dibuja cada receta."""
+        recipes = (RecipeData(id=i, name=f"Receta {i}") for i in range(3))
+        chunks = cookbook.iter_zip(recipes, workers=1)
+        first = next(chunks)
+        self.assertTrue(first.startswith(b"PK"))
+        self.assertIn(b"0001-receta-0.pdf", first)
+        self.assertNotIn(b"0002-receta-1.pdf", first)
+        archive = zipfile.ZipFile(io.BytesIO(first + b"".join(chunks)))
+        self.assertEqual(len(archive.namelist()), 3)
+
+
+class WrapTextTests(CocinaTestCase):
+    def width(self, line):
+        return pdfmetrics.stringWidth(line, "Helvetica", 12)
+
+    def test_lines_fit_and_keep_every_word(self):
+        """Cada línea cabe en el ancho y no se pierde ninguna palabra."""
+        text = "Picar la cebolla en cubos pequeños y sofreír en aceite de oliva " * 20
+        lines = wrap_text(text, 200)
+        self.assertTrue(all(self.width(line) <= 200 for line in lines))
+        self.assertEqual(" ".join(lines).split(), text.split())
+        # Cada línea es la más larga posible
+        for line, following in zip(lines, lines[1:]):
+            self.assertGreater(self.width(f"{line} {following.split()[0]}"), 200)
+
+    def test_paragraphs_and_long_words(self):
+        """Se respetan los párrafos y se cortan las palabras más largas que el ancho."""
+        self.assertEqual(wrap_text("Hervir.\n\nColar.", 200), ["Hervir.", "Colar."])
+        lines = wrap_text("ver https://cocina360.cl/" + "x" * 120 + " y agregar sal-de-mar-ahumada", 80)
+        self.assertTrue(all(self.width(line) <= 80 for line in lines))
+        self.assertEqual(lines[0], "ver")
+        self.assertIn("sal-de-mar-", lines)
+
+
+class JsonPdfTests(CocinaTestCase):
+    def setUp(self):
+        self.entry = JsonHistory.objects.create(content={
+            "receta": "Ajiaco santafereño",
+            "pasos": ["Cocinar la papa criolla " * 40] * 60,
+        })
+        self.url = reverse("descargar_json_pdf", args=[self.entry.pk])
+
+    def pdf_text(self, response):
+        reader = PdfReader(io.BytesIO(b"".join(response.streaming_content)))
+        return reader, "".join(page.extract_text() for page in reader.pages)
+
+    def test_reportlab_is_the_default_engine(self):
+        """Por defecto el PDF de un JSON se dibuja con ReportLab."""
+        response = self.finish_report_job(self.client.get(self.url))
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn(f"json_historial_{self.entry.pk}.pdf", response["Content-Disposition"])
+        reader, text = self.pdf_text(response)
+        # Las líneas largas se cortan y el contenido sigue en otras páginas
+        self.assertGreater(len(reader.pages), 1)
+        self.assertIn(f"Historial JSON #{self.entry.pk}", text)
+        self.assertIn("santafereño", text)
+
+    def test_xhtml2pdf_engine_and_invalid_engine(self):
+        """?engine=xhtml2pdf usa el motor anterior; un motor desconocido da 400."""
+        response = self.finish_report_job(self.client.get(self.url, {"engine": "xhtml2pdf"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        self.assertEqual(self.client.get(self.url, {"engine": "weasyprint"}).status_code, 400)
+
+
+class ReportJobTests(CocinaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.recipe = Recipe.objects.create(name="Tortilla", preparation_time=25, creator=self.user)
+        Ingredient.objects.create(recipe=self.recipe, name="3 huevos")
+
+    def submit(self, payload):
+        return self.client.post(reverse("report_job_submit"), payload, content_type="application/json")
+
+    def test_submit_returns_immediately_and_worker_delivers(self):
+        """El envío responde 202 sin generar nada; el worker deja el PDF para descargar."""
+        with mock.patch.object(PdfRecipeReportGenerator, "write") as write:
+            response = self.submit({"kind": "recipe_pdf", "recipe_id": self.recipe.pk})
+        write.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url).json()["status"], "pending")
+
+        self.assertEqual(jobs.work(once=True), 1)
+        state = self.client.get(status_url).json()
+        self.assertEqual(state["status"], "done")
+        download = self.client.get(state["download_url"])
+        self.assertEqual(download["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(download.streaming_content).startswith(b"%PDF"))
+
+    def test_invalid_and_failed_jobs(self):
+        """Un trabajo inválido da 400 y uno que falla queda marcado con su error."""
+        self.assertEqual(self.submit({"kind": "recipe_pdf", "recipe_id": 999}).status_code, 400)
+        self.assertEqual(self.submit({"kind": "video"}).status_code, 400)
+
+        job = jobs.submit(jobs.RECIPE_PDF, {"recipe_id": self.recipe.pk})
+        self.recipe.delete()
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        self.assertIn("DoesNotExist", job.error)
+
+    def test_jobs_are_private_and_claimed_once(self):
+        """Cada trabajo lo ve solo su dueño y lo toma un solo worker."""
+        self.client.force_login(self.user)
+        job_id = self.submit({"kind": "cookbook", "source": "favorites", "format": "zip"}).json()["id"]
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("report_job_status", args=[job_id])).status_code, 404)
+
+        self.assertEqual(str(jobs.claim_next().pk), job_id)
+        self.assertIsNone(jobs.claim_next())
+
+
+class ImportRecipesTests(CocinaTestCase):
+    HEADER = "recipe name,preparation time,min_portion,max_portion,ingredients,steps\n"
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.csv_dir = Path(tmp.name)
+        settings_override = override_settings(CSV_ARCHIVES_DIR=str(self.csv_dir))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username="cocinero", password="testpass123")
+
+    def write_csv(self, rows, name="recetas.csv"):
+        (self.csv_dir / name).write_text(self.HEADER + "".join(rows), encoding="utf-8")
+        return name
+
+    def run_import(self, name):
+        out = io.StringIO()
+        call_command("import_recipes", name, creator="cocinero", batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_import_fills_what_the_signals_would(self):
+        """bulk_create no dispara señales: la importación calcula lo mismo que ellas."""
+        name = self.write_csv([
+            "Ajiaco chileno,40.0,3,4,\"['300 grs de carne asada', '4 papas medianas']\",\"['1-Cortar la carne.', '2-Agregar el merkén.']\"\n",
+            ",10,,,\"[]\",\"[]\"\n",
+            "Sopaipillas,30,,,\"['1 taza de zapallo']\",\"['1-Freír.']\"\n",
+        ])
+        output = self.run_import(name)
+        self.assertIn("rows/s", output)
+        self.assertIn("Skipped 1 rows", output)
+
+        ajiaco = Recipe.objects.get(name="Ajiaco chileno")
+        self.assertEqual((ajiaco.creator, ajiaco.name_normalized), (self.user, "ajiaco chileno"))
+        carne = ajiaco.ingredients.get(position=0)
+        self.assertEqual((carne.quantity, carne.unit, carne.canonical.name), (300, "g", "carne asada"))
+        self.assertEqual([s.cleaned_description for s in ajiaco.steps.all()], ["Cortar la carne.", "Agregar el merkén."])
+        self.assertEqual(list(ajiaco.steps.values_list("position", flat=True)), [0, 1])
+        self.assertEqual(search.search_recipe_ids("merken"), [ajiaco.pk])
+
+    def test_list_cells_with_quotes_and_commas(self):
+        """Las celdas de lista respetan comillas y comas dentro de cada elemento."""
+        self.assertEqual(
+            parse_list("""['Sal, pimienta a gusto', "2 cdas de vino 'reserva'", '1/2 taza']"""),
+            ["Sal, pimienta a gusto", "2 cdas de vino 'reserva'", "1/2 taza"],
+        )
+        # No es un literal válido: se lee igual respetando las comillas
+        self.assertEqual(parse_list("['Hervir, colar', 'Servir d'inmediato']"), ["Hervir, colar", "Servir d'inmediato"])
+        self.assertEqual(parse_list("[]"), [])
+        self.assertEqual(parse_list("Merkén"), ["Merkén"])
+
+    def test_parallel_parsing_keeps_row_order(self):
+        """Con varios procesos las recetas se crean en el orden del archivo."""
+        rows = [f"Receta {n:02d},10,,,\"['{n} huevos', \"\"Sal, a gusto\"\"]\",\"['1-Batir.']\"\n" for n in range(12)]
+        name = self.write_csv(rows)
+        with mock.patch.object(importer, "PARALLEL_MIN_CHUNKS", 2):
+            call_command("import_recipes", name, creator="cocinero", batch_size=3, workers=2, stdout=io.StringIO())
+        self.assertEqual(
+            list(Recipe.objects.order_by("id").values_list("name", flat=True)), [f"Receta {n:02d}" for n in range(12)]
+        )
+        self.assertEqual(Ingredient.objects.filter(name="Sal, a gusto").count(), 12)
+
+    def test_reimport_updates_without_duplicating(self):
+        """Reimportar actualiza la receta y deja solo los ingredientes de su fila."""
+        row = "Sopaipillas,{time},,,\"['1 taza de zapallo', '{extra}']\",\"['1-Freír.']\"\n"
+        self.run_import(self.write_csv([row.format(time=30, extra="2 tazas de harina")]))
+        self.run_import(self.write_csv([row.format(time=45, extra="Manteca")]))
+
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.preparation_time, 45)
+        self.assertEqual(
+            list(recipe.ingredients.order_by("position").values_list("name", "position")),
+            [("1 taza de zapallo", 0), ("Manteca", 2)],
+        )
+        self.assertEqual(recipe.steps.count(), 1)
+
+    def test_unchanged_rows_are_skipped_and_changed_rows_diffed(self):
+        """Las filas sin cambios no escriben nada; las cambiadas conservan los pasos que siguen."""
+        row = "Sopaipillas,30,,,\"['1 taza de zapallo']\",\"[{steps}]\"\n"
+        name = self.write_csv([row.format(steps="'1-Amasar.', '2-Freír.', '3-Servir.'")])
+        self.run_import(name)
+        recipe = Recipe.objects.get()
+        amasar = recipe.steps.get(description="1-Amasar.")
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run_import(name)
+        self.assertIn("0 updated, 1 unchanged", output)
+        writes = [q["sql"] for q in queries if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertFalse([sql for sql in writes if "importcheckpoint" not in sql])
+
+        self.run_import(self.write_csv([row.format(steps="'2-Freír.', '1-Amasar.', '4-Espolvorear azúcar.'")]))
+        self.assertEqual(
+            list(recipe.steps.order_by("order").values_list("description", "order")),
+            [("2-Freír.", 1), ("1-Amasar.", 2), ("4-Espolvorear azúcar.", 3)],
+        )
+        self.assertEqual(recipe.steps.get(description="1-Amasar.").pk, amasar.pk)
+
+    def test_export_round_trips_through_import(self):
+        """Exportar e importar de vuelta deja todas las recetas sin cambios."""
+        self.run_import(self.write_csv([
+            "Ajiaco chileno,40.0,3,4,\"['300 grs de carne asada', \"\"Sal, a gusto\"\"]\",\"['1-Cortar la carne.', \"\"2-Agregar l'aliño.\"\"]\"\n",
+            "Sopaipillas,30,,,\"['1 taza de zapallo']\",\"['1-Freír.']\"\n",
+        ]))
+        out = io.StringIO()
+        call_command("export_recipes", "catalogo.csv", stdout=out)
+        self.assertIn("Exported 2 recipes as csv", out.getvalue())
+        self.assertFalse((self.csv_dir / "catalogo.csv.partial").exists())
+
+        self.assertIn("0 recipes created, 0 updated, 2 unchanged", self.run_import("catalogo.csv"))
+        ajiaco = Recipe.objects.get(name="Ajiaco chileno")
+        self.assertEqual(list(ajiaco.steps.values_list("description", flat=True)), ["1-Cortar la carne.", "2-Agregar l'aliño."])
+
+    def test_query_count_grows_with_batches_not_rows(self):
+        """Las consultas dependen del número de lotes, no de filas."""
+        rows = [f"Receta {n},10,,,\"['{n} huevos', 'Sal']\",\"['1-Batir.', '2-Servir.']\"\n" for n in range(40)]
+        name = self.write_csv(rows)
+        with CaptureQueriesContext(connection) as queries:
+            call_command("import_recipes", name, creator="cocinero", batch_size=20, stdout=io.StringIO())
+        self.assertEqual(Step.objects.count(), 80)
+        self.assertLess(len(queries), 60)
+
+    def test_interrupted_import_resumes_after_the_last_batch(self):
+        """Una importación interrumpida continúa después del último lote confirmado."""
+        rows = [f"Receta {n},10,,,\"['{n} huevos']\",\"['1-Batir\nbien.']\"\n" for n in range(7)]
+        name = self.write_csv(rows)
+        import_batch = importer._import_batch
+        calls = []
+
+        def failing_batch(*args):
+            calls.append(1)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return import_batch(*args)
+
+        with mock.patch.object(importer, "_import_batch", side_effect=failing_batch):
+            with self.assertRaisesMessage(CommandError, "run the same command again"):
+                self.run_import(name)
+        self.assertEqual(Recipe.objects.count(), 4)
+        self.assertEqual(ImportCheckpoint.objects.get().rows, 4)
+
+        output = self.run_import(name)
+        self.assertIn("Resumed after 4 rows", output)
+        self.assertEqual(sorted(Recipe.objects.values_list("name", flat=True)), [f"Receta {n}" for n in range(7)])
+        self.assertEqual(Step.objects.filter(description="1-Batir\nbien.").count(), 7)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+
+class SubstitutionCacheTests(CocinaTestCase):
+    ANSWER = {"viable": "si", "explicacion": "Usa 3/4 de la cantidad.", "proporcion": "3:4",
+              "ajustes": "", "riesgos": "", "confianza": 0.8}
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(ai_assistant, "_ask_model", return_value=self.ANSWER)
+        self.ask_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_questions_skip_the_model(self):
+        """Una pregunta repetida (aunque cambien tildes o mayúsculas) no vuelve a llamar a la IA."""
+        self.assertEqual(ai_assistant.suggest_substitution("Mantequilla", "aceite", "Queque", "Horno 180°"), self.ANSWER)
+        self.assertEqual(ai_assistant.suggest_substitution(" mantequilla", "Aceite", "Queque", "Horno 180°"), self.ANSWER)
+        cache.clear()  # desde aquí sale de la base de datos (y los contadores parten de cero)
+        self.assertEqual(ai_assistant.suggest_substitution("mantequilla", "aceite", "Queque", "Horno 180°"), self.ANSWER)
+        self.assertEqual(self.ask_model.call_count, 1)
+
+        # Otra receta es otra pregunta
+        ai_assistant.suggest_substitution("mantequilla", "aceite", "Queque", "Horno 200°")
+        self.assertEqual(self.ask_model.call_count, 2)
+        self.assertEqual(substitution_cache.stats(), {"hits": 1, "misses": 1, "stale": 0, "entries": 2})
+
+        # Los contadores no vencen aunque pase el timeout por defecto del cache
+        an_hour_later = time.time() + 3600
+        with mock.patch("django.core.cache.backends.filebased.time.time", return_value=an_hour_later):
+            self.assertEqual(substitution_cache.stats()["hits"], 1)
+
+    @override_settings(SUBSTITUTION_CACHE_TTL=60)
+    def test_stale_answer_when_the_model_fails(self):
+        """Si la IA falla se responde con la respuesta vencida, salvo que esté desactivado."""
+        ai_assistant.suggest_substitution("huevo", "linaza")
+        SubstitutionAnswer.objects.update(answered_at=timezone.now() - timedelta(minutes=5))
+        cache.clear()
+        self.ask_model.side_effect = ai_assistant.AIUnavailable("caído")
+
+        self.assertEqual(ai_assistant.suggest_substitution("huevo", "linaza"), self.ANSWER)
+        self.assertEqual(substitution_cache.stats()["stale"], 1)
+        with override_settings(SUBSTITUTION_CACHE_SERVE_STALE=False):
+            self.assertEqual(ai_assistant.suggest_substitution("huevo", "linaza")["viable"], "no disponible")
+        self.assertEqual(self.ask_model.call_count, 3)
+
+    @override_settings(SUBSTITUTION_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_answers_are_evicted(self):
+        """Sobre el máximo se borran las respuestas usadas hace más tiempo."""
+        for substitute in ("aceite", "margarina"):
+            ai_assistant.suggest_substitution("mantequilla", substitute)
+        SubstitutionAnswer.objects.filter(substitute="aceite").update(last_used_at=timezone.now() + timedelta(minutes=1))
+        ai_assistant.suggest_substitution("mantequilla", "ghee")
+        self.assertEqual(
+            sorted(SubstitutionAnswer.objects.values_list("substitute", flat=True)), ["aceite", "ghee"]
+        )
+
+
+class RecipeChatStreamTests(CocinaTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="cocinero", password="testpass123")
+        self.recipe = Recipe.objects.create(name="Charquicán", preparation_time=40, creator=user)
+        self.url = reverse("recipe_chat_stream")
+        self.body = json.dumps({"message": "¿Sin zapallo?", "recipe_id": self.recipe.pk})
+
+    async def events(self, response):
+        content = "".join([part.decode() async for part in response.streaming_content])
+        return [
+            (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in content.strip().split("\n\n")
+        ]
+
+    async def test_streams_tokens_then_the_full_reply(self):
+        """Los tokens llegan como eventos y al final la respuesta completa."""
+        async def fake_reply(prompt):
+            self.assertIn("Charquicán", prompt)
+            for delta in ("Sí, ", "usa ", "camote."):
+                yield delta
+
+        with mock.patch.object(ai_client, "configured", return_value=True), \
+                mock.patch.object(ai_client, "stream", fake_reply):
+            response = await self.async_client.post(self.url, self.body, content_type="application/json")
+            self.assertEqual(response["Content-Type"], "text/event-stream; charset=utf-8")
+            events = await self.events(response)
+        self.assertEqual(events, [
+            ("token", {"delta": "Sí, "}), ("token", {"delta": "usa "}), ("token", {"delta": "camote."}),
+            ("done", {"reply": "Sí, usa camote."}),
+        ])
+
+        with mock.patch.dict(os.environ, {"OPENAI_API_KEY": ""}):
+            response = await self.async_client.post(self.url, self.body, content_type="application/json")
+            self.assertIn("Modo sin IA", (await self.events(response))[-1][1]["reply"])
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 405)
+        missing = json.dumps({"message": "hola", "recipe_id": self.recipe.pk + 1})
+        self.assertEqual((await self.async_client.post(self.url, missing, content_type="application/json")).status_code, 404)
+
+    async def test_client_disconnect_closes_the_upstream_stream(self):
+        """Si el navegador se desconecta se cierra el stream de la IA."""
+        from cocina360.asgi import DisconnectCancellingASGIHandler
+
+        closed = asyncio.Event()
+        disconnected = asyncio.Event()
+        sent = []
+
+        async def endless_reply(prompt):
+            try:
+                while True:
+                    yield "bla "
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+
+        requests = [{"type": "http.request", "body": self.body.encode(), "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if b"event: token" in message.get("body", b""):
+                disconnected.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": self.url, "raw_path": self.url.encode(), "query_string": b"",
+            "root_path": "", "headers": [(b"content-type", b"application/json")],
+            "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+        }
+        # Como el cliente de pruebas: que las señales no cierren la conexión de la transacción del test
+        signals.request_started.disconnect(close_old_connections)
+        signals.request_finished.disconnect(close_old_connections)
+        self.addCleanup(signals.request_started.connect, close_old_connections)
+        self.addCleanup(signals.request_finished.connect, close_old_connections)
+        with mock.patch.object(ai_client, "configured", return_value=True), \
+                mock.patch.object(ai_client, "stream", endless_reply):
+            await asyncio.wait_for(DisconnectCancellingASGIHandler()(scope, receive, send), timeout=5)
+        self.assertTrue(closed.is_set())
+        self.assertEqual(sent[0]["status"], 200)
+
+
+class StubAIHandler(BaseHTTPRequestHandler):
+    """
+    Responde como /v1/chat/completions según el guion del servidor: (estado,
+    texto, demora). Con "stream" envía el texto palabra por palabra, con la
+    demora antes de cada una.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status, text, delay = self.server.script.pop(0) if self.server.script else (200, "Sí.", 0)
+        self.server.connections.append(self.client_address)
+        if status == 200 and request.get("stream"):
+            self.stream_words(text, delay)
+            return
+        time.sleep(delay)
+        if status == 200:
+            payload = {"id": "stub", "object": "chat.completion", "created": 0, "model": ai_client.MODEL,
+                       "choices": [{"index": 0, "finish_reason": "stop",
+                                    "message": {"role": "assistant", "content": text}}]}
+        else:
+            payload = {"error": {"message": text, "type": "server_error"}}
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_words(self, text, delay):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = [{"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": ai_client.MODEL,
+                   "choices": [{"index": 0, "finish_reason": None, "delta": {"content": word}}]}
+                  for word in text.split(" ")]
+        for event in [f"data: {json.dumps(chunk)}" for chunk in chunks] + ["data: [DONE]"]:
+            time.sleep(delay)
+            data = f"{event}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class AIClientTests(CocinaTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubAIHandler)
+        cls.server.daemon_threads = True
+        cls.server.handle_error = lambda request, address: None  # clientes que se fueron por el plazo
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.server.script = []
+        self.server.connections = []
+        ai_client.breaker.reset()
+        self.addCleanup(ai_client.breaker.reset)
+        settings_override = override_settings(
+            AI_BASE_URL=f"http://127.0.0.1:{self.server.server_address[1]}/v1", AI_RETRY_BACKOFF=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        env = mock.patch.dict(os.environ, {"OPENAI_API_KEY": "sk-prueba"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_transient_errors_are_retried_on_a_reused_connection(self):
+        """Los 5xx se reintentan sobre la misma conexión; un 400 no."""
+        self.server.script = [(503, "ocupado", 0), (200, "Usa aceite, 3/4 de la cantidad.", 0)]
+        self.assertEqual(ai_client.complete("¿Mantequilla por aceite?"), "Usa aceite, 3/4 de la cantidad.")
+        self.assertEqual(ai_client.complete("¿Y margarina?"), "Sí.")
+        self.assertEqual(len(self.server.connections), 3)
+        self.assertEqual(len(set(self.server.connections)), 1)
+
+        self.server.script = [(400, "pregunta inválida", 0)]
+        with self.assertRaises(ai_client.AIUnavailable):
+            ai_client.complete("?")
+        self.assertEqual(len(self.server.connections), 4)  # un 400 no se reintenta
+
+    @override_settings(AI_TIMEOUT=0.3, AI_MAX_RETRIES=1, AI_CIRCUIT_FAILURES=2)
+    def test_deadline_and_circuit_breaker(self):
+        """Una IA lenta corta por plazo y, tras varios fallos, el circuito responde sin llamarla."""
+        self.server.script = [(200, "tarde", 2)] * 4
+        started = time.monotonic()
+        for _ in range(2):
+            with self.assertRaises(ai_client.AIUnavailable):
+                ai_client.complete("¿Huevo por linaza?")
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(ai_client.breaker.state, "open")
+
+        # Con el circuito abierto no se llama a la IA: se responde "no disponible"
+        calls = len(self.server.connections)
+        answer = ai_assistant.suggest_substitution("huevo", "linaza")
+        self.assertEqual(answer["viable"], "no disponible")
+        self.assertIn("demasiados errores", answer["explicacion"])
+        self.assertEqual(len(self.server.connections), calls)
+
+        # Pasado AI_CIRCUIT_RESET, una llamada de prueba que funciona lo cierra
+        self.server.script = []
+        with mock.patch.object(ai_client.breaker, "clock", lambda: time.monotonic() + 60):
+            self.assertEqual(ai_client.breaker.state, "half-open")
+            self.assertEqual(ai_client.complete("¿Huevo por linaza?"), "Sí.")
+        self.assertEqual(ai_client.breaker.state, "closed")
+
+    @override_settings(AI_TIMEOUT=0.5)
+    async def test_stream_deadline_covers_the_tokens(self):
+        """El plazo de AI_TIMEOUT sigue corriendo después del primer token."""
+        self.server.script = [(200, "uno dos tres cuatro", 0.3)]
+        parts = []
+        started = time.monotonic()
+        with self.assertRaises(ai_client.AIUnavailable):
+            async for delta in ai_client.stream("¿Zapallo por camote?"):
+                parts.append(delta)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(parts, ["uno"])
+
+    @override_settings(AI_CIRCUIT_FAILURES=1)
+    async def test_cancelled_trial_call_frees_the_circuit(self):
+        """Cancelar la llamada de prueba (semiabierto) deja pasar la siguiente."""
+        ai_client.breaker.record_failure()
+        self.server.script = [(503, "ocupado", 2)]  # se cancela antes de que responda
+        with mock.patch.object(ai_client.breaker, "clock", lambda: time.monotonic() + 60):
+            self.assertEqual(ai_client.breaker.state, "half-open")
+            task = asyncio.ensure_future(anext(ai_client.stream("¿Zapallo por camote?")))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(ai_client.breaker.state, "half-open")
+            self.assertEqual(await anext(ai_client.stream("¿Zapallo por camote?")), "Sí.")
+        self.assertEqual(ai_client.breaker.state, "closed")
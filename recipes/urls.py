@@ -8,6 +8,7 @@ urlpatterns = [
     path('recipe/<int:pk>/', views.recipe_detail, name='recipe_detail'),  
     path('<int:recipe_pk>/ingredient/<int:ingredient_pk>/toggle/', views.toggle_ingredient_completion, name='toggle_ingredient_completion'),  
     path('<int:recipe_pk>/step/<int:step_pk>/toggle/', views.toggle_step_completion, name='toggle_step_completion'), 
+    path('api/recipes/<int:pk>/progress/', views.recipe_progress_api, name='recipe_progress_api'),
 
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),  
     path('admin/recipe/create/', views.admin_recipe_create, name='admin_recipe_create'), 
@@ -22,6 +23,8 @@ urlpatterns = [
     path('recipes/new/', views.recipe_create, name='recipe_create'),
 
     path('api/recipe_chat/', views.recipe_chat, name='recipe_chat'),
+    path('api/recipe_chat/stream/', views.recipe_chat_stream, name='recipe_chat_stream'),
+    path('api/pantry_search/', views.pantry_search, name='pantry_search'),
 
     path("enviar-receta/", views.enviar_receta, name="enviar_receta"),
     path("historial-json/", views.ver_historial, name="ver_historial_json"),
@@ -29,5 +32,11 @@ urlpatterns = [
     path("json/<int:id>/", views.mostrar_json_pdf, name='mostrar_json_pdf'),
     path('json/<int:id>/pdf/', views.descargar_json_pdf, name='descargar_json_pdf'),
     path("recipes/<int:pk>/pdf/", views.recipe_pdf, name="recipe_pdf"),
+    path("recipes/<int:pk>/report/", views.recipe_report, name="recipe_report"),
+    path("recipes/export/", views.cookbook_export, name="cookbook_export"),
+    path("api/reports/", views.report_job_submit, name="report_job_submit"),
+    path("api/reports/<uuid:job_id>/", views.report_job_status, name="report_job_status"),
+    path("api/reports/<uuid:job_id>/download/", views.report_job_download, name="report_job_download"),
+    path("reports/<uuid:job_id>/", views.report_job_page, name="report_job_page"),
    ]
 
@@ -1,17 +1,16 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Recipe, Ingredient, Step, UserIngredientCompletion, UserStepCompletion, FavoriteRecipe
+from .models import Recipe, Ingredient, Step, FavoriteRecipe, ReportJob
 from django.contrib.auth.models import User 
 from django.contrib.auth import login, logout
 from django.views.decorators.http import require_POST
 from .forms import RegisterForm, RecipeForm, IngredientFormSet, StepFormSet
 from django.contrib.auth.decorators import login_required
 from django.forms import modelformset_factory
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponseBadRequest, FileResponse, HttpResponse
+from django.http import HttpResponseForbidden, JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed, FileResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.db.models import Q
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
 from .models import Recipe, Ingredient, Step, JsonHistory 
-from openai import OpenAI
 from .ai_assistant import suggest_substitution
 from .forms import RecipeForm
 from django.http import HttpResponseForbidden
@@ -22,149 +21,236 @@ from reportlab.pdfgen import canvas
 from django.http import HttpResponse
 from django.template.loader import render_to_string
 from django.urls import reverse
-from xhtml2pdf import pisa
 from django.conf import settings
-from io import BytesIO
 from django.template.loader import render_to_string
-from .report_generators import PdfRecipeReportGenerator, RecipeReportService
-
+from .report_generators import RecipeReportService
+from .search import filter_recipes
+from .caching import cached_count, get_version, recipe_version_name
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from .pagination import keyset_paginate, offset_paginate
+from . import ai_client, chat, cookbook, exporter, jobs, json_reports, pantry, pdf_cache, progress, reports
+from django.contrib.auth.views import redirect_to_login
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+# Órdenes estables disponibles para la lista (el último campo es único)
+RECIPE_ORDERINGS = {
+    "name": ("name", "id"),
+    "time": ("preparation_time", "id"),
+}
+
+def _page_query(request, cursor=None):
+    """Querystring actual apuntando al cursor dado (o a la primera página)."""
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    if cursor:
+        params["cursor"] = cursor
+    return params.urlencode()
 
 def recipe_list(request):
+    sort = request.GET.get("sort", "name")
+    if sort not in RECIPE_ORDERINGS:
+        sort = "name"
+    cursor = request.GET.get("cursor", "")
+
     query = request.GET.get("q", "")  # lo que viene del buscador superior
     ingredient_query = request.GET.get("ingredient", "")
     max_time = request.GET.get("max_time", "")
 
-    recipes = Recipe.objects.all()
-
-    # BUSCAR POR NOMBRE
+    # Ingrediente y tiempo, más búsqueda en nombre, ingredientes y pasos
+    # (índice FTS5, ordenado por relevancia)
+    recipes = filter_recipes(Recipe.objects.all(), query, ingredient_query, max_time)
     if query:
-        recipes = recipes.filter(name__icontains=query)
-
-    # Filtrar por ingrediente
-    if ingredient_query:
-        recipes = recipes.filter(ingredients__name__icontains=ingredient_query)
-
-    # Filtrar por tiempo
-    if max_time:
-        recipes = recipes.filter(preparation_time__lte=max_time)
+        page = offset_paginate(recipes, cursor)
+    else:
+        page = keyset_paginate(recipes, RECIPE_ORDERINGS[sort], cursor)
 
-    recipes = recipes.distinct()
+    # Total en cache: se invalida cuando cambia el catálogo
+    total = cached_count(recipes, "catalog", query, ingredient_query, max_time)
 
     return render(request, "recipes/recipe_list.html", {
-        "recipes": recipes,
+        "recipes": page.items,
+        "page": page,
+        "next_page_query": _page_query(request, page.next_cursor) if page.has_next else "",
+        "first_page_query": _page_query(request),
+        "total": total,
+        "sort": sort,
         "ingredient_query": ingredient_query,
         "max_time": max_time,
         "query": query,
     })
 
-def recipe_detail(request, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
+def pantry_search(request):
+    """
+    "Cocinar con lo que tengo": recetas ordenadas por cobertura de la despensa.
 
-    # Usuario autenticado o fallback temporal
-    if request.user.is_authenticated:
-        current_user = request.user
-    else:
-        try:
-            current_user = User.objects.first()
-            if not current_user:
-                current_user = User.objects.create_user(username='guest_tester', password='password123')
-                print("Created a temporary guest_tester user for anonymous access.")
-        except Exception as e:
-            print(f"Could not get or create a user for anonymous access: {e}")
-            return render(request, 'recipes/error.html', {'message': 'User context missing for anonymous access.'})
+    Recibe GET:
+      ?items=papa,cebolla,huevo  (o varios ?item=...)
+      &max_missing=2             (opcional, ingredientes que pueden faltar)
+      &limit=20                  (opcional)
 
-    # --------------------------
-    # INGREDIENTES COMPLETADOS
-    # --------------------------
-    ingredients_with_status = []
-    for ingredient in recipe.ingredients.all():
-        completion, created = UserIngredientCompletion.objects.get_or_create(
-            user=current_user, ingredient=ingredient
-        )
-        ingredients_with_status.append({
-            'ingredient': ingredient,
-            'completed': completion.completed
-        })
+    Responde JSON:
+      { "results": [ { "id", "name", "url", "matched", "total", "missing" } ] }
+    """
+    items = request.GET.getlist("item")
+    for value in request.GET.getlist("items"):
+        items.extend(value.split(","))
+    items = [item.strip() for item in items if item.strip()]
+    if not items:
+        return HttpResponseBadRequest("Falta 'items' con los ingredientes disponibles")
 
-    # --------------------------
-    # PASOS COMPLETADOS + LIMPIEZA DE "1-" "2-" etc.
-    # --------------------------
-    steps_with_status = []
-    for step in recipe.steps.all():
-        completion, created = UserStepCompletion.objects.get_or_create(
-            user=current_user, step=step
-        )
+    try:
+        max_missing = request.GET.get("max_missing")
+        max_missing = int(max_missing) if max_missing not in (None, "") else None
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 100)
+    except ValueError:
+        return HttpResponseBadRequest("'max_missing' y 'limit' deben ser números")
+
+    ranked = pantry.get_index().search(items, max_missing=max_missing, limit=limit)
+    names = dict(Recipe.objects.filter(pk__in=[r[0] for r in ranked]).values_list("id", "name"))
+
+    results = [
+        {
+            "id": recipe_id,
+            "name": names[recipe_id],
+            "url": reverse("recipe_detail", args=[recipe_id]),
+            "matched": matched,
+            "total": total,
+            "missing": total - matched,
+        }
+        for recipe_id, matched, total in ranked
+        if recipe_id in names
+    ]
+    return JsonResponse({"items": items, "results": results})
 
-        # --- MODIFICACIÓN CLAVE ---
-        # Elimina el patrón "X-" al inicio de la descripción
-        cleaned_description = re.sub(r'^\d+-\s*', '', step.description)
+def recipe_detail(request, pk):
+    recipe = get_object_or_404(Recipe, pk=pk)
 
-        steps_with_status.append({
-            'step': step,
-            'completed': completion.completed,
-            'cleaned_description': cleaned_description
-        })
+    # --------------------------
+    # ESTADO DE COMPLETADO: una sola fila con los bits de ingredientes y
+    # pasos (ver recipes.progress). Si no hay fila nada está completado.
+    # Los anónimos lo llevan en una cookie firmada, sin tocar la base.
+    # --------------------------
+    store = progress.get_store(request)
+    ingredients_done, steps_done = store.load(recipe)
+
+    # Se envía como máscaras en hexadecimal; el JS de la plantilla marca las
+    # casillas según su data-position, así el HTML de ingredientes y pasos
+    # es igual para todos y se guarda en cache (ver recipe_version).
+    progress_state = {
+        progress.INGREDIENTS: format(ingredients_done, 'x'),
+        progress.STEPS: format(steps_done, 'x'),
+    }
 
     # --------------------------
     # FAVORITOS PARA PINTAR EL CORAZÓN
     # --------------------------
     if request.user.is_authenticated:
         favorite_recipe_ids = FavoriteRecipe.objects.filter(
-            user=request.user
-        ).values_list('recipe__pk', flat=True)
+            user=request.user, recipe=recipe
+        ).values_list('recipe_id', flat=True)
     else:
         favorite_recipe_ids = []
 
     # --------------------------
     # RENDER
     # --------------------------
-    return render(request, 'recipes/recipe_detail.html', {
+    # Los ingredientes y pasos se leen desde la plantilla solo si el
+    # fragmento no está en cache para la versión actual de la receta.
+    response = render(request, 'recipes/recipe_detail.html', {
         'recipe': recipe,
-        'ingredients_with_status': ingredients_with_status,
-        'steps_with_status': steps_with_status,
+        'recipe_version': get_version(recipe_version_name(recipe.pk)),
+        'fragment_timeout': getattr(settings, 'RECIPE_DETAIL_CACHE_TIMEOUT', 300),
+        'progress_state': progress_state,
         'user_is_authenticated': request.user.is_authenticated,
         'favorite_recipe_ids': favorite_recipe_ids,
     })
+    return store.apply(response)
 
 def toggle_ingredient_completion(request, recipe_pk, ingredient_pk):
+    response = redirect('recipe_detail', pk=recipe_pk)
     if request.method == 'POST':
-
-        if request.user.is_authenticated:
-            current_user = request.user
-        else:
-            current_user = User.objects.first()
-            if not current_user:
- 
-                return redirect('recipe_list') 
-
-
-        ingredient = get_object_or_404(Ingredient, pk=ingredient_pk)
-        completion, created = UserIngredientCompletion.objects.get_or_create(
-            user=current_user, ingredient=ingredient 
-        )
-        completion.completed = not completion.completed
-        completion.save()
-    return redirect('recipe_detail', pk=recipe_pk)
+        ingredient = get_object_or_404(Ingredient, pk=ingredient_pk, recipe_id=recipe_pk)
+        store = progress.get_store(request)
+        store.update(recipe_pk, [(progress.INGREDIENTS, ingredient.position, None)])
+        store.apply(response)
+    return response
 
 def toggle_step_completion(request, recipe_pk, step_pk):
+    response = redirect('recipe_detail', pk=recipe_pk)
     if request.method == 'POST':
- 
-        if request.user.is_authenticated:
-            current_user = request.user
-        else:
-            current_user = User.objects.first() 
-            if not current_user:
+        step = get_object_or_404(Step, pk=step_pk, recipe_id=recipe_pk)
+        store = progress.get_store(request)
+        store.update(recipe_pk, [(progress.STEPS, step.position, None)])
+        store.apply(response)
+    return response
 
-                return redirect('recipe_list') 
+def _parse_progress_changes(value):
+    """
+    Acepta una lista de ids (se invierten) o un objeto {id: true/false}
+    (se fija ese estado). Devuelve {id: estado o None}.
+    """
+    if value is None:
+        return {}
+    if isinstance(value, list):
+        return {int(pk): None for pk in value}
+    if isinstance(value, dict):
+        changes = {}
+        for pk, done in value.items():
+            if not isinstance(done, bool):
+                raise ValueError(done)
+            changes[int(pk)] = done
+        return changes
+    raise ValueError(value)
 
+@require_POST
+def recipe_progress_api(request, pk):
+    """
+    Marca o desmarca varios ingredientes y pasos en una sola petición.
 
-        step = get_object_or_404(Step, pk=step_pk)
-        completion, created = UserStepCompletion.objects.get_or_create(
-            user=current_user, step=step
-        )
-        completion.completed = not completion.completed
-        completion.save()
-    return redirect('recipe_detail', pk=recipe_pk)
+    Espera JSON:
+      { "ingredients": {"12": true, "13": false}, "steps": [40, 41] }
+    (un objeto fija el estado; una lista de ids lo invierte)
+
+    Responde JSON con el nuevo estado de lo que cambió:
+      { "recipe_id": 1, "ingredients": {"12": true, "13": false}, "steps": {...} }
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        ingredient_changes = _parse_progress_changes(data.get("ingredients"))
+        step_changes = _parse_progress_changes(data.get("steps"))
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError, TypeError, ValueError):
+        return HttpResponseBadRequest("JSON inválido")
+
+    recipe = get_object_or_404(Recipe, pk=pk)
+    store = progress.get_store(request)
+
+    positions = {}
+    for kind, model, requested in (
+        (progress.INGREDIENTS, Ingredient, ingredient_changes),
+        (progress.STEPS, Step, step_changes),
+    ):
+        if not requested:
+            continue
+        found = dict(model.objects.filter(recipe=recipe, pk__in=requested).values_list("pk", "position"))
+        missing = set(requested) - set(found)
+        if missing:
+            return HttpResponseBadRequest(f"Ids que no pertenecen a la receta: {sorted(missing)}")
+        positions[kind] = found
+
+    changes = [
+        (kind, positions[kind][item_pk], done)
+        for kind, requested in ((progress.INGREDIENTS, ingredient_changes), (progress.STEPS, step_changes))
+        for item_pk, done in requested.items()
+    ]
+    results = iter(store.update(recipe.pk, changes))
+
+    response = {"recipe_id": recipe.pk, "ingredients": {}, "steps": {}}
+    for kind, requested in ((progress.INGREDIENTS, ingredient_changes), (progress.STEPS, step_changes)):
+        for item_pk in requested:
+            response[kind][str(item_pk)] = next(results)
+    return store.apply(JsonResponse(response))
 
 # User Registration
 def register(request):
@@ -226,7 +312,17 @@ def recipe_delete(request, pk):
 @login_required
 def favorite_list(request):
     favorites = FavoriteRecipe.objects.filter(user=request.user).select_related('recipe')
-    return render(request, 'recipes/favorite_list.html', {'favorites': favorites})
+    total = cached_count(favorites, f"favorites:{request.user.pk}")
+    # Los más recientes primero: el índice de user_id ya los entrega en ese
+    # orden, así cada página lee solo sus filas (ordenar por el nombre de la
+    # receta obligaría a ordenar todos los favoritos del usuario)
+    page = keyset_paginate(favorites, ("-id",), request.GET.get("cursor", ""))
+    return render(request, 'recipes/favorite_list.html', {
+        'favorites': page.items,
+        'page': page,
+        'next_page_query': _page_query(request, page.next_cursor) if page.has_next else "",
+        'total': total,
+    })
 
 # Toggle Favorite
 @login_required
@@ -299,50 +395,12 @@ def recipe_delete(request, pk):
 
 # Generate Recipe PDF
 def generate_recipe_pdf(request, id):
-    # Obtener la receta por id
-    recipe = Recipe.objects.get(id=id)
-    
-    # Crear un archivo PDF
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="{recipe.name}_recipe.pdf"'
-
-    # Crear el canvas de reporte
-    p = canvas.Canvas(response, pagesize=letter)
-    
-    # Añadir texto al PDF
-    p.drawString(100, 750, f"Receta: {recipe.name}")
-    p.drawString(100, 730, "Ingredientes:")
-    
-    # Mostrar los ingredientes
-    y_position = 710
-    for ingredient in recipe.ingredients.all():
-        p.drawString(100, y_position, f"- {ingredient.name}")
-        y_position -= 20  # Baja para el siguiente ingrediente
-    
-    p.drawString(100, y_position - 20, "Instrucciones:")
-    
-    # Mostrar los pasos de la receta
-    y_position -= 40
-    for step in recipe.steps.all():
-        p.drawString(100, y_position, f"{step.order}. {step.description}")
-        y_position -= 20
-    
-    p.showPage()  # Finaliza la página
-    p.save()  # Guarda el PDF
-
-    return response
+    # Mismo PDF que recipe_pdf, pero para verlo en el navegador
+    return _recipe_report_response(request, id, reports.PDF, as_attachment=False)
 
 # En recipes/views.py
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-import openai  # Si estás utilizando OpenAI para interactuar con la IA
-
-# Crear cliente solo si existe la API key
-api_key = os.environ.get("OPENAI_API_KEY", None)
-
-client = None
-if api_key:
-    client = OpenAI(api_key=api_key)
 
 @csrf_exempt
 @require_POST
@@ -368,61 +426,54 @@ def recipe_chat(request):
         return HttpResponseBadRequest("Faltan 'message' o 'recipe_id'")
 
     recipe = get_object_or_404(Recipe, pk=recipe_id)
+    prompt = chat.build_prompt(recipe, message)
 
-    ingredientes_txt = ", ".join(
-        ing.name for ing in recipe.ingredients.all()
-    )
-    pasos_txt = "\n".join(
-        f"{i+1}. {step.description}"
-        for i, step in enumerate(recipe.steps.all())
-    )
-
-    prompt = f"""
-Eres un asistente de cocina amable y experto.
-El usuario está viendo esta receta de Cocina360 y te hará preguntas sobre ella.
-
-Receta:
-Nombre: {recipe.name}
-Ingredientes: {ingredientes_txt}
-Pasos:
-{pasos_txt}
-
-Reglas:
-- Responde SIEMPRE en español.
-- Sé breve y claro (3–6 líneas).
-- Puedes dar consejos adicionales (textura, sabor, tiempos, seguridad).
-- Si el usuario pide sustituir algo, explica riesgos y proporciones.
-- Si la pregunta no tiene que ver con la receta, responde de forma educada pero vuelve al tema de la receta.
-
-Pregunta del usuario: {message}
-Responde de forma directa, como si estuvieras hablando con la persona.
-"""
-
-        # Si no hay cliente, usa modo sin IA
-    if client is None:
-        reply_text = (
-            "⚠️ Modo sin IA activado.\n"
-            "No hay API key configurada, por lo que responderé con mensajes básicos.\n\n"
-            f"Pregunta: {message}\n"
-            "Respuesta: Esta es una respuesta simulada. La integración con la IA está desactivada."
-        )
+    # Sin API key, modo sin IA; si la IA no responde (plazo, reintentos o
+    # circuito abierto, ver ai_client), el mensaje de error
+    if not ai_client.configured():
+        reply_text = chat.offline_reply(message)
     else:
         try:
-            response = client.responses.create(
-                model="gpt-5-nano",
-                input=prompt,
-                store=False
-            )
-            reply_text = response.output_text
-        except Exception as e:
-            reply_text = (
-                "⚠️ Error consultando la IA.\n"
-                "Por ahora usaré el modo sin IA.\n"
-                f"Detalle: {e}"
-            )
+            reply_text = ai_client.complete(prompt)
+        except ai_client.AIUnavailable as e:
+            reply_text = chat.error_reply(e)
 
+    return JsonResponse({"reply": reply_text})
 
-    return JsonResponse({"reply": reply_text})  
+
+async def recipe_chat_stream(request):
+    """
+    Como recipe_chat, pero asíncrona y en streaming: responde con
+    server-sent events ("token" por cada parte, "done" o "error" al final;
+    ver chat.sse_reply) a medida que la IA escribe.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return HttpResponseBadRequest("JSON inválido")
+
+    message = data.get("message")
+    recipe_id = data.get("recipe_id")
+    if not message or not recipe_id:
+        return HttpResponseBadRequest("Faltan 'message' o 'recipe_id'")
+
+    try:
+        prompt = await sync_to_async(chat.recipe_prompt)(recipe_id, message)
+    except (Recipe.DoesNotExist, ValueError):
+        raise Http404("La receta no existe")
+
+    response = StreamingHttpResponse(
+        chat.sse_reply(prompt, message), content_type="text/event-stream; charset=utf-8"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Que un proxy (nginx) no junte los eventos antes de enviarlos
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+# csrf_exempt de Django 4.2 envuelve la vista en una función síncrona; basta con la marca
+recipe_chat_stream.csrf_exempt = True
 
 from django.contrib.admin.views.decorators import staff_member_required
 
@@ -580,56 +631,200 @@ def mostrar_json_pdf(request, id):
         "id": json_entry.id,
     })
 
-def render_to_pdf(template_src, context_dict={}):
-    """Convierte una plantilla HTML y contexto a un archivo PDF."""
-    html = render_to_string(template_src, context_dict)
-    result = BytesIO()
-    
-    # Esta función transforma el HTML en PDF y escribe el resultado en 'result'
-    pdf = pisa.pisaDocument(
-        BytesIO(html.encode("UTF-8")), # El contenido HTML debe estar en Bytes
-        result,
-        link_callback=lambda uri, rel: settings.STATIC_ROOT # Callback para manejar rutas estáticas
-    )
-    
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
-    
-    # Si hay un error en la generación, se devuelve un error de HTTP
-    return HttpResponse('Tuvimos algunos errores al generar el PDF: %s' % html, status=500)
-
-
-# La vista que llama a la función de ayuda
+# El PDF se genera en un trabajo (ver recipes.jobs) y la página del trabajo lo descarga al terminar
 def descargar_json_pdf(request, id):
-    # 1. Obtener el objeto JsonHistory
     json_entry = get_object_or_404(JsonHistory, id=id)
+    # ?engine=xhtml2pdf usa la plantilla HTML anterior (ver recipes.json_reports)
+    return _submit_report_job(request, jobs.JSON_PDF, {
+        "json_id": json_entry.id,
+        "engine": request.GET.get("engine"),
+    })
 
-    # 2. Formatear el JSON para la plantilla
-    json_pretty = json.dumps(json_entry.content, indent=4)
-    
-    context = {
-        "json_data": json_pretty,
-        "id": json_entry.id,
-        "title": f"JSON Recibido #{json_entry.id}",
+def cookbook_export(request):
+    """
+    Exporta varias recetas: un PDF con índice (?format=pdf), un ZIP con un
+    PDF por receta (?format=zip) o los datos en CSV o NDJSON (?format=csv,
+    ?format=ndjson; ver recipes.exporter). El PDF y el ZIP se encolan y se
+    redirige a la página del trabajo, que los descarga cuando están listos.
+
+    ?source=search  recetas con los mismos filtros de la lista (q, ingredient, max_time)
+    ?source=favorites  favoritos del usuario
+    ?source=all  todo el catálogo
+    """
+    source = request.GET.get("source", "search")
+    export_format = request.GET.get("format", cookbook.PDF)
+    if export_format not in cookbook.FORMATS + exporter.FORMATS:
+        return HttpResponseBadRequest("'format' debe ser pdf, zip, csv o ndjson")
+
+    if source == "favorites" and not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    try:
+        recipes, title = cookbook.export_queryset(source, request.GET, request.user)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    if export_format in exporter.FORMATS:
+        # Los datos salen por bloques de recetas: sin el límite de los PDF
+        response = StreamingHttpResponse(
+            exporter.iter_lines(recipes, export_format), content_type=exporter.MEDIA_TYPES[export_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="recetario.{export_format}"'
+        return _stream_without_buffering(request, response)
+
+    # Dibujar cientos de PDF no cabe en una petición: lo hace report_worker
+    return _submit_report_job(request, jobs.COOKBOOK, {
+        "source": source,
+        "format": export_format,
+        "q": request.GET.get("q", ""),
+        "ingredient": request.GET.get("ingredient", ""),
+        "max_time": request.GET.get("max_time", ""),
+    })
+
+@require_POST
+def report_job_submit(request):
+    """
+    Encola un reporte y responde 202 con su id sin esperar a que se genere
+    (lo procesa `manage.py report_worker`).
+
+    Espera JSON con "kind" y sus parámetros, por ejemplo:
+      {"kind": "recipe_pdf", "recipe_id": 3}
+      {"kind": "cookbook", "source": "search", "q": "pollo", "format": "zip"}
+      {"kind": "json_pdf", "json_id": 7}
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        kind = data.pop("kind")
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError, KeyError, TypeError):
+        return HttpResponseBadRequest("JSON inválido")
+
+    try:
+        job = jobs.submit(kind, data, request.user)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    response = JsonResponse(_report_job_state(job), status=202)
+    response["Location"] = reverse("report_job_status", args=[job.pk])
+    return response
+
+async def _iterate_in_thread(iterator):
+    next_part = sync_to_async(next)
+    while (part := await next_part(iterator, None)) is not None:
+        yield part
+
+
+def _stream_without_buffering(request, response):
+    """
+    Bajo ASGI, Django 4.2 junta en memoria todo lo que entrega un iterador
+    síncrono antes de enviar el primer byte (en WSGI sale por partes). Ahí
+    se cambia por un iterador asíncrono que pide cada parte al hilo de las
+    vistas (donde está la conexión a la base), así la memoria no depende
+    del tamaño de la descarga.
+    """
+    if isinstance(request, ASGIRequest) and not response.is_async:
+        response.streaming_content = _iterate_in_thread(response.streaming_content)
+    return response
+
+def _submit_report_job(request, kind, params):
+    """Encola un reporte pedido desde el navegador y redirige a la página que espera por él."""
+    try:
+        job = jobs.submit(kind, params, request.user)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return redirect("report_job_page", job_id=job.pk)
+
+def _report_job_state(job):
+    state = {
+        "id": str(job.pk),
+        "kind": job.kind,
+        "status": job.status,
+        "status_url": reverse("report_job_status", args=[job.pk]),
     }
+    if job.status == ReportJob.DONE:
+        state["download_url"] = reverse("report_job_download", args=[job.pk])
+    if job.status == ReportJob.FAILED:
+        state["error"] = job.error
+    return state
+
+def _get_report_job(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    # Los trabajos de un usuario solo los ve ese usuario
+    if job.user_id is not None and job.user_id != request.user.pk:
+        raise Http404("No existe el trabajo")
+    return job
+
+def report_job_status(request, job_id):
+    job = _get_report_job(request, job_id)
+    response = JsonResponse(_report_job_state(job))
+    if job.status in (ReportJob.PENDING, ReportJob.RUNNING):
+        response["Retry-After"] = "2"
+    return response
 
-    # 3. Generar el PDF
-    pdf_response = render_to_pdf("equipo_precedente/pdf_json_template.html", context)
-    
-    # 4. Configurar la descarga del archivo
-    if pdf_response.status_code == 200:
-        pdf_response["Content-Disposition"] = f'attachment; filename="json_historial_{id}.pdf"'
-    
-    return pdf_response
+def report_job_page(request, job_id):
+    """Página que consulta el estado del trabajo y descarga el archivo cuando está listo."""
+    job = _get_report_job(request, job_id)
+    return render(request, "recipes/report_job.html", {"job": job, "state": _report_job_state(job)})
 
-def recipe_pdf(request, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
+def report_job_download(request, job_id):
+    job = _get_report_job(request, job_id)
+    if job.status != ReportJob.DONE:
+        raise Http404("El reporte todavía no está listo")
+    try:
+        result = open(job.result_path, "rb")
+    except FileNotFoundError:
+        raise Http404("El reporte ya no está disponible")
+    response = FileResponse(result, as_attachment=True, filename=job.filename, content_type=job.content_type)
+    return _stream_without_buffering(request, response)
+
+def _recipe_report_response(request, pk, report_format, as_attachment=True):
+    """Reporte de la receta 'pk' en 'report_format', con ETag según su contenido."""
+    recipe = reports.load_recipe(pk)
+    if recipe is None:
+        raise Http404("La receta no existe")
+    service = RecipeReportService.for_format(report_format)
+    filename = service.filename(recipe)
+
+    digest = pdf_cache.content_hash(recipe, service.generator)
+    etag = f'"{digest}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    # El PDF se genera solo si no está en el cache de disco para el
+    # contenido actual de la receta; los demás formatos son baratos
+    cached = None
+    if report_format == reports.PDF:
+        cached = pdf_cache.get_or_build(recipe, service, digest)
+
+    response = None
+    if cached is not None:
+        try:
+            response = _stream_without_buffering(request, FileResponse(
+                open(cached.path, "rb"), as_attachment=as_attachment,
+                filename=filename, content_type=service.content_type,
+            ))
+        except FileNotFoundError:
+            pass  # Otro proceso lo desalojó justo ahora
+    if response is None:
+        response = HttpResponse(service.build_report(recipe), content_type=service.content_type)
+        disposition = "attachment" if as_attachment else "inline"
+        response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+    response["ETag"] = etag
+    return response
 
-    # Inyección de la implementación concreta (PDF)
-    service = RecipeReportService(PdfRecipeReportGenerator())
-    pdf_bytes = service.build_report(recipe)
+def recipe_pdf(request, pk):
+    return _recipe_report_response(request, pk, reports.PDF)
 
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    filename = f"receta_{recipe.id}.pdf"
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+def recipe_report(request, pk):
+    """
+    Receta en el formato pedido con ?format= (pdf, html, md, txt, json) o,
+    si no viene, según el encabezado Accept.
+    """
+    try:
+        report_format = reports.requested_format(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if report_format is None:
+        return HttpResponse("Formatos disponibles: pdf, html, md, txt, json", status=406)
+    response = _recipe_report_response(request, pk, report_format)
+    patch_vary_headers(response, ["Accept"])
     return response